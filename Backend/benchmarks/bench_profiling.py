@@ -0,0 +1,81 @@
+"""Compare the per-column profiling loops with the vectorized profiling engine.
+
+Run from the Backend folder:
+
+    python benchmarks/bench_profiling.py --rows 10000 --numeric-cols 50 200 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import build_profile  # noqa: E402
+
+
+def legacy_profile(df: pd.DataFrame) -> None:
+    """The statistics passes get_dataset_summary made before profiling.py"""
+    df.isnull().sum()
+    numeric_cols = df.select_dtypes(include=['number']).columns
+    df[numeric_cols].describe()
+    corr_matrix = df[numeric_cols].corr()
+    corr_pairs = []
+    for i in range(len(corr_matrix.columns)):
+        for j in range(i+1, len(corr_matrix.columns)):
+            corr_val = corr_matrix.iloc[i, j]
+            if abs(corr_val) > 0.5:
+                corr_pairs.append((corr_matrix.columns[i], corr_matrix.columns[j], corr_val))
+    for col in df.select_dtypes(include=['object']).columns[:3]:
+        df[col].value_counts().head(5)
+        df[col].nunique()
+    (df.isnull().sum() / len(df) * 100).round(2)
+    for col in numeric_cols:
+        Q1 = df[col].quantile(0.25)
+        Q3 = df[col].quantile(0.75)
+        IQR = Q3 - Q1
+        outliers = df[(df[col] < Q1 - 1.5 * IQR) | (df[col] > Q3 + 1.5 * IQR)]
+        len(outliers)
+
+
+def make_wide_frame(rows: int, numeric_cols: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(rows, numeric_cols))
+    # A few correlated pairs so the strong-correlation path does work
+    values[:, 1::10] = values[:, 0::10][:, :values[:, 1::10].shape[1]] * 2 + rng.normal(size=(rows, 1)) * 0.1
+    values[rng.random(values.shape) < 0.02] = np.nan
+    df = pd.DataFrame(values, columns=[f"metric_{i}" for i in range(numeric_cols)])
+    df["category"] = rng.choice(["Electronics", "Clothing", "Home", "Sports"], rows)
+    df["region"] = rng.choice(["North America", "Europe", "Asia"], rows)
+    return df
+
+
+def timed(fn, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--numeric-cols", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'numeric':>8} {'legacy (s)':>12} {'engine (s)':>12} {'speed-up':>9}")
+    for numeric_cols in args.numeric_cols:
+        df = make_wide_frame(args.rows, numeric_cols)
+        legacy = timed(legacy_profile, df, args.repeat)
+        engine = timed(build_profile, df, args.repeat)
+        print(f"{args.rows:>8} {numeric_cols:>8} {legacy:>12.4f} {engine:>12.4f} {legacy / engine:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Compare the legacy dataset serialization path with the vectorized one.
+
+Besides timing both, checks that they encode the same values: the decoded
+payloads must be equal, so floats have to round-trip exactly. Exits with
+status 1 on a mismatch.
+
+Run from the Backend folder:
+
+    python benchmarks/bench_serialization.py --rows 1000 10000 100000
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serialization import json_envelope, records_json  # noqa: E402
+
+
+def replace_nan_with_none(obj):
+    """The per-cell walk GET /{dataset_name} used before serialization.py"""
+    if isinstance(obj, dict):
+        return {k: replace_nan_with_none(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [replace_nan_with_none(i) for i in obj]
+    elif isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return obj
+    return obj
+
+
+def legacy_path(df: pd.DataFrame) -> bytes:
+    data = replace_nan_with_none(df.to_dict(orient="records"))
+    # What FastAPI does with the returned dict
+    return json.dumps(jsonable_encoder({"data": data})).encode("utf-8")
+
+
+def vectorized_path(df: pd.DataFrame) -> bytes:
+    return json_envelope(records_json(df)).encode("utf-8")
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(1000, 250, rows)
+    values[rng.random(rows) < 0.05] = np.nan
+    values[rng.random(rows) < 0.001] = np.inf
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "category": rng.choice(["Electronics", "Clothing", "Home", "Sports"], rows),
+        "sales": values,
+        "units": rng.integers(0, 500, rows),
+        "growth": rng.normal(5, 2, rows).round(2),
+        # Values that lose digits at 15 significant digits
+        "ratio": rng.integers(1, 1000, rows) / 3,
+        "amount": rng.normal(0, 1, rows) + 123456789.123456789,
+        "region": rng.choice(["North America", "Europe", "Asia", None], rows),
+    })
+
+
+def mismatches(df: pd.DataFrame) -> int:
+    """Cells whose decoded value differs between the two paths"""
+    legacy = json.loads(legacy_path(df))["data"]
+    vectorized = json.loads(vectorized_path(df))["data"]
+    if len(legacy) != len(vectorized):
+        return max(len(legacy), len(vectorized))
+    return sum(
+        old.get(key) != new.get(key)
+        for old, new in zip(legacy, vectorized)
+        for key in old.keys() | new.keys()
+    )
+
+
+def best_of(fn, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'speed-up':>9} {'mismatches':>11}")
+    failed = False
+    for rows in args.rows:
+        df = make_frame(rows)
+        legacy = best_of(legacy_path, df, args.repeat)
+        vectorized = best_of(vectorized_path, df, args.repeat)
+        different = mismatches(df)
+        failed = failed or different > 0
+        print(f"{rows:>10} {legacy:>12.4f} {vectorized:>15.4f} {legacy / vectorized:>8.1f}x {different:>11}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
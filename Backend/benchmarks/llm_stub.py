@@ -0,0 +1,260 @@
+"""Local OpenAI-compatible chat-completions server for load tests.
+
+Serves POST /v1/chat/completions, plain and streamed (SSE, including the
+final usage chunk with stream_options.include_usage), with configurable
+latency, token rate and injected failures. Point the backend at it with
+
+    OPENAI_API_URL=http://127.0.0.1:8100/v1/chat/completions OPENAI_API_KEY=stub uvicorn main:app
+
+Run from the Backend folder:
+
+    python benchmarks/llm_stub.py --latency 0.3 --tokens-per-second 50
+    python benchmarks/llm_stub.py --error-rate 0.01 --rate-limit-rate 0.05 --max-rps 20
+    python benchmarks/llm_stub.py --record captured.jsonl --upstream https://api.openai.com/v1/chat/completions
+    python benchmarks/llm_stub.py --replay captured.jsonl
+
+Without a recording, replies are synthetic: matplotlib code when the system
+prompt asks for plotting code (so /llm-chat renders a plot), otherwise
+--reply-tokens words of filler text. Recorded replies are matched by model,
+messages, temperature and response format; streamed requests are recorded
+from a non-streamed upstream call and re-streamed at the configured token
+rate, so replays are paced like synthetic replies.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PLOT_REPLY = """```python
+numeric = df.select_dtypes(include="number")
+if numeric.shape[1] > 0:
+    numeric.iloc[:200, :3].plot(ax=ax)
+else:
+    df.iloc[:, 0].value_counts().head(10).plot(kind="bar", ax=ax)
+ax.set_title("Stub chart")
+```"""
+
+FILLER_WORDS = ("the", "data", "shows", "a", "steady", "increase", "in", "sales", "across", "regions", "with",
+                "notable", "growth", "during", "the", "last", "quarter", "and", "stable", "margins")
+
+_TOKEN = re.compile(r"\S+\s*|\s+")
+_COLUMN = re.compile(r"^- (.+) \([^()]+\)$", re.MULTILINE)
+
+
+def request_key(body: dict) -> str:
+    """Replay key of a chat-completions request (stream flags don't matter)"""
+    parts = {k: body.get(k) for k in ("model", "messages", "temperature", "response_format")}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def tokens_of(text: str) -> List[str]:
+    """Rough word-level tokens; joined back they give the original text"""
+    return _TOKEN.findall(text) or [""]
+
+
+class RateLimiter:
+    """Token bucket allowing max_rps requests per second on average"""
+
+    def __init__(self, max_rps: float):
+        self.max_rps = max_rps
+        self._tokens = max_rps
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.max_rps <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_rps, self._tokens + (now - self._updated) * self.max_rps)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class Recording:
+    """Captured replies by request key, loaded from and appended to a JSONL file"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.replies: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> "Recording":
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.replies[entry["key"]] = entry
+        return self
+
+    def add(self, key: str, status: int, content: Optional[str], usage: Optional[dict], error: Optional[str]) -> None:
+        entry = {"key": key, "status": status, "content": content, "usage": usage, "error": error}
+        with self._lock:
+            self.replies[key] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def synthetic_reply(body: dict, reply_tokens: int) -> str:
+    system = " ".join(m.get("content", "") for m in body.get("messages", []) if m.get("role") == "system")
+    if "matplotlib" in system:
+        return PLOT_REPLY
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        # Chart-spec prompts list the columns as "- name (dtype)"; count rows by the first one
+        user = " ".join(m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user")
+        columns = _COLUMN.findall(user)
+        return json.dumps({"chart": "bar", "x": columns[0] if columns else None, "y": None,
+                           "aggregate": "count", "limit": 20, "title": "Stub chart"})
+    return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(reply_tokens)) + "."
+
+
+def estimate_usage(body: dict, content: str) -> dict:
+    prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+    prompt_tokens = max(1, prompt_chars // 4)
+    completion_tokens = len(tokens_of(content))
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    limiter = RateLimiter(args.max_rps)
+    recording = Recording(args.replay).load() if args.replay else Recording(args.record)
+    stats = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0, "replayed": 0, "recorded": 0}
+    # Shared across requests so recording doesn't open a connection per call
+    upstream_client = httpx.AsyncClient(timeout=120) if args.record else None
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        if upstream_client is not None:
+            await upstream_client.aclose()
+
+    app = FastAPI(title="LLM stub", lifespan=lifespan)
+
+    def error(status: int, message: str, kind: str) -> JSONResponse:
+        return JSONResponse({"error": {"message": message, "type": kind}}, status_code=status)
+
+    async def produce(request: Request, body: dict):
+        """(status, content, usage, error message) of one request"""
+        key = request_key(body)
+        if args.replay:
+            entry = recording.replies.get(key)
+            if entry is None:
+                return 404, None, None, "No recorded response for this request"
+            stats["replayed"] += 1
+            return entry["status"], entry["content"], entry["usage"], entry["error"]
+        if args.record:
+            upstream = await upstream_client.post(
+                args.upstream,
+                headers={"Authorization": request.headers.get("authorization", "")},
+                json={k: v for k, v in body.items() if k not in ("stream", "stream_options")},
+            )
+            if upstream.status_code == 200:
+                result = upstream.json()
+                content, usage, message = result["choices"][0]["message"]["content"], result.get("usage"), None
+            else:
+                content, usage, message = None, None, upstream.text
+            recording.add(key, upstream.status_code, content, usage, message)
+            stats["recorded"] += 1
+            return upstream.status_code, content, usage, message
+        content = synthetic_reply(body, args.reply_tokens)
+        return 200, content, estimate_usage(body, content), None
+
+    def completion(body: dict, content: str, usage: Optional[dict]) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    async def sse(body: dict, content: str, usage: Optional[dict]):
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        def event(choices: list, **extra) -> str:
+            obj = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                   "model": body.get("model", "stub"), "choices": choices, **extra}
+            return f"data: {json.dumps(obj)}\n\n"
+
+        yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        delay = 1 / args.tokens_per_second if args.tokens_per_second > 0 else 0
+        for token in tokens_of(content):
+            if delay:
+                await asyncio.sleep(delay)
+            yield event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+        yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield event([], usage=usage)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if not limiter.allow() or random.random() < args.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return error(429, "Rate limit reached (stub)", "rate_limit_exceeded")
+        if random.random() < args.error_rate:
+            stats["errors"] += 1
+            return error(500, "Injected server error (stub)", "server_error")
+
+        # Time to first token
+        await asyncio.sleep(max(0.0, random.gauss(args.latency, args.latency_jitter)))
+        status, content, usage, message = await produce(request, body)
+        if status != 200:
+            return error(status, message or "Upstream error", "upstream_error")
+
+        if body.get("stream"):
+            stats["streams"] += 1
+            return StreamingResponse(sse(body, content, usage), media_type="text/event-stream")
+        if args.tokens_per_second > 0:
+            # A plain completion arrives once every token has been generated
+            await asyncio.sleep(len(tokens_of(content)) / args.tokens_per_second)
+        return completion(body, content, usage)
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Standard deviation of --latency")
+    parser.add_argument("--tokens-per-second", type=float, default=100, help="Generation speed, 0 = instant")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Length of synthetic text replies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Answer 429 above this request rate, 0 = off")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", help="Forward to --upstream and append responses to this JSONL file")
+    mode.add_argument("--replay", help="Serve responses recorded in this JSONL file")
+    parser.add_argument("--upstream", default="https://api.openai.com/v1/chat/completions")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
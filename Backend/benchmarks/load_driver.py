@@ -0,0 +1,154 @@
+"""Drive the chat endpoints at increasing concurrency and report latency percentiles.
+
+Start the stub and a backend pointed at it, then run from the Backend folder:
+
+    python benchmarks/llm_stub.py &
+    OPENAI_API_URL=http://127.0.0.1:8100/v1/chat/completions OPENAI_API_KEY=stub uvicorn main:app --port 8000 &
+    python benchmarks/load_driver.py --concurrency 1 4 16 64 --requests 200
+
+Each level sends --requests requests with that many concurrent clients and
+reports throughput plus p50/p95/p99 latency per endpoint (for the stream,
+also time to first byte). Prompts are unique per request by default, so
+every request reaches upstream; --repeat-prompts measures the cache and
+request coalescing instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+ENDPOINTS = ("llm-chat", "llm-chat-spec", "text-chat", "text-chat-stream")
+
+PROMPTS = {
+    "llm-chat": "Plot the main numeric columns over the first rows",
+    "llm-chat-spec": "How many rows are there per category?",
+    "text-chat": "Summarize the key trends in this dataset",
+    "text-chat-stream": "What stands out in this dataset?",
+}
+
+
+async def one_request(client: httpx.AsyncClient, endpoint: str, dataset: Optional[str], prompt: str) -> dict:
+    """Send one request; returns status, latency, time to first byte and body size"""
+    params = {"prompt": prompt}
+    if dataset:
+        params["dataset"] = dataset
+    if endpoint == "llm-chat-spec":
+        path, params["mode"] = "/llm-chat", "spec"
+    elif endpoint == "text-chat-stream":
+        path = "/text-chat/stream"
+    else:
+        path = f"/{endpoint}"
+
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    try:
+        async with client.stream("POST", path, params=params) as response:
+            async for chunk in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                size += len(chunk)
+            status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {"status": status, "latency": time.perf_counter() - started, "ttfb": first_byte, "bytes": size}
+
+
+async def run_level(base_url: str, endpoint: str, dataset: Optional[str], concurrency: int, requests: int,
+                    repeat_prompts: bool, timeout: float) -> dict:
+    """requests requests from concurrency clients; summary of the results"""
+    remaining = iter(range(requests))
+    results: List[dict] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            for _ in remaining:
+                prompt = PROMPTS[endpoint]
+                if not repeat_prompts:
+                    prompt += f" (request {uuid.uuid4().hex[:8]})"
+                results.append(await one_request(client, endpoint, dataset, prompt))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["status"] == 200]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+
+    def percentiles(values: List[float]) -> dict:
+        if not values:
+            return {"p50": None, "p95": None, "p99": None}
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": statuses,
+        "seconds": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency": percentiles([r["latency"] for r in ok]),
+        "ttfb": percentiles([r["ttfb"] for r in ok if r["ttfb"] is not None]),
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+async def drive(args: argparse.Namespace) -> List[dict]:
+    dataset = args.dataset
+    if dataset is None:
+        async with httpx.AsyncClient(base_url=args.base_url) as client:
+            datasets = (await client.get("/available-datasets")).json().get("datasets", [])
+        dataset = datasets[0] if datasets else None
+
+    print(f"Dataset: {dataset or '(none)'}")
+    print(f"{'endpoint':<17} {'conc':>5} {'reqs':>5} {'ok':>5} {'rps':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttfb p50':>9}  statuses")
+    levels = []
+    for endpoint in args.endpoints:
+        for concurrency in args.concurrency:
+            level = await run_level(args.base_url, endpoint, dataset, concurrency, args.requests,
+                                    args.repeat_prompts, args.timeout)
+            levels.append(level)
+            latency = level["latency"]
+            print(f"{endpoint:<17} {concurrency:>5} {level['requests']:>5} {level['ok']:>5} "
+                  f"{level['throughput_rps']:>8.2f} {_ms(latency['p50']):>8} {_ms(latency['p95']):>8} "
+                  f"{_ms(latency['p99']):>8} {_ms(level['ttfb']['p50']):>9}  {level['statuses']}")
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=["llm-chat", "text-chat", "text-chat-stream"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--dataset", help="Dataset name (default: the first available one)")
+    parser.add_argument("--repeat-prompts", action="store_true", help="Reuse one prompt per endpoint")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    levels = asyncio.run(drive(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"base_url": args.base_url, "levels": levels}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
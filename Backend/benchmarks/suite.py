@@ -0,0 +1,284 @@
+"""Benchmark the backend's data paths on synthetic datasets and check for regressions.
+
+Times ingest (Parquet sidecar conversion), load_csv (cold, mapped from
+the shared store as another worker would, and cached),
+GET /{dataset_name} serialization (json and columnar), get_dataset_summary
+and plot rendering through the /llm-chat worker pool, for narrow and wide
+datasets of increasing size. Each case also records the peak Python heap
+allocation (tracemalloc) of one extra, untimed run.
+
+Run from the Backend folder:
+
+    python benchmarks/suite.py                                # 1e3..1e5 rows
+    python benchmarks/suite.py --sizes 1e3 1e4 1e5 1e6 1e7    # full range; wide 1e6+ needs tens of GB
+    python benchmarks/suite.py --compare benchmarks/baseline.json
+    python benchmarks/suite.py --output benchmarks/baseline.json   # refresh the baseline
+
+Datasets are generated from a fixed seed and kept in benchmarks/.data, so
+repeated runs measure the same bytes. Results are written as JSON; with
+--compare the run exits with status 1 when a case is slower or uses more
+memory than the baseline by more than the thresholds. Baselines are only
+comparable on the machine they were recorded on.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import main  # noqa: E402
+from dataset_cache import dataset_cache  # noqa: E402
+from ingest import remove_sidecars, write_columnar  # noqa: E402
+from plot_renderer import PLOT_DPI, PlotRenderPool  # noqa: E402
+from shared_store import shared_store  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+SHAPES = ("narrow", "wide")
+BENCHMARKS = ("ingest", "load_csv_cold", "load_csv_mapped", "load_csv_warm", "get_dataset_json",
+              "get_dataset_columnar", "summary", "plot_render")
+WIDE_FLOAT_COLUMNS = 40
+WIDE_INT_COLUMNS = 10
+WIDE_TEXT_COLUMNS = 10
+GENERATE_CHUNK_ROWS = 500_000
+
+# Generated plotting code of the kind /llm-chat renders
+PLOT_CODE = """
+totals = df.groupby("category")["amount"].sum().sort_values(ascending=False)
+totals.plot(kind="bar", ax=ax)
+ax.set_title("Amount by category")
+"""
+
+CATEGORIES = np.array(["Electronics", "Clothing", "Home", "Sports", "Toys", "Books", "Garden", "Beauty"])
+REGIONS = np.array(["North America", "Europe", "Asia", "South America", "Africa", "Oceania"])
+
+# Regression thresholds: relative growth allowed, and the absolute slack below
+# which timing differences are treated as noise
+TIME_THRESHOLD = 0.25
+MEMORY_THRESHOLD = 0.20
+TIME_NOISE_SECONDS = 0.005
+
+
+def _chunk(shape: str, start: int, rows: int, seed: int) -> pd.DataFrame:
+    """Rows [start, start + rows) of a dataset; independent of the chunk size"""
+    rng = np.random.default_rng([seed, start])
+    ids = np.arange(start, start + rows)
+    amount = rng.lognormal(5, 1, rows).round(2)
+    amount[rng.random(rows) < 0.02] = np.nan
+    columns = {
+        "id": ids,
+        "date": (pd.Timestamp("2020-01-01") + pd.to_timedelta(ids % 1461, unit="D")).strftime("%Y-%m-%d"),
+        "category": CATEGORIES[rng.integers(0, len(CATEGORIES), rows)],
+        "region": np.where(rng.random(rows) < 0.01, None, REGIONS[rng.integers(0, len(REGIONS), rows)]),
+        "amount": amount,
+        "units": rng.integers(0, 500, rows),
+        "growth": rng.normal(5, 2, rows).round(3),
+        "active": rng.random(rows) < 0.7,
+    }
+    if shape == "wide":
+        for i in range(WIDE_FLOAT_COLUMNS):
+            columns[f"metric_{i}"] = rng.normal(100, 15, rows).round(4)
+        for i in range(WIDE_INT_COLUMNS):
+            columns[f"count_{i}"] = rng.integers(0, 10_000, rows)
+        for i in range(WIDE_TEXT_COLUMNS):
+            columns[f"label_{i}"] = np.char.add("label_", rng.integers(0, 50 * (i + 1), rows).astype(str))
+    return pd.DataFrame(columns)
+
+
+def generate_dataset(shape: str, rows: int, seed: int) -> str:
+    """Path of the synthetic CSV for (shape, rows, seed), generated on first use"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"bench_{shape}_{rows}_s{seed}.csv")
+    if os.path.exists(path):
+        return path
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="") as f:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            chunk = _chunk(shape, start, min(GENERATE_CHUNK_ROWS, rows - start), seed)
+            chunk.to_csv(f, index=False, header=start == 0)
+    os.replace(tmp_path, path)
+    return path
+
+
+def measure(fn, repeat: int, setup=None) -> dict:
+    """Timings of repeat runs, then the peak traced allocation of one more run"""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_seconds": min(runs),
+        "median_seconds": statistics.median(runs),
+        "runs": runs,
+        "peak_bytes": peak,
+    }
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+
+
+def bench_dataset(csv_path: str, repeat: int, wanted, pool: PlotRenderPool, loop, plot_dir: str):
+    """The wanted benchmarks of one dataset, as (benchmark, result) pairs"""
+    filename = os.path.basename(csv_path)
+    name = filename[:-len(".csv")].replace("_", "-")
+
+    def cold():
+        dataset_cache.invalidate(csv_path)
+        shared_store.invalidate(csv_path)
+
+    if wanted("ingest"):
+        yield "ingest", measure(lambda: write_columnar(csv_path), repeat, setup=lambda: remove_sidecars(csv_path))
+    # Later benchmarks read the sidecar, as after an upload
+    write_columnar(csv_path)
+    if wanted("load_csv_cold"):
+        yield "load_csv_cold", measure(lambda: main.load_csv(filename), repeat, setup=cold)
+    df = main.load_csv(filename)
+    if wanted("load_csv_mapped"):
+        # Only this process' cache is cold; the shared store holds the version
+        yield "load_csv_mapped", measure(lambda: main.load_csv(filename), repeat,
+                                         setup=lambda: dataset_cache.invalidate(csv_path))
+        df = main.load_csv(filename)
+    if wanted("load_csv_warm"):
+        yield "load_csv_warm", measure(lambda: main.load_csv(filename), repeat)
+
+    for response_format in ("json", "columnar"):
+        if wanted(f"get_dataset_{response_format}"):
+            yield f"get_dataset_{response_format}", measure(
+                lambda: main.get_dataset(name, _request(), limit=None, offset=0, columns=None,
+                                         filters=None, response_format=response_format),
+                repeat,
+            )
+
+    if wanted("summary"):
+        yield "summary", measure(lambda: main.get_dataset_summary(df), repeat)
+
+    if wanted("plot_render"):
+        output_path = os.path.join(plot_dir, f"{name}.png")
+
+        def render():
+            result = loop.run_until_complete(pool.render(PLOT_CODE, df, output_path, PLOT_DPI))
+            if not result["ok"] or result["used_fallback"]:
+                raise RuntimeError(f"Benchmark plot failed: {result.get('error')}")
+
+        render()  # Warm-up: the first job pays for the worker's imports
+        yield "plot_render", measure(render, repeat)
+
+
+def environment(seed: int) -> dict:
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+    }
+
+
+def compare(results: list, baseline: dict, time_threshold: float, memory_threshold: float) -> list:
+    """Cases that regressed against the baseline, as printable lines"""
+    previous = {(r["benchmark"], r["shape"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get((result["benchmark"], result["shape"], result["rows"]))
+        if base is None:
+            continue
+        case = f"{result['benchmark']} {result['shape']} {result['rows']}"
+        now, before = result["median_seconds"], base["median_seconds"]
+        if now > before * (1 + time_threshold) and now - before > TIME_NOISE_SECONDS:
+            regressions.append(f"{case}: {before:.4f}s -> {now:.4f}s (+{(now / before - 1) * 100:.0f}%)")
+        now, before = result["peak_bytes"], base["peak_bytes"]
+        if before and now > before * (1 + memory_threshold):
+            regressions.append(f"{case}: peak {before / 1e6:.1f} MB -> {now / 1e6:.1f} MB (+{(now / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1e3, 1e4, 1e5])
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, help="Only these benchmarks (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results.json"))
+    parser.add_argument("--compare", help="Baseline results JSON to check against")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD)
+    args = parser.parse_args()
+
+    # Loads resolve against the generated datasets, never the real data folder
+    main.DATA_FOLDER = DATA_DIR
+    # One worker without limits, so large renders are measured instead of stopped
+    pool = PlotRenderPool(workers=1, timeout=3600, memory_limit_mb=0)
+    loop = asyncio.new_event_loop()
+    wanted = (lambda benchmark: benchmark in args.benchmarks) if args.benchmarks else (lambda benchmark: True)
+    results = []
+    print(f"{'benchmark':<22} {'shape':<7} {'rows':>9} {'median (s)':>11} {'min (s)':>9} {'peak MB':>9}")
+    try:
+        with tempfile.TemporaryDirectory() as plot_dir:
+            for rows in sorted(int(size) for size in args.sizes):
+                for shape in args.shapes:
+                    csv_path = generate_dataset(shape, rows, args.seed)
+                    for benchmark, result in bench_dataset(csv_path, args.repeat, wanted, pool, loop, plot_dir):
+                        results.append({"benchmark": benchmark, "shape": shape, "rows": rows, **result})
+                        print(f"{benchmark:<22} {shape:<7} {rows:>9} {result['median_seconds']:>11.4f} "
+                              f"{result['min_seconds']:>9.4f} {result['peak_bytes'] / 1e6:>9.1f}")
+                    dataset_cache.invalidate(csv_path)
+                    shared_store.invalidate(csv_path)
+    finally:
+        loop.run_until_complete(pool.shutdown())
+        loop.close()
+
+    report = {
+        "environment": environment(args.seed),
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from compact import known_dtypes
+from ingest import csv_header, describe_columnar
+
+try:
+    from watchfiles import awatch
+except ImportError:  # pragma: no cover - falls back to polling
+    awatch = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds between directory scans when filesystem events aren't available
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "5"))
+CATALOG_USE_WATCHER = os.getenv("CATALOG_USE_WATCHER", "true").lower() in ("1", "true", "yes")
+
+
+def dataset_name(filename: str) -> str:
+    """Public name of a CSV file ("sales_data.csv" -> "sales-data")"""
+    return filename[:-len(".csv")].replace("_", "-")
+
+
+class DatasetCatalog:
+    """In-memory metadata of every CSV in the data folder.
+
+    Scanning only stats files and no data file is read: row counts and
+    dtypes come from the Parquet footer once a sidecar exists. Files without
+    one list their header columns as pending until their first load.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._entries: Dict[str, dict] = {}  # filename -> entry
+        self._lock = threading.Lock()
+        # Validators: the epoch changes per process, the generation per change
+        self.epoch = uuid.uuid4().hex
+        self.generation = 0
+        self.last_changed = time.time()
+        self.scans = 0
+        self.describes = 0
+        self.watcher = "none"
+
+    def _changed(self) -> None:
+        self.generation += 1
+        self.last_changed = time.time()
+
+    def scan(self) -> List[str]:
+        """Sync entries with the folder by stat alone; returns filenames not described yet"""
+        os.makedirs(self.folder, exist_ok=True)
+        found = {}
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and entry.name.endswith(".csv"):
+                st = entry.stat()
+                found[entry.name] = (st.st_size, st.st_mtime_ns)
+
+        with self._lock:
+            changed = False
+            for filename in list(self._entries):
+                if filename not in found:
+                    del self._entries[filename]
+                    changed = True
+            for filename, version in found.items():
+                current = self._entries.get(filename)
+                if current is None or current["version"] != version:
+                    self._entries[filename] = self._pending(filename, version)
+                    changed = True
+            if changed:
+                self._changed()
+            self.scans += 1
+            return [f for f, e in self._entries.items() if not e["described"]]
+
+    def _pending(self, filename: str, version: tuple) -> dict:
+        return {
+            "name": dataset_name(filename),
+            "filename": filename,
+            "version": version,
+            "size": version[0],
+            "modified": version[1] / 1e9,
+            "status": "pending",
+            "described": False,
+            "rows": None,
+            "columns": None,
+            "schema": None,
+            "error": None,
+        }
+
+    def describe(self, filename: str) -> None:
+        """Fill in rows, columns and dtypes of one file from its sidecar's footer.
+
+        Reads no data: without a current sidecar only the header is read and
+        the entry stays pending until a load migrates the file (see loaded).
+        """
+        path = os.path.join(self.folder, filename)
+        with self._lock:
+            entry = self._entries.get(filename)
+        if entry is None or entry["status"] != "pending":
+            return
+
+        update = {"described": True}
+        try:
+            shape = describe_columnar(path)
+            if shape is None:
+                names = csv_header(path)
+                update.update({
+                    "columns": len(names),
+                    "schema": [{"name": name, "dtype": None} for name in names],
+                })
+            else:
+                rows, dtypes = shape
+                # Report the dtypes frames are loaded with, once they are known
+                dtypes = {**dtypes, **{col: dtype for col, dtype in known_dtypes(path).items() if col in dtypes}}
+                update.update({
+                    "status": "ready",
+                    "rows": rows,
+                    "columns": len(dtypes),
+                    "schema": [{"name": col, "dtype": dtype} for col, dtype in dtypes.items()],
+                })
+        except Exception as e:
+            update.update({"status": "error", "error": str(e) or type(e).__name__})
+        self.describes += 1
+
+        with self._lock:
+            # The file may have changed again while it was being described
+            if self._entries.get(filename) is entry:
+                entry.update(update)
+                self._changed()
+
+    def loaded(self, filename: str) -> None:
+        """Describe a pending file after a load, which writes its sidecar"""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None or entry["status"] != "pending":
+                return
+        self.describe(filename)
+
+    def refresh(self) -> None:
+        for filename in self.scan():
+            self.describe(filename)
+
+    def update(self, filename: str) -> None:
+        """Re-read one file's metadata now (after an upload)"""
+        self.scan()
+        self.describe(filename)
+
+    def remove(self, filename: str) -> None:
+        with self._lock:
+            if self._entries.pop(filename, None) is not None:
+                self._changed()
+
+    def _ensure_scanned(self) -> None:
+        if self.scans == 0:
+            self.scan()
+
+    def filenames(self) -> List[str]:
+        self._ensure_scanned()
+        with self._lock:
+            return sorted(self._entries)
+
+    def get(self, filename: str) -> Optional[dict]:
+        """Copy of one file's entry (including its version), or None"""
+        self._ensure_scanned()
+        with self._lock:
+            entry = self._entries.get(filename)
+            return dict(entry) if entry is not None else None
+
+    def entries(self) -> List[dict]:
+        self._ensure_scanned()
+        with self._lock:
+            return [
+                {k: v for k, v in self._entries[f].items() if k not in ("version", "described")}
+                for f in sorted(self._entries)
+            ]
+
+    async def watch(self, stop_event: Optional[asyncio.Event] = None) -> None:
+        """Keep the catalog current from filesystem events, or by polling, until stop_event is set"""
+        stop_event = stop_event or asyncio.Event()
+        await asyncio.to_thread(self.refresh)
+        if CATALOG_USE_WATCHER and awatch is not None:
+            self.watcher = "watchfiles"
+            try:
+                # stop_event also ends watchfiles' watcher thread, so shutdown can wait for it
+                async for _ in awatch(self.folder, watch_filter=lambda change, path: path.endswith(".csv"),
+                                      stop_event=stop_event):
+                    await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.warning(f"Catalog watcher failed, falling back to polling: {e}")
+            if stop_event.is_set():
+                return
+        self.watcher = "polling"
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=CATALOG_POLL_SECONDS)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.warning(f"Catalog refresh failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [e["status"] for e in self._entries.values()]
+        return {
+            "datasets": len(statuses),
+            "pending": statuses.count("pending"),
+            "errors": statuses.count("error"),
+            "generation": self.generation,
+            "scans": self.scans,
+            "describes": self.describes,
+            "watcher": self.watcher,
+        }
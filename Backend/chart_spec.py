@@ -0,0 +1,180 @@
+import json
+import os
+from typing import Dict, Optional
+
+import pandas as pd
+
+from query import TIME_BUCKETS, parse_filter
+
+# Chart kinds the frontend can draw from a series payload
+CHART_TYPES = ("bar", "line", "area", "scatter", "pie")
+CHART_AGGREGATES = ("sum", "mean", "median", "min", "max", "count", "none")
+# Most points returned for one chart (raw scatter/line points or groups)
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+
+# Name of the aggregated measure in the returned series
+VALUE_FIELD = "value"
+
+
+def chart_prompt(question: str, dtypes: Dict[str, str]) -> str:
+    """Instructions asking the model for a chart spec instead of code"""
+    columns = "\n".join(f"- {name} ({dtype})" for name, dtype in dtypes.items())
+    return f"""
+A dataset has these columns (name and pandas dtype):
+{columns}
+
+Describe a chart that answers: {question}
+
+Reply with a single JSON object and nothing else, with these keys:
+- "chart": one of {", ".join(CHART_TYPES)}
+- "x": column for the x axis (or the pie slices)
+- "y": numeric column to measure, or null when counting rows
+- "aggregate": one of {", ".join(CHART_AGGREGATES)} ("none" plots raw points, scatter/line only)
+- "series": column splitting the data into several series, or null
+- "time_bucket": one of {", ".join(TIME_BUCKETS)} when x is a date to group by, else null
+- "filters": list of "column:op:value" strings (op: eq, ne, gt, gte, lt, lte, contains, in), may be empty
+- "sort": "x", "y" or null; "descending": true or false
+- "limit": maximum number of bars/points, or null
+- "title": short chart title
+Use only the column names listed above.
+"""
+
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text
+
+
+def parse_chart_spec(text: str, dtypes: Dict[str, str]) -> dict:
+    """Parse and validate a model reply against the dataset schema.
+
+    Returns a normalized spec; raises ValueError naming the first problem.
+    """
+    try:
+        raw = json.loads(_strip_fences(text))
+    except ValueError:
+        raise ValueError("Chart spec is not valid JSON")
+    if not isinstance(raw, dict):
+        raise ValueError("Chart spec must be a JSON object")
+
+    def column(key: str, required: bool) -> Optional[str]:
+        name = raw.get(key)
+        if name in (None, "", "null"):
+            if required:
+                raise ValueError(f"Chart spec is missing '{key}'")
+            return None
+        if name not in dtypes:
+            raise ValueError(f"Unknown column '{name}' for '{key}'")
+        return name
+
+    def is_numeric(name: str) -> bool:
+        return pd.api.types.is_numeric_dtype(pd.Series(dtype=dtypes[name]))
+
+    chart = str(raw.get("chart", "")).lower()
+    if chart not in CHART_TYPES:
+        raise ValueError(f"Unknown chart type '{chart}', expected one of {', '.join(CHART_TYPES)}")
+    x = column("x", True)
+    y = column("y", False)
+    series = column("series", False)
+    if chart == "pie" and series is not None:
+        raise ValueError("Pie charts can't have a series")
+
+    aggregate = str(raw.get("aggregate") or "").lower()
+    if not aggregate:
+        aggregate = "none" if chart == "scatter" else ("sum" if y is not None else "count")
+    if aggregate not in CHART_AGGREGATES:
+        raise ValueError(f"Unknown aggregate '{aggregate}', expected one of {', '.join(CHART_AGGREGATES)}")
+    if aggregate == "none":
+        if chart not in ("scatter", "line"):
+            raise ValueError(f"'{chart}' charts need an aggregate")
+        if y is None:
+            raise ValueError("Raw points need a 'y' column")
+    elif aggregate != "count":
+        if y is None:
+            raise ValueError(f"Aggregate '{aggregate}' needs a 'y' column")
+        if not is_numeric(y):
+            raise ValueError(f"Aggregate '{aggregate}' needs a numeric 'y', '{y}' is {dtypes[y]}")
+
+    time_bucket = raw.get("time_bucket") or None
+    if time_bucket is not None:
+        if time_bucket not in TIME_BUCKETS:
+            raise ValueError(f"Unknown time bucket '{time_bucket}'")
+        if aggregate == "none":
+            raise ValueError("Time buckets need an aggregate")
+
+    filters = raw.get("filters") or []
+    if not isinstance(filters, list):
+        raise ValueError("'filters' must be a list")
+    for expression in filters:
+        parsed = parse_filter(str(expression))
+        if parsed["column"] not in dtypes:
+            raise ValueError(f"Unknown filter column '{parsed['column']}'")
+
+    sort = raw.get("sort") or None
+    if sort not in (None, "x", "y"):
+        raise ValueError("'sort' must be \"x\", \"y\" or null")
+    if sort is None and (chart in ("line", "area") or time_bucket is not None):
+        sort = "x"
+
+    limit = raw.get("limit")
+    try:
+        limit = min(int(limit), CHART_MAX_POINTS) if limit is not None else CHART_MAX_POINTS
+    except (TypeError, ValueError):
+        raise ValueError("'limit' must be a number")
+    if limit < 1:
+        raise ValueError("'limit' must be positive")
+
+    return {
+        "chart": chart,
+        "x": x,
+        "y": y,
+        "aggregate": aggregate,
+        "series": series,
+        "time_bucket": time_bucket,
+        "filters": [str(f) for f in filters],
+        "sort": sort,
+        "descending": bool(raw.get("descending", False)),
+        "limit": limit,
+        "title": str(raw.get("title") or ""),
+    }
+
+
+def to_query(chart: dict) -> dict:
+    """The /query spec computing a chart's series"""
+    group = [chart["x"]] + ([chart["series"]] if chart["series"] else [])
+    if chart["aggregate"] == "none":
+        spec = {"columns": list(dict.fromkeys(group + [chart["y"]]))}
+        y_field = chart["y"]
+    else:
+        spec = {
+            "group_by": group,
+            "aggregates": [{
+                "op": chart["aggregate"],
+                "column": chart["y"] if chart["aggregate"] != "count" else None,
+                "alias": VALUE_FIELD,
+            }],
+        }
+        if chart["time_bucket"]:
+            spec["time_bucket"] = {"column": chart["x"], "freq": chart["time_bucket"]}
+        y_field = VALUE_FIELD
+    if chart["sort"]:
+        spec["sort"] = [{
+            "column": chart["x"] if chart["sort"] == "x" else y_field,
+            "descending": chart["descending"],
+        }]
+    spec["filters"] = chart["filters"]
+    spec["limit"] = chart["limit"]
+    return spec
+
+
+def chart_fields(chart: dict) -> dict:
+    """Which returned columns hold x, y and the series of a chart"""
+    return {
+        "x": chart["x"],
+        "y": chart["y"] if chart["aggregate"] == "none" else VALUE_FIELD,
+        "series": chart["series"],
+    }
@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import file_version
+from ingest import SCHEMA_SUFFIX, pa, read_dataset, sidecar_path
+
+logger = logging.getLogger(__name__)
+
+# Compact in-memory representation of loaded datasets: integers are
+# downcast to the narrowest type holding their range, floats to float32 when
+# that is lossless, low-cardinality text becomes categorical and other text
+# Arrow-backed strings. The target dtypes are inferred once per file version
+# and stored next to the CSV, so every reload gets the same frame.
+
+COMPACT_DTYPES = os.getenv("COMPACT_DTYPES", "true").lower() in ("1", "true", "yes")
+# Text columns become categorical when distinct / non-null values is at most
+# this ratio and there are at most CATEGORY_MAX_VALUES distinct values
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", "0.5"))
+CATEGORY_MAX_VALUES = int(os.getenv("CATEGORY_MAX_VALUES", "10000"))
+# Other text columns; plain object strings when pyarrow isn't installed
+STRING_DTYPE = "string[pyarrow]" if pa is not None else "object"
+
+# Narrowest integer width used; arithmetic in generated plot code wraps around
+# on overflow, so narrower columns than 32 bits are opt-in
+COMPACT_MIN_INT_BITS = int(os.getenv("COMPACT_MIN_INT_BITS", "32"))
+INTEGER_DTYPES = tuple(f"int{bits}" for bits in (8, 16, 32) if bits >= COMPACT_MIN_INT_BITS)
+
+# Inference settings recorded with a stored schema; changing them re-infers it
+_SETTINGS = [COMPACT_MIN_INT_BITS, CATEGORY_MAX_RATIO, CATEGORY_MAX_VALUES]
+
+_schemas: dict = {}  # csv path -> (file version, column -> dtype)
+_schemas_lock = threading.Lock()
+_reports: dict = {}  # csv path -> memory report of its last load
+
+
+def infer_dtype(series: pd.Series) -> str:
+    """Compact dtype for a column, from its values"""
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return str(dtype)
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        if series.empty:
+            return str(dtype)
+        low, high = int(series.min()), int(series.max())
+        for name in INTEGER_DTYPES:
+            info = np.iinfo(name)
+            if info.min <= low and high <= info.max:
+                return name
+        return str(dtype)
+    if dtype == np.float64:
+        values = series.to_numpy()
+        # Only when every value survives the round trip, so results don't change
+        if np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True):
+            return "float32"
+        return str(dtype)
+    if dtype == object:
+        if pd.api.types.infer_dtype(series, skipna=True) != "string":
+            return str(dtype)  # Mixed values stay as they are
+        present = int(series.count())
+        distinct = int(series.nunique())
+        if present and distinct <= CATEGORY_MAX_VALUES and distinct / present <= CATEGORY_MAX_RATIO:
+            return "category"
+        return STRING_DTYPE
+    return str(dtype)
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """df with each column cast to its dtype in schema (unknown columns are kept)"""
+    casts = {}
+    for col in df.columns:
+        target = schema.get(str(col))
+        if target is None or target == str(df[col].dtype):
+            continue
+        try:
+            casts[col] = df[col].astype(target)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Keeping {col} as {df[col].dtype}, cast to {target} failed: {e}")
+    return df.assign(**casts) if casts else df
+
+
+def _stored_schema(csv_path: str, version: tuple) -> Dict[str, str]:
+    with _schemas_lock:
+        cached = _schemas.get(csv_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    try:
+        with open(sidecar_path(csv_path, SCHEMA_SUFFIX), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("source_version") == list(version) and stored.get("settings") == _SETTINGS:
+            return stored["columns"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def dataset_schema(csv_path: str, df: pd.DataFrame) -> Dict[str, str]:
+    """Compact dtypes of the columns of df, inferred once per file version.
+
+    Loads always hold whole columns, so a projection infers the same dtypes
+    as a full load; new columns are added to the stored schema.
+    """
+    version = file_version(csv_path)
+    schema = _stored_schema(csv_path, version)
+    missing = [col for col in df.columns if str(col) not in schema]
+    if not missing:
+        return schema
+
+    schema = {**schema, **{str(col): infer_dtype(df[col]) for col in missing}}
+    schema_path = sidecar_path(csv_path, SCHEMA_SUFFIX)
+    tmp_path = f"{schema_path}.{os.getpid()}.tmp"
+    with _schemas_lock:
+        cached = _schemas.get(csv_path)
+        if cached is not None and cached[0] == version:
+            schema = {**schema, **cached[1]}
+        _schemas[csv_path] = (version, schema)
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"source_version": list(version), "settings": _SETTINGS, "columns": schema}, f)
+            os.replace(tmp_path, schema_path)
+        except OSError:
+            pass  # Inferred again next time
+    return schema
+
+
+def known_dtypes(csv_path: str) -> Dict[str, str]:
+    """Stored compact dtypes of a dataset, without loading it (empty when not inferred yet)"""
+    if not COMPACT_DTYPES:
+        return {}
+    try:
+        return dict(_stored_schema(csv_path, file_version(csv_path)))
+    except OSError:
+        return {}
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> dict:
+    """Per-column dtypes and resident bytes before and after compaction"""
+    bytes_before = before.memory_usage(index=False, deep=True)
+    bytes_after = after.memory_usage(index=False, deep=True)
+    columns = {
+        str(col): {
+            "dtype_before": str(before[col].dtype),
+            "dtype_after": str(after[col].dtype),
+            "bytes_before": int(bytes_before[col]),
+            "bytes_after": int(bytes_after[col]),
+        }
+        for col in before.columns
+    }
+    total_before, total_after = int(bytes_before.sum()), int(bytes_after.sum())
+    return {
+        "rows": len(before),
+        "bytes_before": total_before,
+        "bytes_after": total_after,
+        "saved_pct": round((1 - total_after / total_before) * 100, 1) if total_before else 0.0,
+        "columns": columns,
+    }
+
+
+def read_compact(csv_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """read_dataset followed by the compaction pass (the dataset cache loader)"""
+    df = read_dataset(csv_path, columns)
+    if not COMPACT_DTYPES:
+        return df
+    compact = apply_schema(df, dataset_schema(csv_path, df))
+    report = memory_report(df, compact)
+    report.update({"version": list(file_version(csv_path)), "projection": columns})
+    record_report(csv_path, report)
+    logger.info(
+        f"Compacted {os.path.basename(csv_path)}: {report['bytes_before']} -> {report['bytes_after']} bytes",
+        extra={"dataset": os.path.basename(csv_path), "bytes_before": report["bytes_before"],
+               "bytes_after": report["bytes_after"]},
+    )
+    return compact
+
+
+def record_report(csv_path: str, report: dict) -> None:
+    """Keep a load's memory report; a full load's report wins over projections of the same version"""
+    with _schemas_lock:
+        previous = _reports.get(csv_path)
+        if report["projection"] is None or previous is None or previous["version"] != report["version"] \
+                or previous["projection"] is not None:
+            _reports[csv_path] = report
+
+
+def latest_report(csv_path: str) -> Optional[dict]:
+    with _schemas_lock:
+        return _reports.get(csv_path)
+
+
+def memory_reports() -> Dict[str, dict]:
+    """Latest memory report per dataset file, for files unchanged since their load"""
+    with _schemas_lock:
+        reports = dict(_reports)
+    current = {}
+    for csv_path, report in reports.items():
+        try:
+            if list(file_version(csv_path)) == report["version"]:
+                current[os.path.basename(csv_path)] = report
+        except OSError:
+            pass  # Deleted
+    return current
@@ -0,0 +1,241 @@
+import logging
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - token counts become a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the dataset part of a chat system prompt
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "1500"))
+LLM_CONTEXT_ENCODING = os.getenv("LLM_CONTEXT_ENCODING", "o200k_base")  # gpt-4o family
+
+# Seconds to wait for the tiktoken encoding at startup; tiktoken downloads it
+# unless it is already in TIKTOKEN_CACHE_DIR
+TOKENIZER_LOAD_TIMEOUT_SECONDS = float(os.getenv("TOKENIZER_LOAD_TIMEOUT_SECONDS", "5"))
+
+# Rows of sample data offered to the budget after the column fragments
+CONTEXT_SAMPLE_ROWS = 3
+
+_encoding = None  # tiktoken encoding, False once loading failed or timed out
+_encoding_lock = threading.Lock()
+_fragments: dict = {}  # csv path -> (file version, fragments)
+_fragments_lock = threading.Lock()
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def load_tokenizer(timeout: float = TOKENIZER_LOAD_TIMEOUT_SECONDS) -> None:
+    """Load the tiktoken encoding once, waiting at most timeout seconds.
+
+    Called at startup. If tiktoken is missing or the encoding can't be loaded
+    in time, token counts are estimated for the life of the process.
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is not None:
+            return
+        _encoding = False
+        if tiktoken is None:
+            return
+        loaded = {}
+
+        def load():
+            try:
+                loaded["encoding"] = tiktoken.get_encoding(LLM_CONTEXT_ENCODING)
+            except Exception as e:
+                loaded["error"] = e
+
+        # get_encoding may download without a timeout; stop waiting after ours
+        thread = threading.Thread(target=load, name="tiktoken-load", daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if "encoding" in loaded:
+            _encoding = loaded["encoding"]
+        else:
+            reason = loaded.get("error", f"not loaded within {timeout:g}s")
+            logger.warning(f"tiktoken encoding {LLM_CONTEXT_ENCODING} unavailable, estimating tokens: {reason}")
+
+
+def _tokenizer():
+    if _encoding is None:
+        load_tokenizer()  # Not loaded at startup, e.g. used outside the app
+    return _encoding
+
+
+def tokenizer_name() -> str:
+    """Exact encoding the budget is counted in, or "estimate" (4 characters per token)"""
+    return f"tiktoken:{LLM_CONTEXT_ENCODING}" if _tokenizer() else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of text for the upstream model.
+
+    Exact with tiktoken; an estimate of about 4 characters per token when
+    tiktoken or its encoding file isn't available.
+    """
+    encoding = _tokenizer()
+    if encoding:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def _words(text: str) -> set:
+    return {w.lower() for w in _WORD.findall(text)}
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return "n/a"
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def _column_fragments(profile: dict) -> Dict[str, dict]:
+    """One self-contained line per column, with its token cost and match words"""
+    numeric = profile["numeric_stats"]
+    categorical = {c["column"]: c for c in profile["categorical"]}
+    outliers = {o["column"]: o for o in profile["outliers"]}
+    rows = profile["rows"] or 1
+    fragments = {}
+    for column in profile["columns"]:
+        parts = [f"- {column} ({profile['dtypes'][column]})"]
+        details = []
+        if column in numeric:
+            stats = numeric[column]
+            details.append(
+                f"min {_fmt(stats.get('min'))}, max {_fmt(stats.get('max'))}, "
+                f"mean {_fmt(stats.get('mean'))}, median {_fmt(stats.get('50%'))}, std {_fmt(stats.get('std'))}"
+            )
+        match_words = _words(column.replace("_", " "))
+        if column in categorical:
+            cat = categorical[column]
+            top = ", ".join(f"{value} ({count})" for value, count in cat["top"])
+            details.append(f"{cat['unique']} unique, top: {top}")
+            for value, _ in cat["top"]:
+                match_words |= _words(str(value))
+        missing = profile["missing"].get(column, 0)
+        if missing:
+            details.append(f"{missing} missing ({missing / rows * 100:.1f}%)")
+        if column in outliers:
+            details.append(f"{outliers[column]['count']} outliers")
+        text = parts[0] + (": " + "; ".join(details) if details else "")
+        fragments[column] = {
+            "text": text,
+            "tokens": count_tokens(text + "\n"),
+            "words": match_words,
+            "name_words": _words(column.replace("_", " ")),
+        }
+    return fragments
+
+
+def _fragments_for(csv_path: str, version: tuple, profile: dict) -> Dict[str, dict]:
+    """Per-column fragments, built once per dataset version"""
+    with _fragments_lock:
+        cached = _fragments.get(csv_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    fragments = _column_fragments(profile)
+    with _fragments_lock:
+        _fragments[csv_path] = (version, fragments)
+    return fragments
+
+
+def _relevance(fragment: dict, column: str, question_words: set, question: str) -> float:
+    score = 0.0
+    if column.lower() in question.lower():
+        score += 10.0
+    score += 3.0 * len(fragment["name_words"] & question_words)
+    score += 1.0 * len((fragment["words"] - fragment["name_words"]) & question_words)
+    return score
+
+
+def build_context(dataset: str, csv_path: str, version: tuple, profile: dict,
+                  question: str, budget: int = LLM_CONTEXT_TOKEN_BUDGET) -> Tuple[str, dict]:
+    """Dataset context for a chat prompt, kept within a token budget.
+
+    The header is always included. Column lines, correlations and sample rows
+    are added by relevance to the question, then emitted in a fixed order,
+    so requests about the same dataset share the longest possible prefix.
+    Returns the text and a small report of what was included.
+    """
+    fragments = _fragments_for(csv_path, version, profile)
+    question_words = _words(question)
+
+    names = profile["columns"]
+    column_list = ", ".join(names)
+    list_tokens = count_tokens(column_list)
+    if list_tokens > budget // 2:
+        # Very wide datasets: the name list alone may not take over the budget
+        keep = max(1, len(names) * (budget // 2) // list_tokens)
+        column_list = ", ".join(names[:keep]) + f", ... ({len(names) - keep} more)"
+    header = (
+        f"Dataset '{dataset}': {profile['rows']} rows, {len(names)} columns.\n"
+        f"Columns: {column_list}\n"
+        "Column details:\n"
+    )
+    # Reserve room for the "columns omitted" note
+    used = count_tokens(header) + count_tokens(f"({len(names)} less relevant columns omitted)\n")
+
+    # Most relevant first; ties keep column order, so trimming drops trailing columns
+    ranked = sorted(
+        enumerate(profile["columns"]),
+        key=lambda item: (-_relevance(fragments[item[1]], item[1], question_words, question), item[0]),
+    )
+    selected = set()
+    for _, column in ranked:
+        cost = fragments[column]["tokens"]
+        if used + cost > budget:
+            continue
+        selected.add(column)
+        used += cost
+
+    correlations: List[str] = []
+    for pair in profile["correlations"]:
+        if pair["a"] in selected and pair["b"] in selected:
+            line = f"- {pair['a']} & {pair['b']}: {pair['r']:.3f}"
+            cost = count_tokens(line + "\n")
+            if used + cost <= budget:
+                correlations.append(line)
+                used += cost
+
+    sample: Optional[str] = None
+    if profile["sample"] and len(selected) == len(profile["columns"]):
+        rows = [", ".join(_fmt(v) for v in row) for row in profile["sample"][:CONTEXT_SAMPLE_ROWS]]
+        text = "Sample rows (" + ", ".join(profile["columns"]) + "):\n" + "\n".join(rows)
+        cost = count_tokens(text + "\n")
+        if used + cost <= budget:
+            sample = text
+            used += cost
+
+    lines = [header.rstrip("\n")]
+    lines += [fragments[c]["text"] for c in profile["columns"] if c in selected]
+    omitted = len(profile["columns"]) - len(selected)
+    if omitted:
+        lines.append(f"({omitted} less relevant columns omitted)")
+    if correlations:
+        lines.append("Strong correlations:")
+        lines += correlations
+    if sample:
+        lines.append(sample)
+
+    report = {
+        "tokens": used,
+        "budget": budget,
+        "tokenizer": tokenizer_name(),
+        "columns_included": len(selected),
+        "columns_total": len(profile["columns"]),
+    }
+    return "\n".join(lines), report
+
+
+def invalidate_context(csv_path: str) -> None:
+    with _fragments_lock:
+        _fragments.pop(csv_path, None)
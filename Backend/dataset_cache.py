@@ -0,0 +1,140 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+# Memory budget for parsed DataFrames held by the cache (bytes)
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def file_version(file_path: str) -> tuple:
+    """Identity of a file on disk: changes whenever the file is rewritten"""
+    st = os.stat(file_path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+class DatasetCache:
+    """LRU cache of parsed DataFrames keyed by file path and file version"""
+
+    def __init__(self, max_bytes: int = DATASET_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # (path, columns) -> (version, df, nbytes)
+        self._total_bytes = 0
+        self._fingerprints: dict = {}  # path -> (version, content digest)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(
+        self,
+        file_path: str,
+        loader: Callable[[str, Optional[List[str]]], pd.DataFrame],
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """Return the cached frame for file_path, loading it with loader on a miss.
+
+        With columns, a cached full frame is projected; otherwise only those
+        columns are loaded and cached separately. Returned frames are shared
+        between requests and must not be mutated.
+        """
+        version = file_version(file_path)
+        projection = tuple(columns) if columns is not None else None
+        with self._lock:
+            df = self._lookup((file_path, None), version)
+            if df is not None:
+                self.hits += 1
+                return df[list(projection)] if projection is not None else df
+            if projection is not None:
+                df = self._lookup((file_path, projection), version)
+                if df is not None:
+                    self.hits += 1
+                    return df
+            self.misses += 1
+
+        df = loader(file_path, columns)
+        self.put(file_path, version, df, projection)
+        return df
+
+    def fingerprint(self, file_path: str) -> str:
+        """Digest of a file's bytes, recomputed only when its version changes"""
+        version = file_version(file_path)
+        with self._lock:
+            cached = self._fingerprints.get(file_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        with self._lock:
+            self._fingerprints[file_path] = (version, digest.hexdigest())
+        return digest.hexdigest()
+
+    def put(self, file_path: str, version: tuple, df: pd.DataFrame, projection: Optional[tuple] = None) -> None:
+        key = (file_path, projection)
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self._drop(key)
+            if nbytes > self.max_bytes:
+                # Larger than the whole budget: serve it but don't keep it
+                return
+            self._entries[key] = (version, df, nbytes)
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _lookup(self, key: tuple, version: tuple) -> Optional[pd.DataFrame]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def invalidate(self, file_path: str) -> None:
+        """Forget every cached frame and the fingerprint of file_path (called on upload/delete)"""
+        with self._lock:
+            self._fingerprints.pop(file_path, None)
+            keys = [key for key in self._entries if key[0] == file_path]
+            for key in keys:
+                self._drop(key)
+            if keys:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._fingerprints.clear()
+            self._total_bytes = 0
+
+    def _drop(self, key: tuple) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._total_bytes -= entry[2]
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "datasets": sorted({os.path.basename(key[0]) for key in self._entries}),
+            }
+
+
+# Shared cache used by load_csv
+dataset_cache = DatasetCache()
@@ -0,0 +1,56 @@
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Clients may store responses but must revalidate them (cheap: 304 on match)
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def weak_etag(*parts) -> str:
+    """Weak validator over everything that determines a representation.
+
+    Weak, because the same data may be sent gzip-, brotli- or un-compressed.
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return f'W/"{digest.hexdigest()}"'
+
+
+def validator_headers(etag: str, last_modified: Optional[float]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float]) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the validators"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have whole-second resolution
+    return int(last_modified) <= since
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,335 @@
+import codecs
+import csv
+import logging
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from dataset_cache import file_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - columnar sidecars are optional
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Stored row-offset index of a CSV without a Parquet sidecar
+ROW_INDEX_SUFFIX = ".rowindex.json"
+# Stored compact dtypes of a CSV (see compact.py)
+SCHEMA_SUFFIX = ".schema.json"
+
+# Parquet metadata keys recording which CSV version a sidecar was built from
+SOURCE_SIZE_KEY = b"chat_with_data.source_size"
+SOURCE_MTIME_KEY = b"chat_with_data.source_mtime_ns"
+
+# Upload streaming configuration
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+MAX_HEADER_BYTES = 64 * 1024
+# Multipart boundaries and part headers around the uploaded file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Rows per chunk when writing the Parquet sidecar of an upload
+CONVERT_CHUNK_ROWS = int(os.getenv("CONVERT_CHUNK_ROWS", "100000"))
+
+# CSVs at least this large are never parsed whole (see out_of_core.py)
+OUT_OF_CORE_THRESHOLD_BYTES = int(os.getenv("OUT_OF_CORE_THRESHOLD_BYTES", str(200 * 1024 * 1024)))
+
+
+def sidecar_path(csv_path: str, suffix: str = ".parquet") -> str:
+    """Path of a derived artifact stored next to its source CSV"""
+    root, _ = os.path.splitext(csv_path)
+    return root + suffix
+
+
+def remove_sidecars(csv_path: str) -> None:
+    """Delete the columnar sidecar, row index and schema of a CSV (the CSV itself is untouched)"""
+    for suffix in (".parquet", ROW_INDEX_SUFFIX, SCHEMA_SUFFIX):
+        path = sidecar_path(csv_path, suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def is_out_of_core(csv_path: str) -> bool:
+    """Whether a CSV is too large to load as one frame"""
+    try:
+        return os.path.getsize(csv_path) >= OUT_OF_CORE_THRESHOLD_BYTES
+    except OSError:
+        return False
+
+
+def _sidecar_is_current(csv_path: str, parquet_path: str) -> bool:
+    if not os.path.exists(parquet_path):
+        return False
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+    except Exception:
+        return False
+    size, mtime_ns = file_version(csv_path)
+    return (
+        metadata.get(SOURCE_SIZE_KEY) == str(size).encode()
+        and metadata.get(SOURCE_MTIME_KEY) == str(mtime_ns).encode()
+    )
+
+
+def describe_columnar(csv_path: str) -> Optional[Tuple[int, Dict[str, str]]]:
+    """Row count and pandas dtypes from an up-to-date sidecar's footer.
+
+    Reads no column data; None when there is no current sidecar.
+    """
+    if pq is None:
+        return None
+    parquet_path = sidecar_path(csv_path)
+    if not _sidecar_is_current(csv_path, parquet_path):
+        return None
+    metadata = pq.read_metadata(parquet_path)
+    dtypes = metadata.schema.to_arrow_schema().empty_table().to_pandas().dtypes
+    return metadata.num_rows, {str(col): str(dtype) for col, dtype in dtypes.items()}
+
+
+def csv_header(csv_path: str) -> List[str]:
+    """Column names of a CSV, reading only its header line"""
+    return [str(c) for c in pd.read_csv(csv_path, nrows=0).columns]
+
+
+def convert_to_columnar(csv_path: str) -> pd.DataFrame:
+    """Parse a CSV once and write a Parquet sidecar with the inferred schema.
+
+    Returns the parsed frame. If the sidecar can't be written the CSV simply
+    stays the only copy; it remains the source of truth either way.
+    """
+    version = file_version(csv_path)
+    df = pd.read_csv(csv_path)
+    if pq is None:
+        return df
+    parquet_path = sidecar_path(csv_path)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[SOURCE_SIZE_KEY] = str(version[0]).encode()
+        metadata[SOURCE_MTIME_KEY] = str(version[1]).encode()
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        os.replace(tmp_path, parquet_path)
+    except Exception as e:
+        # Mixed-type columns etc. can't be stored columnar; keep reading the CSV
+        logger.warning(f"Columnar conversion skipped for {os.path.basename(csv_path)}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return df
+    return df
+
+
+def read_dataset(csv_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read a dataset, preferring its Parquet sidecar.
+
+    CSVs without an up-to-date sidecar are migrated on first access.
+    When columns is given only those columns are loaded.
+    """
+    if pq is None:
+        return pd.read_csv(csv_path, usecols=columns)
+
+    parquet_path = sidecar_path(csv_path)
+    if not _sidecar_is_current(csv_path, parquet_path):
+        if is_out_of_core(csv_path) and write_columnar(csv_path):
+            # Large files are converted chunk by chunk, never parsed whole
+            return pd.read_parquet(parquet_path, columns=columns)
+        df = convert_to_columnar(csv_path)
+        return df[columns] if columns is not None else df
+    return pd.read_parquet(parquet_path, columns=columns)
+
+
+def write_columnar(csv_path: str) -> bool:
+    """Write the Parquet sidecar of a CSV chunk by chunk, in bounded memory.
+
+    The schema inferred from the first chunk is fixed for the whole file and
+    later chunks are cast to it. Returns False (leaving no sidecar) if a later
+    chunk can't be cast; read_dataset then converts from the full frame on
+    first access.
+    """
+    if pq is None:
+        return False
+    version = file_version(csv_path)
+    parquet_path = sidecar_path(csv_path)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=CONVERT_CHUNK_ROWS):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                metadata = dict(table.schema.metadata or {})
+                metadata[SOURCE_SIZE_KEY] = str(version[0]).encode()
+                metadata[SOURCE_MTIME_KEY] = str(version[1]).encode()
+                schema = table.schema.with_metadata(metadata)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is None:
+            return False
+        writer.close()
+        writer = None
+        os.replace(tmp_path, parquet_path)
+        return True
+    except Exception as e:
+        logger.warning(f"Chunked columnar conversion skipped for {os.path.basename(csv_path)}: {e}")
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class CsvStreamValidator:
+    """Validates CSV bytes incrementally: UTF-8, header and row count.
+
+    Only the header (bounded by MAX_HEADER_BYTES) is ever buffered; rows are
+    counted by tracking quote state across chunks, so quoted newlines don't
+    start a new row.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._header_buffer = b""
+        self._in_quotes = False
+        self._last_byte = b""
+        self.header: Optional[List[str]] = None
+        self.records = 0
+
+    def feed(self, chunk: bytes) -> None:
+        try:
+            self._decoder.decode(chunk)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+
+        if self.header is None:
+            self._header_buffer += chunk
+            newline = self._header_buffer.find(b"\n")
+            if newline == -1:
+                if len(self._header_buffer) > MAX_HEADER_BYTES:
+                    raise HTTPException(status_code=400, detail="CSV header line is too long")
+            else:
+                self._parse_header(self._header_buffer[:newline])
+                self._header_buffer = b""
+
+        # Newlines only end a record outside quoted fields; splitting on the
+        # quote character alternates between outside and inside segments
+        segments = chunk.split(b'"')
+        outside = segments[1::2] if self._in_quotes else segments[0::2]
+        self.records += b"".join(outside).count(b"\n")
+        if len(segments) % 2 == 0:
+            self._in_quotes = not self._in_quotes
+        self._last_byte = chunk[-1:]
+
+    def close(self) -> None:
+        try:
+            self._decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+        if self.header is None:
+            if not self._header_buffer.strip():
+                raise HTTPException(status_code=400, detail="CSV file is empty")
+            self._parse_header(self._header_buffer)
+        if self._in_quotes:
+            raise HTTPException(status_code=400, detail="CSV file ends inside a quoted field")
+        if self._last_byte not in (b"", b"\n"):
+            # Last record has no trailing newline
+            self.records += 1
+
+    @property
+    def rows(self) -> int:
+        """Data rows, excluding the header"""
+        return max(self.records - 1, 0)
+
+    def _parse_header(self, line: bytes) -> None:
+        text = line.decode("utf-8-sig").rstrip("\r")
+        header = next(csv.reader([text]), [])
+        names = [name.strip() for name in header]
+        if not any(names):
+            raise HTTPException(status_code=400, detail="CSV file has no header row")
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise HTTPException(status_code=400, detail=f"Duplicate column names in CSV header: {duplicates}")
+        self.header = names
+
+
+async def stream_upload(file: UploadFile, dest_path: str) -> dict:
+    """Copy an upload to dest_path in fixed-size chunks, validating as it goes.
+
+    Data is written to a temp file in the destination folder and atomically
+    renamed into place, so readers never see a partial CSV. Raises
+    HTTPException (413/400) if the file is too large or fails validation;
+    oversized request bodies are already refused by UploadSizeLimitMiddleware
+    before Starlette spools them.
+    """
+    validator = CsvStreamValidator()
+    total = 0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), suffix=".upload.tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds maximum upload size of {MAX_UPLOAD_BYTES} bytes",
+                    )
+                validator.feed(chunk)
+                await run_in_threadpool(out.write, chunk)
+        validator.close()
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"bytes": total, "rows": validator.rows, "columns": validator.header}
+
+
+class UploadSizeLimitMiddleware:
+    """Refuses upload request bodies larger than MAX_UPLOAD_BYTES with a 413.
+
+    Starlette spools the whole multipart body before the endpoint runs, so
+    the limit has to hold while the body is received: a declared
+    Content-Length is checked up front and chunked bodies are counted.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Tuple[str, ...] = ("/upload-csv",),
+                 max_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.paths = paths
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        detail = f"File exceeds maximum upload size of {MAX_UPLOAD_BYTES} bytes"
+        declared = Headers(scope=scope).get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
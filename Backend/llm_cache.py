@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Response cache configuration
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(BASE_DIR, "cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case- and whitespace-insensitive form of a user prompt"""
+    return " ".join((prompt or "").lower().split())
+
+
+def cache_key(kind: str, prompt: str, model: str, temperature: float,
+              lang: Optional[str] = None, dataset_fingerprint: Optional[str] = None) -> str:
+    """Stable key for one upstream completion request"""
+    parts = {
+        "kind": kind,
+        "prompt": normalize_prompt(prompt),
+        "model": model,
+        "temperature": temperature,
+        "lang": lang,
+        "dataset": dataset_fingerprint,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + SQLite) cache of upstream completions with TTL.
+
+    The disk tier is bounded by total payload bytes; least recently used
+    entries are evicted first.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL_SECONDS,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES, memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+                 enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Access times of disk hits, written with the next store instead of per read
+        self._touched: Dict[str, float] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+                "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if now - entry[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            del self._memory[key]
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached value of key (blocking: may query SQLite)"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            value = self._memory_get(key, now)
+            if value is not None:
+                return value
+
+            try:
+                db = self._db()
+                row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+                    self.expirations += 1
+                    row = None
+                if row is not None:
+                    self._touched[key] = now
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache read failed: {e}")
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[1], row[0])
+            return row[0]
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get for async handlers: memory hits inline, SQLite in a worker thread"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._memory_get(key, time.time())
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, value: str) -> None:
+        """put for async handlers, writing SQLite in a worker thread"""
+        if self.enabled:
+            await asyncio.to_thread(self.put, key, value)
+
+    def put(self, key: str, value: str) -> None:
+        """Store value under key (blocking: writes SQLite)"""
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, now, value)
+            self.stores += 1
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, now, size),
+                )
+                if self._touched:
+                    db.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                   [(accessed, touched) for touched, accessed in self._touched.items()])
+                    self._touched.clear()
+                self._evict(db, now)
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        expired = db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+        self.expirations += max(expired, 0)
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            try:
+                self._db().execute("DELETE FROM responses")
+                self._db().commit()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache clear failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                entries, size = self._db().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            except sqlite3.Error:
+                entries, size = None, None
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Shared cache used by the chat endpoints
+llm_cache = LLMResponseCache()
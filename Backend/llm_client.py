@@ -0,0 +1,100 @@
+import json
+import os
+from typing import AsyncIterator, Callable, Optional
+
+import httpx
+
+# Connection pool limits for the upstream chat-completions API
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+
+# Per-phase timeouts (seconds); read is the wait between bytes from upstream
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "5"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def default_timeout(read: float = LLM_READ_TIMEOUT) -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=LLM_CONNECT_TIMEOUT,
+        read=read,
+        write=LLM_WRITE_TIMEOUT,
+        pool=LLM_POOL_TIMEOUT,
+    )
+
+
+def start_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Create the shared keep-alive client (transport can be swapped in tests)"""
+    global _client
+    _client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=default_timeout(),
+        transport=transport,
+    )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """The application-lifetime client; created lazily outside the app lifespan"""
+    if _client is None or _client.is_closed:
+        return start_client()
+    return _client
+
+
+async def post_json(url: str, headers: dict, body: dict, read_timeout: Optional[float] = None) -> httpx.Response:
+    """POST a JSON body over the shared pool and return the fully read response"""
+    timeout = default_timeout(read_timeout) if read_timeout is not None else httpx.USE_CLIENT_DEFAULT
+    return await get_client().post(url, headers=headers, json=body, timeout=timeout)
+
+
+async def open_stream(url: str, headers: dict, body: dict, read_timeout: Optional[float] = None) -> httpx.Response:
+    """Send a streaming request and return once upstream headers arrive.
+
+    The caller checks status_code before relaying and must aclose() the response.
+    """
+    client = get_client()
+    timeout = default_timeout(read_timeout) if read_timeout is not None else httpx.USE_CLIENT_DEFAULT
+    request = client.build_request("POST", url, headers=headers, json=body, timeout=timeout)
+    return await client.send(request, stream=True)
+
+
+async def iter_deltas(response: httpx.Response,
+                      on_usage: Optional[Callable[[dict], None]] = None) -> AsyncIterator[str]:
+    """Content deltas from an OpenAI-style chat-completions SSE stream.
+
+    on_usage receives the final usage object when the request asked for one
+    (stream_options.include_usage). A stream that ends without the [DONE]
+    marker was cut off, and raises instead of ending normally.
+    """
+    async for line in response.aiter_lines():
+        if not line.startswith("data: "):
+            continue
+        data = line[len("data: "):].strip()
+        if data == "[DONE]":
+            return
+        try:
+            obj = json.loads(data)
+        except ValueError:
+            # If parsing fails, skip the chunk
+            continue
+        if on_usage is not None and obj.get("usage"):
+            on_usage(obj["usage"])
+        delta = ((obj.get("choices") or [{}])[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+    raise httpx.RemoteProtocolError("Upstream stream ended before [DONE]")
@@ -1,20 +1,51 @@
+import asyncio
+import functools
+import glob
+import json
+import logging
 import os
-import requests
 import tempfile
 import traceback
-import math
-import time
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib
 from dotenv import load_dotenv
 import markdown as md_lib
 from bs4 import BeautifulSoup
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional
+from chart_spec import chart_fields, chart_prompt, parse_chart_spec, to_query
+from catalog import DatasetCatalog, dataset_name as catalog_dataset_name
+from dataset_cache import dataset_cache, file_version
+from llm_cache import cache_key, llm_cache
+import llm_client
+from ingest import UploadSizeLimitMiddleware, is_out_of_core, remove_sidecars, stream_upload, write_columnar
+from compact import memory_reports
+from shared_store import shared_store
+import out_of_core
+from query import (QueryTooLarge, apply_filters, filter_columns, parse_filter, query_cache, query_columns, run_query,
+                   run_query_chunked, spec_key)
+from profiling import build_profile, get_profile, invalidate_profile, render_profile
+from context_builder import build_context, invalidate_context, load_tokenizer
+import streaming
+from compression import CompressionMiddleware
+from logging_config import setup_logging
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, record_usage, registry, stage,
+    stage_duration, upstream_in_flight, upstream_responses,
+)
+from http_cache import is_not_modified, not_modified, validator_headers, weak_etag
+from plot_renderer import PLOT_DPI, PlotQueueFull, PlotTimeout, PlotWorkerDied, plot_pool
+import plot_store
+from plot_store import plot_sweeper
+from singleflight import SingleFlight, StreamFlightGroup
+from serialization import columnar_json, json_bytes_response, json_envelope, keyed_json, ndjson_batches, records_json
 
 
 # Configure matplotlib to use non-interactive backend
@@ -23,16 +54,64 @@ matplotlib.use('Agg')
 # Load environment variables
 load_dotenv()
 
+# Structured, level-controlled logging (LOG_LEVEL, LOG_FORMAT)
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # API Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-API_URL = "https://api.openai.com/v1/chat/completions"
+# Any OpenAI-compatible chat-completions endpoint (e.g. benchmarks/llm_stub.py for load tests)
+API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
 
 # Directory Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_FOLDER = os.path.join(BASE_DIR, "data")
 
+# Live metadata of every dataset, kept current by a watcher and upload/delete
+dataset_catalog = DatasetCatalog(DATA_FOLDER)
+
+# Plot images are immutable (content-addressed names)
+PLOT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Rows encoded per chunk when streaming datasets as NDJSON
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "5000"))
+# Datasets allowed in an explicit /datasets/batch selection (omitting it returns all)
+BATCH_MAX_DATASETS = int(os.getenv("BATCH_MAX_DATASETS", "50"))
+
+async def sweep_plots_periodically():
+    """Background GC keeping the plot directory within its age/size bounds"""
+    while True:
+        try:
+            await run_in_threadpool(plot_sweeper.sweep)
+        except Exception as e:
+            logger.exception(f"Plot sweep failed: {e}")
+        await asyncio.sleep(plot_store.PLOT_SWEEP_INTERVAL_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled keep-alive client for all upstream LLM calls
+    llm_client.start_client()
+    # Pre-warm the plot workers so the first /llm-chat doesn't pay for imports
+    plot_pool.start()
+    # Token counting for chat context; bounded, falls back to an estimate
+    await asyncio.to_thread(load_tokenizer)
+    # Shared dataset files left by stopped or crashed workers
+    await asyncio.to_thread(shared_store.sweep, glob.glob(os.path.join(DATA_FOLDER, "*.csv")))
+    sweeper_task = asyncio.create_task(sweep_plots_periodically())
+    catalog_stop = asyncio.Event()
+    catalog_task = asyncio.create_task(dataset_catalog.watch(catalog_stop))
+    yield
+    # Background tasks finish before anything they use is closed. The catalog
+    # task is stopped rather than cancelled: cancelling returns before
+    # watchfiles' watcher thread has exited, which crashes interpreter teardown
+    catalog_stop.set()
+    sweeper_task.cancel()
+    await asyncio.gather(sweeper_task, asyncio.wait_for(catalog_task, timeout=5), return_exceptions=True)
+    await llm_client.close_client()
+    await plot_pool.shutdown()
+
 # Create FastAPI app
-app = FastAPI(title="CSV Dashboard API", version="1.0.0")
+app = FastAPI(title="CSV Dashboard API", version="1.0.0", lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -43,17 +122,272 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Negotiated brotli/gzip for large JSON bodies
+app.add_middleware(CompressionMiddleware)
+
+# Oversized uploads are refused before Starlette spools the multipart body
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Outermost, so latency covers compression and the whole response body
+app.add_middleware(MetricsMiddleware)
+
+# OpenAI models
+MODEL_MAPPING = {
+    "deepseek": "gpt-4o-mini",  # Default to gpt-4o-mini
+    "gpt4": "gpt-4o",
+    "gpt35": "gpt-3.5-turbo",
+}
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Coalescing of identical in-flight chat requests (keyed like the response cache)
+llm_chat_flights = SingleFlight("llm-chat")
+text_chat_flights = SingleFlight("text-chat")
+text_stream_flights = StreamFlightGroup("text-chat-stream", max_ahead=streaming.STREAM_BUFFER_CHUNKS)
+
 # Pydantic Models
 class FileDeleteRequest(BaseModel):
     filename: str
 
+class DatasetSelection(BaseModel):
+    name: str
+    columns: Optional[List[str]] = None  # Projection
+    filters: Optional[List[str]] = None  # column:op:value
+    offset: int = Field(0, ge=0)
+    limit: Optional[int] = Field(None, ge=1)
+
+class BatchDatasetRequest(BaseModel):
+    datasets: Optional[List[DatasetSelection]] = None  # None = every available dataset
+    format: str = "json"  # json | columnar
+    stream: bool = False  # NDJSON, one line per dataset as it is ready
+
+class QueryAggregate(BaseModel):
+    op: str  # count | sum | mean | median | min | max | std | nunique
+    column: Optional[str] = None  # None only for count (rows per group)
+    alias: Optional[str] = None
+
+class QueryTimeBucket(BaseModel):
+    column: str
+    freq: str  # minute | hour | day | week | month | quarter | year
+
+class QuerySort(BaseModel):
+    column: str
+    descending: bool = False
+
+class QuerySpec(BaseModel):
+    dataset: str
+    filters: Optional[List[Any]] = None  # "column:op:value" or {"column", "op", "value"}
+    columns: Optional[List[str]] = None  # Projection when nothing is aggregated
+    group_by: Optional[List[str]] = None
+    time_bucket: Optional[QueryTimeBucket] = None
+    aggregates: Optional[List[QueryAggregate]] = None
+    sort: Optional[List[QuerySort]] = None
+    limit: Optional[int] = Field(None, ge=1)  # Top-N after sorting
+    format: Literal["json", "columnar"] = "json"
+
 # Utility Functions
-def load_csv(filename: str) -> pd.DataFrame:
-    """Load CSV file from data folder"""
+def load_csv(filename: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load CSV file from data folder, optionally only the given columns"""
     file_path = os.path.join(DATA_FOLDER, filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail=f"{filename} not found")
-    return pd.read_csv(file_path)
+    # Parsed frames are shared across requests; repeat loads skip parsing and
+    # cold loads map the version another worker already materialized in the
+    # shared store, or read the columnar sidecar and compact its dtypes
+    with stage("load_csv"):
+        df = dataset_cache.get(file_path, shared_store.load, columns)
+    # The first load migrates a CSV to its sidecar, which completes its catalog entry
+    dataset_catalog.loaded(filename)
+    return df
+
+def select_rows(dataset_name: str, selected: Optional[List[str]], filters: Optional[List[str]],
+                offset: int = 0, limit: Optional[int] = None):
+    """Filtered, projected page of a dataset as (page, total, next_offset)"""
+    filename = dataset_name.replace("-", "_") + ".csv"
+    file_path = os.path.join(DATA_FOLDER, filename)
+    if is_out_of_core(file_path):
+        return select_rows_out_of_core(file_path, selected, filters, offset, limit)
+    try:
+        parsed_filters = [parse_filter(f) for f in filters or []]
+        # Only load the columns needed for the projection and the filters
+        needed = None
+        if selected is not None:
+            needed = list(dict.fromkeys(selected + filter_columns(parsed_filters)))
+        try:
+            df = load_csv(filename, needed)
+        except (KeyError, ValueError):
+            raise ValueError(f"Unknown column in: {', '.join(needed or [])}")
+        df = apply_filters(df, parsed_filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if selected is not None:
+        df = df[selected]
+    total = len(df)
+    page = df.iloc[offset:offset + limit] if limit is not None else df.iloc[offset:]
+    next_offset = offset + len(page) if offset + len(page) < total else None
+    return page, total, next_offset
+
+def select_rows_out_of_core(file_path: str, selected: Optional[List[str]], filters: Optional[List[str]],
+                            offset: int = 0, limit: Optional[int] = None):
+    """select_rows for a dataset too large to load: pages are read through the row
+    index, filters are applied chunk by chunk, and a missing limit means one page"""
+    limit = limit or out_of_core.OUT_OF_CORE_PAGE_ROWS
+    try:
+        parsed_filters = [parse_filter(f) for f in filters or []]
+        needed = None
+        if selected is not None:
+            needed = list(dict.fromkeys(selected + filter_columns(parsed_filters)))
+        try:
+            with stage("load_csv"):
+                if parsed_filters:
+                    page, total = out_of_core.scan_rows(
+                        file_path, needed, lambda chunk: apply_filters(chunk, parsed_filters), offset, limit
+                    )
+                else:
+                    total = out_of_core.row_count(file_path)
+                    page = out_of_core.read_page(file_path, offset, limit, needed)
+        except (KeyError, ValueError):
+            raise ValueError(f"Unknown column in: {', '.join(needed or [])}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if selected is not None:
+        page = page[selected]
+    next_offset = offset + len(page) if offset + len(page) < total else None
+    return page, total, next_offset
+
+def ndjson_out_of_core(file_path: str, selected: Optional[List[str]], filters: Optional[List[str]], offset: int = 0):
+    """NDJSON of all matching rows of a large dataset as (line batches, total or None if filtered).
+
+    Columns are validated against the schema before the first byte is sent.
+    """
+    try:
+        parsed_filters = [parse_filter(f) for f in filters or []]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    needed = None
+    if selected is not None:
+        needed = list(dict.fromkeys(selected + filter_columns(parsed_filters)))
+    schema = out_of_core.read_schema(file_path)
+    unknown = [c for c in (needed or filter_columns(parsed_filters)) if c not in schema]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown column in: {', '.join(unknown)}")
+    total = None if parsed_filters else out_of_core.row_count(file_path)
+
+    def batches():
+        skip = offset
+        for chunk in out_of_core.iter_chunks(file_path, needed):
+            chunk = apply_filters(chunk, parsed_filters)
+            if skip:
+                dropped = min(skip, len(chunk))
+                chunk, skip = chunk.iloc[dropped:], skip - dropped
+            if selected is not None:
+                chunk = chunk[selected]
+            yield from ndjson_batches(chunk, STREAM_BATCH_ROWS)
+
+    return batches(), total
+
+def encode_selection(selection: DatasetSelection, row_format: str = "json") -> str:
+    """One batch entry as pre-encoded JSON; failures become an error entry"""
+    try:
+        page, total, next_offset = select_rows(
+            selection.name, selection.columns, selection.filters, selection.offset, selection.limit
+        )
+    except HTTPException as e:
+        return json.dumps({"name": selection.name, "error": {"status_code": e.status_code, "detail": e.detail}})
+    data_json = columnar_json(page) if row_format == "columnar" else records_json(page)
+    return json_envelope(
+        data_json,
+        name=selection.name,
+        total=total,
+        offset=selection.offset,
+        limit=selection.limit,
+        next_offset=next_offset,
+    )
+
+def available_dataset_names() -> List[str]:
+    """Dataset names (CSV files with "_" shown as "-") from the catalog"""
+    return [catalog_dataset_name(f) for f in dataset_catalog.filenames()]
+
+def listing_validators(endpoint: str):
+    """ETag and Last-Modified of a catalog listing (change on every catalog change)"""
+    dataset_catalog.filenames()  # First call scans the folder
+    return (
+        weak_etag(endpoint, dataset_catalog.epoch, dataset_catalog.generation),
+        dataset_catalog.last_changed,
+    )
+
+def cached_query(dataset: str, spec: dict, row_format: str = "json"):
+    """Run a query spec against a dataset, reusing results per file version.
+
+    Returns (encoded result, cache hit); invalid specs raise ValueError.
+    """
+    filename = dataset.replace("-", "_") + ".csv"
+    file_path = os.path.join(DATA_FOLDER, filename)
+    try:
+        version = file_version(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+
+    key = (file_path, version, spec_key(spec), row_format)
+    body = query_cache.get(key)
+    if body is not None:
+        return body, True
+
+    needed = query_columns(spec)
+    if is_out_of_core(file_path):
+        result = query_out_of_core(file_path, spec, needed)
+    else:
+        try:
+            df = load_csv(filename, needed)
+        except (KeyError, ValueError):
+            raise ValueError(f"Unknown column in: {', '.join(needed or [])}")
+        with stage("query"):
+            result = run_query(df, spec)
+
+    with stage("serialize"):
+        data_json = columnar_json(result) if row_format == "columnar" else records_json(result)
+    body = json_envelope(data_json, rows=len(result), columns=[str(c) for c in result.columns])
+    query_cache.put(key, body)
+    return body, False
+
+def query_out_of_core(file_path: str, spec: dict, needed: Optional[List[str]]) -> pd.DataFrame:
+    """run_query for a dataset too large to load, merging per-chunk results.
+
+    Queries that can't run chunk by chunk are rejected with 413 instead of loading.
+    """
+    schema = out_of_core.read_schema(file_path)
+    unknown = [c for c in needed or [] if c not in schema]
+    if unknown:
+        raise ValueError(f"Unknown column in: {', '.join(unknown)}")
+    try:
+        with stage("query"):
+            return run_query_chunked(out_of_core.iter_chunks(file_path, needed), spec)
+    except QueryTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+def dataset_dtypes(filename: str) -> Dict[str, str]:
+    """Column -> dtype of a dataset, from the catalog when it is current"""
+    entry = dataset_catalog.get(filename)
+    try:
+        current = entry is not None and entry["version"] == file_version(os.path.join(DATA_FOLDER, filename))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+    if current and entry["status"] == "ready":
+        return {column["name"]: column["dtype"] for column in entry["schema"]}
+    if is_out_of_core(os.path.join(DATA_FOLDER, filename)):
+        return out_of_core.read_schema(os.path.join(DATA_FOLDER, filename))
+    df = load_csv(filename)
+    return {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+def dataset_fingerprint(dataset: Optional[str]) -> Optional[str]:
+    """Content digest of a dataset for cache keys (None if absent)"""
+    if not dataset:
+        return None
+    file_path = os.path.join(DATA_FOLDER, dataset.replace("-", "_") + ".csv")
+    if not os.path.exists(file_path):
+        return None
+    return dataset_cache.fingerprint(file_path)
 
 def markdown_to_text(markdown_text: str) -> str:
     """Convert Markdown to plain text"""
@@ -61,108 +395,25 @@ def markdown_to_text(markdown_text: str) -> str:
     soup = BeautifulSoup(html, "html.parser")
     return soup.get_text(separator="\n")
 
-def replace_nan_with_none(obj):
-    """Replace NaN values with None for JSON serialization"""
-    if isinstance(obj, dict):
-        return {k: replace_nan_with_none(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [replace_nan_with_none(i) for i in obj]
-    elif isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        else:
-            return obj
-    else:
-        return obj
-
 def get_dataset_summary(df: pd.DataFrame) -> str:
     """Generate a comprehensive summary of the dataset for LLM context"""
-    summary = f"""
-Dataset Summary:
-- Shape: {df.shape[0]} rows, {df.shape[1]} columns
-- Columns: {', '.join(df.columns.tolist())}
-- Data types: {df.dtypes.to_dict()}
-- Missing values: {df.isnull().sum().to_dict()}
-"""
+    return render_profile(build_profile(df))
 
-    # Add sample data (first few rows)
-    if len(df) > 0:
-        sample_data = df.head(3).to_string(index=False)
-        summary += f"\nSample data:\n{sample_data}"
-
-    # Add basic statistics for numeric columns
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    if len(numeric_cols) > 0:
-        stats = df[numeric_cols].describe().to_string()
-        summary += f"\nNumeric column statistics:\n{stats}"
-
-        # Correlation analysis for multiple numeric columns
-        if len(numeric_cols) > 1:
-            try:
-                corr_matrix = df[numeric_cols].corr()
-                # Find highest correlations (excluding diagonal)
-                corr_pairs = []
-                for i in range(len(corr_matrix.columns)):
-                    for j in range(i+1, len(corr_matrix.columns)):
-                        col1, col2 = corr_matrix.columns[i], corr_matrix.columns[j]
-                        corr_val = corr_matrix.iloc[i, j]
-                        if abs(corr_val) > 0.5:  # Only strong correlations
-                            corr_pairs.append(f"{col1} & {col2}: {corr_val:.3f}")
-
-                if corr_pairs:
-                    summary += f"\nStrong correlations (>0.5):\n" + "\n".join(corr_pairs)
-            except:
-                pass
-
-    # Categorical analysis
-    categorical_cols = df.select_dtypes(include=['object']).columns
-    if len(categorical_cols) > 0:
-        summary += f"\nCategorical columns analysis:"
-        for col in categorical_cols[:3]:  # Limit to first 3 categorical columns
-            try:
-                value_counts = df[col].value_counts().head(5)
-                unique_count = df[col].nunique()
-                summary += f"\n{col} ({unique_count} unique values):\n{value_counts.to_string()}"
-            except:
-                pass
-
-    # Data quality insights
-    summary += f"\nData Quality Insights:"
-
-    # Missing data patterns
-    missing_pct = (df.isnull().sum() / len(df) * 100).round(2)
-    high_missing = missing_pct[missing_pct > 10].to_dict()
-    if high_missing:
-        summary += f"\nColumns with >10% missing data: {high_missing}"
-
-    # Outlier detection for numeric columns
-    if len(numeric_cols) > 0:
-        outlier_info = []
-        for col in numeric_cols:
-            try:
-                Q1 = df[col].quantile(0.25)
-                Q3 = df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                lower_bound = Q1 - 1.5 * IQR
-                upper_bound = Q3 + 1.5 * IQR
-                outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
-                if len(outliers) > 0:
-                    outlier_pct = (len(outliers) / len(df) * 100).round(2)
-                    outlier_info.append(f"{col}: {len(outliers)} outliers ({outlier_pct}%)")
-            except:
-                pass
-
-        if outlier_info:
-            summary += f"\nPotential outliers detected:\n" + "\n".join(outlier_info)
-
-    # Business insights prompts
-    summary += f"\n\nBusiness Context Suggestions:"
-    summary += f"\n- Look for trends, patterns, and anomalies in the data"
-    summary += f"\n- Identify key performance indicators and growth opportunities"
-    summary += f"\n- Consider seasonal patterns, category performance, and market segments"
-    summary += f"\n- Analyze relationships between different metrics for strategic insights"
-
-    return summary
+def load_dataset_context(dataset: str, question: str) -> str:
+    """Token-budgeted dataset context for a chat prompt, trimmed by relevance to the question"""
+    filename = dataset.replace("-", "_") + ".csv"
+    file_path = os.path.join(DATA_FOLDER, filename)
+    try:
+        version = file_version(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+    # The profile and the per-column fragments are built once per dataset version
+    with stage("profile"):
+        profile = get_profile(file_path, lambda: load_csv(filename))
+    with stage("context"):
+        context, report = build_context(dataset, file_path, version, profile, question)
+    logger.info("Dataset context built", extra={"dataset": dataset, **report})
+    return context
 
 # API Endpoints
 
@@ -177,92 +428,277 @@ def health_check():
 # Dataset Management Endpoints
 
 @app.get("/available-datasets")
-def get_available_datasets():
+def get_available_datasets(request: Request, response: Response):
     """Get list of available datasets"""
+    etag, last_modified = listing_validators("available-datasets")
+    cache_headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(cache_headers)
+    response.headers.update(cache_headers)
     try:
-        if not os.path.exists(DATA_FOLDER):
-            os.makedirs(DATA_FOLDER, exist_ok=True)
-            return {"datasets": []}
-            
-        files = [
-            f.replace(".csv", "").replace("_", "-")
-            for f in os.listdir(DATA_FOLDER)
-            if f.endswith(".csv")
-        ]
-        return {"datasets": files}
+        return {"datasets": available_dataset_names()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading data folder: {str(e)}")
 
 @app.get("/list-csv")
-def list_csv_files():
+def list_csv_files(request: Request, response: Response):
     """List all CSV files in the data folder"""
-    print("=== LIST-CSV ENDPOINT CALLED ===")
-    print(f"DATA_FOLDER path: {DATA_FOLDER}")
-    print(f"DATA_FOLDER exists: {os.path.exists(DATA_FOLDER)}")
-    
+    logger.debug("=== LIST-CSV ENDPOINT CALLED ===")
+    etag, last_modified = listing_validators("list-csv")
+    cache_headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(cache_headers)
+    response.headers.update(cache_headers)
+    logger.debug(f"DATA_FOLDER path: {DATA_FOLDER}")
+
     try:
-        if not os.path.exists(DATA_FOLDER):
-            print("Creating DATA_FOLDER because it doesn't exist")
-            os.makedirs(DATA_FOLDER, exist_ok=True)
-            return {"files": []}
-        
-        all_files = os.listdir(DATA_FOLDER)
-        print(f"All files in DATA_FOLDER: {all_files}")
-        
-        csv_files = [f for f in all_files if f.endswith(".csv")]
-        print(f"CSV files found: {csv_files}")
-        
+        csv_files = dataset_catalog.filenames()
+        logger.debug(f"CSV files found: {csv_files}")
+
         return {"files": csv_files}
         
     except Exception as e:
-        print(f"Error in list_csv_files: {str(e)}")
+        logger.exception(f"Error in list_csv_files: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/files")
-def list_files():
+def list_files(request: Request, response: Response):
     """List CSV files for dropdown"""
-    if not os.path.exists(DATA_FOLDER):
-        os.makedirs(DATA_FOLDER, exist_ok=True)
-    files = [f for f in os.listdir(DATA_FOLDER) if f.endswith(".csv")]
-    return {"files": files}
+    etag, last_modified = listing_validators("files")
+    cache_headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(cache_headers)
+    response.headers.update(cache_headers)
+    return {"files": dataset_catalog.filenames()}
+
+@app.get("/datasets/catalog")
+def get_dataset_catalog(request: Request, response: Response):
+    """Size, mtime, row/column counts and schema of every dataset, from memory.
+
+    Entries still being described have status "pending" and no counts yet.
+    """
+    etag, last_modified = listing_validators("catalog")
+    cache_headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(cache_headers)
+    response.headers.update(cache_headers)
+    return {"datasets": dataset_catalog.entries(), "stats": dataset_catalog.stats()}
+
+@app.get("/datasets/memory")
+def get_dataset_memory():
+    """Resident bytes and dtypes of each loaded dataset before and after dtype compaction"""
+    return {"datasets": memory_reports()}
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss/eviction counters for the dataset, LLM response and query caches"""
+    return {
+        "datasets": dataset_cache.stats(),
+        "llm": llm_cache.stats(),
+        "queries": query_cache.stats(),
+        "shared_store": shared_store.stats(),
+        # "coalesced" is the number of upstream calls saved by joining an in-flight request
+        "in_flight": {
+            "llm-chat": llm_chat_flights.stats(),
+            "text-chat": text_chat_flights.stats(),
+            "text-chat-stream": text_stream_flights.stats(),
+        },
+    }
+
+@registry.collector
+def cache_metrics():
+    """Cache, coalescing, render-pool and catalog counters, read on every scrape"""
+    for cache, stats in (("datasets", dataset_cache.stats()), ("llm", llm_cache.stats()),
+                         ("queries", query_cache.stats())):
+        labels = {"cache": cache}
+        yield "cache_entries", "gauge", "Entries held by a cache", labels, stats["entries"]
+        yield "cache_bytes", "gauge", "Bytes held by a cache", labels, stats["bytes"]
+        hits = stats.get("hits", stats.get("memory_hits", 0) + stats.get("disk_hits", 0))
+        yield "cache_hits_total", "counter", "Cache lookups answered from the cache", labels, hits
+        yield "cache_misses_total", "counter", "Cache lookups that missed", labels, stats["misses"]
+        yield "cache_evictions_total", "counter", "Entries evicted to stay within size bounds", labels, stats.get("evictions")
+        yield "cache_invalidations_total", "counter", "Invalidations that dropped entries on upload/delete", labels, stats.get("invalidations")
+    for name, flights in (("llm-chat", llm_chat_flights), ("text-chat", text_chat_flights),
+                          ("text-chat-stream", text_stream_flights)):
+        stats, labels = flights.stats(), {"endpoint": name}
+        yield "coalesce_in_flight", "gauge", "Distinct upstream calls in flight", labels, stats["in_flight"]
+        yield "coalesce_executed_total", "counter", "Upstream calls made", labels, stats["executed"]
+        yield "coalesce_joined_total", "counter", "Requests that joined an in-flight call", labels, stats["coalesced"]
+    pool = plot_pool.stats()
+    yield "plot_workers_alive", "gauge", "Live plot render workers", {}, pool["alive"]
+    yield "plot_queue_pending", "gauge", "Renders queued or running", {}, pool["pending"]
+    for outcome in ("completed", "failed", "timeouts", "rejected"):
+        yield "plot_renders_total", "counter", "Plot renders by outcome", {"outcome": outcome}, pool[outcome]
+    yield "plot_worker_restarts_total", "counter", "Plot workers replaced after dying", {}, pool["restarts"]
+    store = plot_sweeper.stats()
+    yield "plot_store_files", "gauge", "Rendered plots on disk", {}, store["files"]
+    yield "plot_store_bytes", "gauge", "Bytes of rendered plots on disk", {}, store["bytes"]
+    shared = shared_store.stats()
+    yield "shared_store_files", "gauge", "Dataset versions in the shared store", {}, shared["files"]
+    yield "shared_store_bytes", "gauge", "Bytes of dataset versions in the shared store", {}, shared["bytes"]
+    yield "shared_store_mapped", "gauge", "Shared dataset versions mapped by this process", {}, shared["mapped"]
+    yield "shared_store_materialized_total", "counter", "Dataset versions written to the shared store by this process", {}, shared["materialized"]
+    yield "shared_store_evicted_total", "counter", "Stored files removed by this process to stay within the byte cap", {}, shared["evicted"]
+    catalog = dataset_catalog.stats()
+    yield "catalog_datasets", "gauge", "Datasets in the catalog", {}, catalog["datasets"]
+    yield "catalog_pending", "gauge", "Datasets not yet described", {}, catalog["pending"]
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of request, stage, upstream and cache metrics"""
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.post("/datasets/batch")
+async def get_datasets_batch(request: BatchDatasetRequest):
+    """Several datasets, or projections of them, in one response.
+
+    Entries are loaded and encoded concurrently in worker threads. The result
+    is keyed by dataset name, or NDJSON in completion order with stream=true.
+    """
+    row_format = request.format.lower()
+    if row_format not in ("json", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be one of: json, columnar")
+    selections = request.datasets
+    if selections is None:
+        selections = [DatasetSelection(name=name) for name in available_dataset_names()]
+    elif len(selections) > BATCH_MAX_DATASETS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_DATASETS} datasets per batch")
+
+    tasks = [
+        asyncio.ensure_future(run_in_threadpool(encode_selection, selection, row_format))
+        for selection in selections
+    ]
+
+    if request.stream:
+        async def entries():
+            try:
+                for done in asyncio.as_completed(tasks):
+                    yield await done + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(entries(), media_type="application/x-ndjson")
+
+    encoded = await asyncio.gather(*tasks)
+    datasets_json = keyed_json((selection.name, entry) for selection, entry in zip(selections, encoded))
+    return json_bytes_response("{" + f'"datasets":{datasets_json}' + "}")
 
 @app.get("/{dataset_name}")
-def get_dataset(dataset_name: str):
-    """Get dataset data by name"""
+def get_dataset(
+    dataset_name: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    columns: Optional[str] = Query(None),  # Comma-separated projection
+    filters: Optional[List[str]] = Query(None, alias="filter"),  # column:op:value, repeatable
+    response_format: str = Query("json", alias="format"),  # json | ndjson | columnar
+):
+    """Get dataset data by name, optionally filtered, projected and paginated"""
+    response_format = response_format.lower()
+    if response_format not in ("json", "ndjson", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be one of: json, ndjson, columnar")
+
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+
+    # Validators come from the file version and the query alone, so an
+    # unchanged dataset is answered with 304 before anything is loaded
     filename = dataset_name.replace("-", "_") + ".csv"
-    df = load_csv(filename)
-    data = df.to_dict(orient="records")
-    data_clean = replace_nan_with_none(data)
-    return {"data": data_clean}
+    try:
+        version = file_version(os.path.join(DATA_FOLDER, filename))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+    etag = weak_etag(version, selected, filters, offset, limit, response_format)
+    last_modified = version[1] / 1e9
+    cache_headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(cache_headers)
+
+    file_path = os.path.join(DATA_FOLDER, filename)
+    if response_format == "ndjson" and limit is None and is_out_of_core(file_path):
+        # Every matching row of a large dataset, read and encoded chunk by chunk
+        rows, total = ndjson_out_of_core(file_path, selected, filters, offset)
+        headers = {"X-Total-Count": str(total)} if total is not None else {}
+        return StreamingResponse(rows, media_type="application/x-ndjson", headers={**headers, **cache_headers})
+
+    page, total, next_offset = select_rows(dataset_name, selected, filters, offset, limit)
+
+    if response_format == "ndjson":
+        # Rows are encoded batch by batch, so the first bytes go out immediately
+        return StreamingResponse(
+            ndjson_batches(page, STREAM_BATCH_ROWS),
+            media_type="application/x-ndjson",
+            headers={"X-Total-Count": str(total), **cache_headers},
+        )
+
+    with stage("serialize"):
+        data_json = columnar_json(page) if response_format == "columnar" else records_json(page)
+    return json_bytes_response(json_envelope(
+        data_json,
+        total=total,
+        offset=offset,
+        limit=limit,
+        next_offset=next_offset,
+    ), headers=cache_headers)
+
+# Query Endpoint
+
+@app.post("/query")
+def query_dataset(spec: QuerySpec):
+    """Filter/group/aggregate/sort a dataset server-side and return only the result.
+
+    Results are cached per dataset version and spec.
+    """
+    spec_dict = spec.model_dump(exclude={"dataset", "format"})
+    try:
+        body, hit = cached_query(spec.dataset, spec_dict, spec.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_bytes_response(body, headers={"X-Query-Cache": "hit" if hit else "miss"})
 
 # File Upload Endpoint
 
 @app.post("/upload-csv")
 async def upload_csv(file: UploadFile = File(...)):
     """Upload a CSV file"""
-    print(f"=== UPLOAD REQUEST START ===")
-    print(f"Received file: {file.filename}")
-    print(f"Content type: {file.content_type}")
+    logger.debug(f"=== UPLOAD REQUEST START ===")
+    logger.debug(f"Received file: {file.filename}")
+    logger.debug(f"Content type: {file.content_type}")
     
     if not file.filename.endswith(".csv"):
-        print(f"❌ Invalid file type: {file.filename}")
+        logger.warning(f"Invalid file type: {file.filename}")
         raise HTTPException(status_code=400, detail="Only .csv files are allowed")
 
     os.makedirs(DATA_FOLDER, exist_ok=True)
     file_path = os.path.join(DATA_FOLDER, file.filename)
-    print(f"Saving file to: {file_path}")
+    logger.debug(f"Saving file to: {file_path}")
 
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        print(f"✅ File saved successfully: {file.filename}")
-        print(f"File size: {len(content)} bytes")
-        print(f"=== UPLOAD REQUEST END (SUCCESS) ===")
-        return {"message": f"{file.filename} uploaded successfully"}
+        # Streamed in fixed-size chunks: memory use doesn't grow with file size
+        upload_info = await stream_upload(file, file_path)
+        dataset_cache.invalidate(file_path)
+        shared_store.invalidate(file_path)
+        query_cache.invalidate(file_path)
+        invalidate_profile(file_path)
+        invalidate_context(file_path)
+        # Parse once at ingest so later reads come from the columnar sidecar
+        await run_in_threadpool(write_columnar, file_path)
+        await run_in_threadpool(dataset_catalog.update, file.filename)
+        logger.info("File uploaded", extra={"file": file.filename, "bytes": upload_info["bytes"], "rows": upload_info["rows"]})
+        logger.debug(f"=== UPLOAD REQUEST END (SUCCESS) ===")
+        return {
+            "message": f"{file.filename} uploaded successfully",
+            "rows": upload_info["rows"],
+            "columns": upload_info["columns"],
+            "size": upload_info["bytes"],
+        }
+    except HTTPException as e:
+        logger.warning(f"Upload rejected: {e.detail}")
+        logger.debug(f"=== UPLOAD REQUEST END (FAILED) ===")
+        raise
     except Exception as e:
-        print(f"❌ Upload error: {str(e)}")
-        print(f"=== UPLOAD REQUEST END (FAILED) ===")
+        logger.exception(f"Upload error: {str(e)}")
+        logger.debug(f"=== UPLOAD REQUEST END (FAILED) ===")
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
 # File Delete Endpoint
@@ -270,205 +706,297 @@ async def upload_csv(file: UploadFile = File(...)):
 @app.delete("/delete")
 def delete_csv_file(request: FileDeleteRequest):
     """Delete a CSV file"""
-    print(f"=== DELETE REQUEST START ===")
-    print(f"Received delete request for filename: '{request.filename}'")
-    print(f"Filename type: {type(request.filename)}")
-    print(f"Filename length: {len(request.filename)}")
-    print(f"Filename repr: {repr(request.filename)}")
+    logger.debug(f"=== DELETE REQUEST START ===")
+    logger.debug(f"Received delete request for filename: '{request.filename}'")
+    logger.debug(f"Filename type: {type(request.filename)}")
+    logger.debug(f"Filename length: {len(request.filename)}")
+    logger.debug(f"Filename repr: {repr(request.filename)}")
     
     # Check DATA_FOLDER
-    print(f"DATA_FOLDER: {DATA_FOLDER}")
-    print(f"DATA_FOLDER exists: {os.path.exists(DATA_FOLDER)}")
+    logger.debug(f"DATA_FOLDER: {DATA_FOLDER}")
+    logger.debug(f"DATA_FOLDER exists: {os.path.exists(DATA_FOLDER)}")
     
     if os.path.exists(DATA_FOLDER):
         data_contents = os.listdir(DATA_FOLDER)
-        print(f"DATA_FOLDER contents ({len(data_contents)} files):")
+        logger.debug(f"DATA_FOLDER contents ({len(data_contents)} files):")
         for i, file in enumerate(data_contents):
-            print(f"  [{i}] '{file}' (type: {type(file)}, len: {len(file)})")
+            logger.debug(f"  [{i}] '{file}' (type: {type(file)}, len: {len(file)})")
         
         # Check for exact matches
         exact_match = request.filename in data_contents
-        print(f"Exact filename match found: {exact_match}")
+        logger.debug(f"Exact filename match found: {exact_match}")
         
         # Check for case-insensitive matches
         case_insensitive_matches = [f for f in data_contents if f.lower() == request.filename.lower()]
-        print(f"Case-insensitive matches: {case_insensitive_matches}")
+        logger.debug(f"Case-insensitive matches: {case_insensitive_matches}")
         
         # Check for partial matches
         partial_matches = [f for f in data_contents if request.filename in f or f in request.filename]
-        print(f"Partial matches: {partial_matches}")
+        logger.debug(f"Partial matches: {partial_matches}")
     else:
-        print("DATA_FOLDER directory does not exist!")
+        logger.debug("DATA_FOLDER directory does not exist!")
     
     # Construct file path
     file_path = os.path.join(DATA_FOLDER, request.filename)
-    print(f"Constructed file path: '{file_path}'")
-    print(f"File path exists: {os.path.exists(file_path)}")
-    print(f"File path is file: {os.path.isfile(file_path) if os.path.exists(file_path) else 'N/A'}")
+    logger.debug(f"Constructed file path: '{file_path}'")
+    logger.debug(f"File path exists: {os.path.exists(file_path)}")
+    logger.debug(f"File path is file: {os.path.isfile(file_path) if os.path.exists(file_path) else 'N/A'}")
     
     if not os.path.exists(file_path):
-        print(f"❌ FILE NOT FOUND: {file_path}")
-        print(f"=== DELETE REQUEST END (FAILED) ===")
+        logger.warning(f"FILE NOT FOUND: {file_path}")
+        logger.debug(f"=== DELETE REQUEST END (FAILED) ===")
         raise HTTPException(status_code=404, detail="File not found")
     
     try:
-        print(f"Attempting to delete file: {file_path}")
+        logger.debug(f"Attempting to delete file: {file_path}")
         os.remove(file_path)
-        print(f"✅ File deleted successfully: {request.filename}")
-        print(f"=== DELETE REQUEST END (SUCCESS) ===")
+        remove_sidecars(file_path)
+        invalidate_profile(file_path)
+        invalidate_context(file_path)
+        dataset_cache.invalidate(file_path)
+        shared_store.invalidate(file_path)
+        query_cache.invalidate(file_path)
+        dataset_catalog.remove(request.filename)
+        logger.info("File deleted", extra={"file": request.filename})
+        logger.debug(f"=== DELETE REQUEST END (SUCCESS) ===")
         return {"message": f"{request.filename} deleted successfully"}
     except PermissionError as e:
-        print(f"❌ Permission error deleting file: {e}")
-        print(f"=== DELETE REQUEST END (PERMISSION ERROR) ===")
+        logger.exception(f"Permission error deleting file: {e}")
+        logger.debug(f"=== DELETE REQUEST END (PERMISSION ERROR) ===")
         raise HTTPException(status_code=403, detail="Permission denied")
     except Exception as e:
-        print(f"❌ Unexpected error deleting file: {e}")
-        print(f"=== DELETE REQUEST END (ERROR) ===")
+        logger.exception(f"Unexpected error deleting file: {e}")
+        logger.debug(f"=== DELETE REQUEST END (ERROR) ===")
         raise HTTPException(status_code=500, detail=f"Error deleting file: {str(e)}")
 
 # Chat Endpoints
 
+async def post_upstream(endpoint: str, headers: dict, body: dict) -> httpx.Response:
+    """POST a chat completion upstream, recording latency, status and token usage"""
+    upstream_in_flight.inc(endpoint)
+    try:
+        with stage("upstream"):
+            response = await llm_client.post_json(API_URL, headers, body)
+    except httpx.TimeoutException:
+        upstream_responses.inc(endpoint, "timeout")
+        raise
+    finally:
+        upstream_in_flight.dec(endpoint)
+    upstream_responses.inc(endpoint, response.status_code)
+    if response.status_code == 200:
+        record_usage(endpoint, response.json().get("usage"))
+    return response
+
+async def chat_completion(body: dict, endpoint: str = "llm-chat") -> str:
+    """Run one chat completion upstream and return the reply text.
+
+    Upstream failures are raised as HTTP errors (401, 502, 504).
+    """
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    logger.debug(f"Sending request to {API_URL}")
+    try:
+        response = await post_upstream(endpoint, headers, body)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Upstream request timed out")
+    logger.debug(f"Got response: {response.status_code}")
+
+    if response.status_code == 401:
+        logger.warning(f"API Error: Unauthorized - {response.text}")
+        raise HTTPException(status_code=401, detail="Upstream unauthorized: check OPENAI_API_KEY")
+    if response.status_code != 200:
+        error_detail = f"OpenAI API error: {response.status_code} - {response.text}"
+        logger.warning(f"API Error: {error_detail}")
+        raise HTTPException(status_code=502, detail=error_detail)
+
+    result = response.json()
+    return result["choices"][0]["message"]["content"]
+
+async def chart_spec_chat(prompt: str, dataset: str, api_model: str) -> Response:
+    """Spec mode of /llm-chat: the model picks a chart, the server computes its series.
+
+    No generated code runs and nothing is rendered; the series is returned inline.
+    """
+    filename = dataset.replace("-", "_") + ".csv"
+    dtypes = await run_in_threadpool(dataset_dtypes, filename)
+    temperature = 0.0
+    response_key = cache_key("llm-chat-spec", prompt, api_model, temperature,
+                             dataset_fingerprint=await run_in_threadpool(dataset_fingerprint, dataset))
+
+    async def generate():
+        reply = await llm_cache.aget(response_key)
+        from_cache = reply is not None
+        if not from_cache:
+            reply = await chat_completion({
+                "model": api_model,
+                "messages": [
+                    {"role": "system", "content": "You are a data visualization assistant. You describe charts as JSON specs."},
+                    {"role": "user", "content": chart_prompt(prompt, dtypes)}
+                ],
+                "temperature": temperature,
+                "response_format": {"type": "json_object"},
+            }, endpoint="llm-chat-spec")
+        try:
+            chart = parse_chart_spec(reply, dtypes)
+        except ValueError as e:
+            raise HTTPException(status_code=502, detail=f"Model returned an invalid chart spec: {e}")
+
+        try:
+            result, _ = await run_in_threadpool(cached_query, dataset, to_query(chart), "columnar")
+        except ValueError as e:
+            raise HTTPException(status_code=502, detail=f"Chart spec could not be computed: {e}")
+        if not from_cache:
+            # Only specs that actually computed are worth replaying
+            await llm_cache.aput(response_key, reply)
+        return keyed_json([
+            ("reply", json.dumps(chart["title"] or "Here is your chart!")),
+            ("chart", json.dumps(chart)),
+            ("fields", json.dumps(chart_fields(chart))),
+            ("result", result),
+        ])
+
+    body = await llm_chat_flights.do(response_key, generate)
+    return json_bytes_response(body)
+
 @app.post("/llm-chat")
 async def llm_chat(
     prompt: str = Query(...),
     dataset: str = Query(...),
-    model: str = Query("deepseek")
+    model: str = Query("deepseek"),
+    mode: Literal["code", "spec"] = Query("code")  # spec: JSON chart spec + inline series
 ):
     """Generate data visualization based on prompt"""
     try:
-        print(f"LLM Chat request - Prompt: {prompt[:50]}..., Dataset: {dataset}, Model: {model}")
-        print(f"API Key exists: {bool(OPENAI_API_KEY)}")
+        logger.info("LLM chat request", extra={"dataset": dataset, "model": model, "mode": mode, "prompt": prompt[:50]})
+        logger.debug(f"API Key exists: {bool(OPENAI_API_KEY)}")
         if not OPENAI_API_KEY:
             raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
-        
+
+        api_model = MODEL_MAPPING.get(model.lower(), DEFAULT_MODEL)
+        if mode == "spec":
+            return await chart_spec_chat(prompt, dataset, api_model)
+        if is_out_of_core(os.path.join(DATA_FOLDER, dataset.replace("-", "_") + ".csv")):
+            # Generated code needs the whole frame in memory; spec mode aggregates in chunks
+            raise HTTPException(status_code=413, detail="Dataset is too large to plot with generated code; use mode=spec")
+
         enhanced_prompt = f"""
 Given a dataset loaded as 'df' (pandas DataFrame), generate Python matplotlib code to: {prompt}
 
 Requirements:
-- Use only matplotlib.pyplot (imported as plt)
+- Draw on the provided matplotlib Figure 'fig' and Axes 'ax' using their methods; pyplot (plt) is not available
+- Pass ax=ax to pandas plotting calls (e.g. df.plot(ax=ax))
 - The DataFrame 'df' is already loaded
 - Don't include import statements for pandas or matplotlib
-- Don't include plt.show() or plt.savefig() - these will be handled automatically
+- Don't create figures or call show() or savefig() - saving is handled automatically
 - Make the plot clear and readable with proper labels
 - Handle any potential column name variations gracefully
 
 Generate only the plotting code:
 """
 
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        # OpenAI models
-        MODEL_MAPPING = {
-            "deepseek": "gpt-4o-mini",  # Default to gpt-4o-mini
-            "gpt4": "gpt-4o",
-            "gpt35": "gpt-3.5-turbo",
-        }
-
-        api_model = MODEL_MAPPING.get(model.lower(), "gpt-4o-mini")
-
-        body = {
-            "model": api_model,
-            "messages": [
-                {"role": "system", "content": "You are a helpful data visualization assistant. Generate clean, working matplotlib code."},
-                {"role": "user", "content": enhanced_prompt}
-            ],
-            "temperature": 0.3
-        }
-
-        print(f"Sending request to {API_URL}")
-        response = requests.post(API_URL, headers=headers, json=body, timeout=30)
-        print(f"Got response: {response.status_code}")
-
-        if response.status_code == 401:
-            print(f"API Error: Unauthorized - {response.text}")
-            raise HTTPException(status_code=401, detail="Upstream unauthorized: check OPENAI_API_KEY")
-        if response.status_code != 200:
-            error_detail = f"OpenAI API error: {response.status_code} - {response.text}"
-            print(f"API Error: {error_detail}")
-            raise HTTPException(status_code=502, detail=error_detail)
-
-        result = response.json()
-        llm_response = result["choices"][0]["message"]["content"]
-
-        filename = dataset.replace("-", "_") + ".csv"
-        df = load_csv(filename)
-
-        plt.clf()
-        plt.close('all')
-
-        local_vars = {"pd": pd, "df": df, "plt": plt}
-
-        timestamp = int(time.time())
-        output_filename = f"plot_{dataset}_{timestamp}.png"
-        output_path = os.path.join(tempfile.gettempdir(), output_filename)
-
-        # Clean up code from markdown formatting
-        code_to_execute = llm_response.strip()
-        if code_to_execute.startswith("```python"):
-            code_to_execute = code_to_execute[9:]
-        elif code_to_execute.startswith("```"):
-            code_to_execute = code_to_execute[3:]
-        if code_to_execute.endswith("```"):
-            code_to_execute = code_to_execute[:-3]
-
-        safe_code = f"""
-{code_to_execute}
-plt.tight_layout()
-plt.savefig(r'{output_path}', dpi=150, bbox_inches='tight')
-plt.close()
-"""
-
-        try:
-            exec(safe_code, {"__builtins__": __builtins__}, local_vars)
-        except Exception as e:
-            tb = traceback.format_exc()
-            print(f"Generated code failed: {e}")
-            # Fallback plotting if generated code fails
-            fallback_code = f"""
-plt.figure(figsize=(10, 6))
-if len(df.columns) >= 2:
-    plt.scatter(df.iloc[:, 0], df.iloc[:, 1])
-    plt.xlabel(df.columns[0])
-    plt.ylabel(df.columns[1])
-    plt.title('Scatter Plot of {df.columns[0]} vs {df.columns[1]}')
-else:
-    plt.plot(df.iloc[:, 0])
-    plt.xlabel('Index')
-    plt.ylabel(df.columns[0])
-    plt.title('Plot of {df.columns[0]}')
-plt.tight_layout()
-plt.savefig(r'{output_path}', dpi=150, bbox_inches='tight')
-plt.close()
-"""
-            try:
-                exec(fallback_code, {"__builtins__": __builtins__}, local_vars)
-            except Exception as fallback_error:
-                raise HTTPException(
-                    status_code=500,
-                    detail=(
-                        f"Both generated and fallback plots failed.\n"
-                        f"Original error: {str(e)}\n"
-                        f"Fallback error: {str(fallback_error)}\n"
-                        f"Traceback:\n{tb}"
-                    )
-                )
+        temperature = 0.3
+
+        # Generated code is cached per prompt, model and dataset content; the
+        # kind is versioned so code written against pyplot isn't replayed
+        fingerprint = await run_in_threadpool(dataset_fingerprint, dataset)
+        response_key = cache_key("llm-chat-figure", prompt, api_model, temperature,
+                                 dataset_fingerprint=fingerprint)
+
+        async def generate():
+            code_to_execute = await llm_cache.aget(response_key)
+            from_cache = code_to_execute is not None
+
+            if from_cache:
+                logger.info("LLM cache hit: reusing generated plotting code")
+            else:
+                body = {
+                    "model": api_model,
+                    "messages": [
+                        {"role": "system", "content": "You are a helpful data visualization assistant. Generate clean, working matplotlib code."},
+                        {"role": "user", "content": enhanced_prompt}
+                    ],
+                    "temperature": temperature
+                }
+
+                llm_response = await chat_completion(body)
+
+                # Clean up code from markdown formatting
+                code_to_execute = llm_response.strip()
+                if code_to_execute.startswith("```python"):
+                    code_to_execute = code_to_execute[9:]
+                elif code_to_execute.startswith("```"):
+                    code_to_execute = code_to_execute[3:]
+                if code_to_execute.endswith("```"):
+                    code_to_execute = code_to_execute[:-3]
+
+            # Plots are stored under a hash of code, dataset content and render
+            # settings, so an identical request reuses the image without rendering
+            key = plot_store.plot_key(code_to_execute, fingerprint, PLOT_DPI)
+            output_filename = plot_store.plot_filename(key)
+            timings = {}
+
+            if plot_store.lookup(key) is not None:
+                logger.info(f"Plot store hit: {output_filename}")
+            else:
+                filename = dataset.replace("-", "_") + ".csv"
+                df = await run_in_threadpool(load_csv, filename)
+                temp_path = plot_store.reserve_temp_path(key)
+                try:
+                    # Rendering runs in a pre-warmed worker process with its own pyplot
+                    # state, wall-clock and memory limits; the frame is sent as a copy
+                    try:
+                        render = await plot_pool.render(code_to_execute, df, temp_path, PLOT_DPI)
+                    except PlotQueueFull as e:
+                        raise HTTPException(status_code=503, detail=str(e))
+                    except PlotTimeout as e:
+                        raise HTTPException(status_code=504, detail=str(e))
+                    except PlotWorkerDied as e:
+                        raise HTTPException(status_code=500, detail=str(e))
+
+                    for phase, seconds in render["timings"].items():
+                        if phase != "total":
+                            stage_duration.observe(f"render_{phase}", value=seconds)
+                    timings = {k: round(v * 1000, 1) for k, v in render["timings"].items()}
+                    logger.info("Plot rendered", extra={"plot": output_filename, **{f"{k}_ms": v for k, v in timings.items()}})
+                    if not render["ok"]:
+                        raise HTTPException(
+                            status_code=500,
+                            detail=(
+                                f"Both generated and fallback plots failed.\n"
+                                f"Original error: {render['error']}\n"
+                                f"Fallback error: {render.get('fallback_error')}\n"
+                                f"Traceback:\n{render.get('traceback', '')}"
+                            )
+                        )
+                    if render["used_fallback"]:
+                        logger.warning(f"Generated code failed: {render['error']}")
+                    elif not from_cache:
+                        # Only code that actually rendered is worth replaying
+                        await llm_cache.aput(response_key, code_to_execute)
+
+                    if not os.path.exists(temp_path):
+                        raise HTTPException(status_code=500, detail="Plot file was not generated")
+                    plot_store.commit(key, temp_path)
+                finally:
+                    # No-op once committed; cleans up failed or cancelled renders
+                    plot_store.discard(temp_path)
 
-        if not os.path.exists(output_path):
-            raise HTTPException(status_code=500, detail="Plot file was not generated")
+            return {
+                "reply": "Here is your plot!",
+                "imageUrl": f"/plot/{output_filename}",
+                "code_used": code_to_execute,
+                "render_ms": timings
+            }
 
-        return {
-            "reply": "Here is your plot!",
-            "imageUrl": f"/plot/{output_filename}",
-            "code_used": code_to_execute
-        }
+        # Identical requests already in flight share one upstream call and render
+        return await llm_chat_flights.do(response_key, generate)
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Unexpected error in llm_chat: {e}")
+        logger.exception(f"Unexpected error in llm_chat: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 @app.post("/text-chat")
@@ -478,74 +1006,95 @@ async def text_chat(
 ):
     """Text-based chat with optional dataset context"""
     try:
-        print(f"Text chat request - Prompt: {prompt[:50]}..., Dataset: {dataset}")
+        logger.info("Text chat request", extra={"dataset": dataset, "prompt": prompt[:50]})
         if not OPENAI_API_KEY:
             raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
+
+        temperature = 0.7
+        response_key = cache_key("text-chat", prompt, DEFAULT_MODEL, temperature,
+                                 dataset_fingerprint=await run_in_threadpool(dataset_fingerprint, dataset))
+        cached_reply = await llm_cache.aget(response_key)
+        if cached_reply is not None:
+            return cached_reply
         
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-        }
+        async def generate():
+            headers = {
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json",
+            }
 
-        # Base system message
-        system_message = "You are a helpful data analyst. Provide clear, relevant insights based on the user's specific question."
+            # Base system message
+            system_message = "You are a helpful data analyst. Provide clear, relevant insights based on the user's specific question."
+
+            # If dataset is provided, load it and add context. Fixed instructions
+            # come first so the prompt prefix is the same across questions
+            if dataset:
+                try:
+                    dataset_context = await run_in_threadpool(load_dataset_context, dataset, prompt)
+                    system_message += "\n\nAnswer the user's question directly using the dataset information. Only provide detailed analytical insights if specifically asked for business analysis, trends, or strategic recommendations."
+                    system_message += f"\n\nYou have access to a dataset with the following information:\n{dataset_context}"
+                except Exception as e:
+                    # If dataset loading fails, continue without it but mention the error
+                    dataset_context = f"\n\nNote: Could not load dataset '{dataset}': {str(e)}"
+                    system_message += dataset_context
+
+            user_message = prompt
+            if dataset:
+                user_message = f"[Context: Analyzing dataset '{dataset}']\n\n{prompt}"
+
+            body = {
+                "model": DEFAULT_MODEL,  # Using OpenAI's GPT-4 mini model
+                "messages": [
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": user_message}
+                ],
+                "temperature": temperature
+            }
 
-        # If dataset is provided, load it and add context
-        if dataset:
-            try:
-                filename = dataset.replace("-", "_") + ".csv"
-                df = load_csv(filename)
-                dataset_summary = get_dataset_summary(df)
-                dataset_context = f"\n\nYou have access to a dataset with the following comprehensive information:\n{dataset_summary}"
-                system_message += dataset_context
-                system_message += "\n\nAnswer the user's question directly using the dataset information. Only provide detailed analytical insights if specifically asked for business analysis, trends, or strategic recommendations."
-            except Exception as e:
-                # If dataset loading fails, continue without it but mention the error
-                dataset_context = f"\n\nNote: Could not load dataset '{dataset}': {str(e)}"
-                system_message += dataset_context
-
-        user_message = prompt
-        if dataset:
-            user_message = f"[Context: Analyzing dataset '{dataset}']\n\n{prompt}"
-
-        body = {
-            "model": "gpt-4o-mini",  # Using OpenAI's GPT-4 mini model
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            "temperature": 0.7
-        }
+            response = await post_upstream("text-chat", headers, body)
 
-        response = requests.post(API_URL, headers=headers, json=body, timeout=30)
-        
-        if response.status_code == 401:
-            print(f"Text chat API unauthorized: {response.text}")
-            raise HTTPException(status_code=401, detail="Upstream unauthorized: check OPENAI_API_KEY")
-        if response.status_code != 200:
-            print(f"Text chat API error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=502, detail=f"API error: {response.status_code}")
-
-        result = response.json()
-        markdown_reply = result["choices"][0]["message"]["content"]
-        plain_text_reply = markdown_to_text(markdown_reply)
-        # Remove newline characters and clean up spacing
-        clean_reply = plain_text_reply.replace('\n', ' ').replace('\r', ' ')
-        clean_reply = ' '.join(clean_reply.split())
-        return clean_reply
+            if response.status_code == 401:
+                logger.warning(f"Text chat API unauthorized: {response.text}")
+                raise HTTPException(status_code=401, detail="Upstream unauthorized: check OPENAI_API_KEY")
+            if response.status_code != 200:
+                logger.warning(f"Text chat API error: {response.status_code} - {response.text}")
+                raise HTTPException(status_code=502, detail=f"API error: {response.status_code}")
+
+            result = response.json()
+            markdown_reply = result["choices"][0]["message"]["content"]
+            plain_text_reply = markdown_to_text(markdown_reply)
+            # Remove newline characters and clean up spacing
+            clean_reply = plain_text_reply.replace('\n', ' ').replace('\r', ' ')
+            clean_reply = ' '.join(clean_reply.split())
+            await llm_cache.aput(response_key, clean_reply)
+            return clean_reply
+
+        # Concurrent duplicates wait for the same upstream reply
+        return await text_chat_flights.do(response_key, generate)
 
     except Exception as e:
-        print(f"Text chat error: {e}")
+        logger.exception(f"Text chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.post("/text-chat/stream")
 async def text_chat_stream(
+    request: Request,
     prompt: str = Query(...),
     dataset: str = Query(None),
-    lang: str = Query("en")
+    lang: str = Query("en"),
+    stream_format: Optional[str] = Query(None, alias="format")  # text | sse
 ):
-    """Stream text chat responses token-by-token. Returns text/plain stream."""
+    """Stream text chat responses token-by-token.
+
+    Returns a text/plain stream, or server-sent events with format=sse
+    (or an Accept: text/event-stream header).
+    """
     try:
+        if stream_format is None:
+            use_sse = "text/event-stream" in request.headers.get("accept", "")
+        else:
+            use_sse = stream_format.lower() == "sse"
+
         if not OPENAI_API_KEY:
             raise HTTPException(status_code=500, detail="Server missing OPENAI_API_KEY")
 
@@ -556,77 +1105,121 @@ async def text_chat_stream(
 
         # Base system message with language control
         lang = (lang or "en").lower()
-        if lang == "ar":
-            system_message = (
-                "You are a helpful AI assistant. Respond in Arabic only. "
-                "Use clear, natural Arabic phrasing."
-            )
-        else:
-            system_message = "You are a helpful AI assistant. Provide clear, concise, and helpful responses."
+        temperature = 0.7
+        response_key = cache_key("text-chat-stream", prompt, DEFAULT_MODEL, temperature,
+                                 lang=lang, dataset_fingerprint=await run_in_threadpool(dataset_fingerprint, dataset))
+        cached_reply = await llm_cache.aget(response_key)
+        if cached_reply is not None:
+            if use_sse:
+                return StreamingResponse(streaming.replay_sse(cached_reply), media_type="text/event-stream")
+            return StreamingResponse(streaming.replay_text(cached_reply), media_type="text/plain")
+
+        async def open_upstream():
+            if lang == "ar":
+                system_message = (
+                    "You are a helpful AI assistant. Respond in Arabic only. "
+                    "Use clear, natural Arabic phrasing."
+                )
+            else:
+                system_message = "You are a helpful AI assistant. Provide clear, concise, and helpful responses."
+
+            # Optional dataset context, after the fixed instructions
+            if dataset:
+                try:
+                    dataset_context = await run_in_threadpool(load_dataset_context, dataset, prompt)
+                    system_message += ("\n\nWhen answering questions about the data, refer to this dataset information. "
+                                       "Provide insights and analysis based on the summary provided.")
+                    system_message += f"\n\nYou have access to a dataset with the following information:\n{dataset_context}"
+                except Exception as e:
+                    system_message += f"\n\nNote: Could not load dataset '{dataset}': {str(e)}"
+
+            user_message = prompt if not dataset else f"[Context: Analyzing dataset '{dataset}']\n\n{prompt}"
+
+            body = {
+                "model": DEFAULT_MODEL,
+                "messages": [
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": user_message},
+                ],
+                "temperature": temperature,
+                "stream": True,
+                # The last chunk then carries token usage for the metrics
+                "stream_options": {"include_usage": True},
+            }
 
-        # Optional dataset context
-        if dataset:
             try:
-                filename = dataset.replace("-", "_") + ".csv"
-                df = load_csv(filename)
-                dataset_summary = get_dataset_summary(df)
-                dataset_context = f"\n\nYou have access to a dataset with the following information:\n{dataset_summary}"
-                system_message += dataset_context
-                system_message += ("\n\nWhen answering questions about the data, refer to this dataset information. "
-                                   "Provide insights and analysis based on the summary provided.")
-            except Exception as e:
-                system_message += f"\n\nNote: Could not load dataset '{dataset}': {str(e)}"
-
-        user_message = prompt if not dataset else f"[Context: Analyzing dataset '{dataset}']\n\n{prompt}"
-
-        body = {
-            "model": "gpt-4o-mini",
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message},
-            ],
-            "temperature": 0.7,
-            "stream": True,
-        }
-
-        def event_stream():
-            with requests.post(API_URL, headers=headers, json=body, stream=True, timeout=60) as r:
-                if r.status_code == 401:
+                with stage("upstream_first_byte"):
+                    upstream = await llm_client.open_stream(API_URL, headers, body, read_timeout=60)
+            except httpx.TimeoutException:
+                upstream_responses.inc("text-chat-stream", "timeout")
+                raise HTTPException(status_code=504, detail="Upstream request timed out")
+            except httpx.TransportError as e:
+                upstream_responses.inc("text-chat-stream", "error")
+                raise HTTPException(status_code=502, detail=f"Upstream connection error: {str(e)}")
+            upstream_responses.inc("text-chat-stream", upstream.status_code)
+
+            # Check the upstream status before any bytes are sent, so failures
+            # surface as real HTTP statuses instead of a truncated 200 stream
+            if upstream.status_code != 200:
+                error_text = (await upstream.aread()).decode("utf-8", errors="replace")
+                await upstream.aclose()
+                logger.warning(f"Streaming API error: {upstream.status_code} - {error_text[:500]}")
+                if upstream.status_code == 401:
                     raise HTTPException(status_code=401, detail="Upstream unauthorized: check OPENAI_API_KEY")
-                if r.status_code != 200:
-                    raise HTTPException(status_code=502, detail=f"API error: {r.status_code}")
-                for line in r.iter_lines(decode_unicode=True):
-                    if not line:
-                        continue
-                    if line.startswith("data: "):
-                        data = line[len("data: "):].strip()
-                        if data == "[DONE]":
-                            break
-                        try:
-                            obj = __import__("json").loads(data)
-                            delta = obj.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                            if delta:
-                                yield delta
-                        except Exception:
-                            # If parsing fails, skip the chunk
-                            continue
-
-        return StreamingResponse(event_stream(), media_type="text/plain")
+                if upstream.status_code == 429:
+                    raise HTTPException(status_code=429, detail="Upstream rate limit exceeded")
+                raise HTTPException(status_code=502, detail=f"API error: {upstream.status_code}")
+
+            upstream_in_flight.inc("text-chat-stream")
+
+            async def close():
+                upstream_in_flight.dec("text-chat-stream")
+                await upstream.aclose()
+
+            on_usage = functools.partial(record_usage, "text-chat-stream")
+            return llm_client.iter_deltas(upstream, on_usage), close
+
+        # Identical streams already in flight are fanned out from one upstream
+        # request; it is closed as soon as the last subscriber disconnects
+        store_reply = functools.partial(llm_cache.aput, response_key)
+        flight = text_stream_flights.join(response_key, open_upstream, store_reply)
+        await flight.opened()
+        deltas = flight.iterate()
+        if use_sse:
+            return StreamingResponse(
+                streaming.sse_stream(deltas, flight.unsubscribe),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        return StreamingResponse(streaming.text_stream(deltas, flight.unsubscribe), media_type="text/plain")
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Streaming text chat error: {e}")
+        logger.exception(f"Streaming text chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 # Plot Serving Endpoint
 
 @app.get("/plot/{filename}")
-def serve_plot(filename: str):
-    """Serve generated plot images"""
-    full_path = os.path.join(tempfile.gettempdir(), filename)
-    if not os.path.exists(full_path):
+def serve_plot(filename: str, request: Request):
+    """Serve generated plot images.
+
+    Names are content hashes, so a name always maps to the same bytes: the
+    hash is a strong ETag and the image can be cached forever.
+    """
+    full_path = plot_store.plot_path(filename)
+    if full_path is None or not os.path.exists(full_path):
         raise HTTPException(status_code=404, detail="Plot image not found")
-    return FileResponse(full_path, media_type="image/png")
+    etag = f'"{filename[:-len(".png")]}"'
+    cache_headers = {"ETag": etag, "Cache-Control": PLOT_CACHE_CONTROL}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=cache_headers)
+    return FileResponse(full_path, media_type="image/png", headers=cache_headers)
+
+@app.get("/render/stats")
+def get_render_stats():
+    """Plot worker pool status, per-render counters and plot store usage"""
+    return {**plot_pool.stats(), "store": plot_sweeper.stats()}
 
 # Options Endpoints for CORS
 
@@ -662,11 +1255,11 @@ async def debug_hf_connection():
             "temperature": 0.1
         }
         
-        print(f"Testing OpenAI API with key: {OPENAI_API_KEY[:10]}...")
-        response = requests.post(API_URL, headers=headers, json=test_payload, timeout=30)
+        logger.info(f"Testing OpenAI API with key: {OPENAI_API_KEY[:10]}...")
+        response = await llm_client.post_json(API_URL, headers, test_payload)
         
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
+        logger.info(f"Response status: {response.status_code}")
+        logger.debug(f"Response headers: {dict(response.headers)}")
         
         if response.status_code == 200:
             result = response.json()
@@ -691,14 +1284,14 @@ async def debug_hf_connection():
                 "response_headers": dict(response.headers)
             }
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         return {
             "status": "error",
-            "message": "Request to OpenAI API timed out (30s)",
+            "message": f"Request to OpenAI API timed out ({llm_client.LLM_READ_TIMEOUT:g}s)",
             "hf_connected": False,
             "api_key_exists": bool(OPENAI_API_KEY)
         }
-    except requests.exceptions.ConnectionError as e:
+    except httpx.TransportError as e:
         return {
             "status": "error",
             "message": f"Connection error: {str(e)}",
@@ -765,7 +1358,7 @@ async def debug_simple_request():
             "max_tokens": 5
         }
         
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=10)
+        response = await llm_client.post_json(API_URL, headers, payload, read_timeout=10)
         
         return {
             "status_code": response.status_code,
@@ -827,10 +1420,10 @@ def delete_openai_key():
 # Main execution
 if __name__ == "__main__":
     import uvicorn
-    print("Starting FastAPI server...")
-    print(f"Data folder: {DATA_FOLDER}")
-    print("Debug endpoints available:")
-    print("- GET /debug/hf-connection - Test OpenAI API connection")
-    print("- GET /debug/environment - Check environment setup")
-    print("- GET /debug/test-simple-request - Test minimal API request")
+    logger.info("Starting FastAPI server...")
+    logger.debug(f"Data folder: {DATA_FOLDER}")
+    logger.info("Debug endpoints available:")
+    logger.info("- GET /debug/hf-connection - Test OpenAI API connection")
+    logger.info("- GET /debug/environment - Check environment setup")
+    logger.info("- GET /debug/test-simple-request - Test minimal API request")
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
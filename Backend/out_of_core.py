@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import file_version
+from ingest import (
+    CONVERT_CHUNK_ROWS, ROW_INDEX_SUFFIX, _sidecar_is_current, csv_header, pq, sidecar_path,
+)
+
+# Rows per chunk when scanning a large dataset
+OUT_OF_CORE_CHUNK_ROWS = int(os.getenv("OUT_OF_CORE_CHUNK_ROWS", str(CONVERT_CHUNK_ROWS)))
+# Page size of a large dataset read without a limit
+OUT_OF_CORE_PAGE_ROWS = int(os.getenv("OUT_OF_CORE_PAGE_ROWS", "10000"))
+# Rows between entries of a CSV's row-offset index
+ROW_INDEX_STRIDE = int(os.getenv("ROW_INDEX_STRIDE", "10000"))
+# Bytes read at a time while building the row index
+ROW_INDEX_BLOCK_BYTES = 4 * 1024 * 1024
+
+_indexes: dict = {}  # csv path -> (file version, index)
+_indexes_lock = threading.Lock()
+
+
+def _parquet_path(csv_path: str) -> Optional[str]:
+    """The Parquet sidecar when it is current, else None (the CSV is read directly)"""
+    if pq is None:
+        return None
+    parquet_path = sidecar_path(csv_path)
+    return parquet_path if _sidecar_is_current(csv_path, parquet_path) else None
+
+
+def _build_csv_index(csv_path: str) -> dict:
+    """Byte offset of every ROW_INDEX_STRIDE-th row, in one streaming pass.
+
+    A newline ends a row only outside quotes (an even number of quote
+    characters so far), so quoted fields may contain line breaks.
+    """
+    offsets: List[int] = []
+    rows = 0          # data rows ended so far
+    header_done = False
+    quotes = 0        # quote characters seen so far
+    position = 0      # byte offset of the current block
+    last_end = 0      # offset just past the last row terminator
+    size = os.path.getsize(csv_path)
+    with open(csv_path, "rb") as f:
+        while True:
+            block = f.read(ROW_INDEX_BLOCK_BYTES)
+            if not block:
+                break
+            data = np.frombuffer(block, dtype=np.uint8)
+            quote_positions = np.flatnonzero(data == ord('"'))
+            newlines = np.flatnonzero(data == ord("\n"))
+            quotes_before = quotes + np.searchsorted(quote_positions, newlines)
+            ends = newlines[quotes_before % 2 == 0] + position + 1
+            quotes += len(quote_positions)
+            if len(ends):
+                # Number of the data row starting after each terminator (0 after the header)
+                if header_done:
+                    numbers = rows + 1 + np.arange(len(ends))
+                else:
+                    numbers = np.arange(len(ends))
+                    header_done = True
+                rows = int(numbers[-1])
+                offsets.extend(ends[(numbers % ROW_INDEX_STRIDE == 0) & (ends < size)].tolist())
+                last_end = int(ends[-1])
+            position += len(block)
+    if header_done and last_end < size:
+        rows += 1  # Last row without a trailing newline
+    return {"rows": rows, "stride": ROW_INDEX_STRIDE, "offsets": offsets}
+
+
+def _csv_index(csv_path: str) -> dict:
+    """Row-offset index of a CSV, built once per file version and stored next to it"""
+    version = file_version(csv_path)
+    with _indexes_lock:
+        cached = _indexes.get(csv_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    index_path = sidecar_path(csv_path, ROW_INDEX_SUFFIX)
+    index = None
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("source_version") == list(version) and stored.get("stride") == ROW_INDEX_STRIDE:
+            index = stored
+    except (OSError, ValueError):
+        pass
+    if index is None:
+        index = _build_csv_index(csv_path)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"source_version": list(version), **index}, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass  # Rebuilt on next use
+
+    with _indexes_lock:
+        _indexes[csv_path] = (version, index)
+    return index
+
+
+def row_count(csv_path: str) -> int:
+    """Rows of a dataset from the Parquet footer or the row index, without parsing values"""
+    parquet_path = _parquet_path(csv_path)
+    if parquet_path is not None:
+        return pq.ParquetFile(parquet_path).metadata.num_rows
+    return _csv_index(csv_path)["rows"]
+
+
+def read_schema(csv_path: str) -> Dict[str, str]:
+    """Column -> pandas dtype, from the Parquet schema or the first chunk of the CSV"""
+    parquet_path = _parquet_path(csv_path)
+    if parquet_path is not None:
+        dtypes = pq.read_schema(parquet_path).empty_table().to_pandas().dtypes
+    else:
+        dtypes = pd.read_csv(csv_path, nrows=OUT_OF_CORE_CHUNK_ROWS).dtypes
+    return {str(col): str(dtype) for col, dtype in dtypes.items()}
+
+
+def iter_chunks(csv_path: str, columns: Optional[List[str]] = None,
+                chunk_rows: int = OUT_OF_CORE_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """The dataset as consecutive frames of at most chunk_rows rows"""
+    parquet_path = _parquet_path(csv_path)
+    if parquet_path is not None:
+        for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(csv_path, usecols=columns, chunksize=chunk_rows)
+
+
+def read_page(csv_path: str, offset: int, limit: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Rows [offset, offset + limit), reading only the row groups or index stride covering them"""
+    parquet_path = _parquet_path(csv_path)
+    if parquet_path is not None:
+        parquet = pq.ParquetFile(parquet_path)
+        groups, first_row, start = [], None, 0
+        for group in range(parquet.metadata.num_row_groups):
+            rows = parquet.metadata.row_group(group).num_rows
+            if start + rows > offset and start < offset + limit:
+                groups.append(group)
+                first_row = start if first_row is None else first_row
+            start += rows
+        if not groups:
+            return parquet.schema_arrow.empty_table().select(columns or parquet.schema_arrow.names).to_pandas()
+        df = parquet.read_row_groups(groups, columns=columns).to_pandas()
+        return df.iloc[offset - first_row:offset - first_row + limit].reset_index(drop=True)
+
+    index = _csv_index(csv_path)
+    names = csv_header(csv_path)
+    stride = offset // index["stride"]
+    if stride >= len(index["offsets"]):
+        return pd.DataFrame(columns=columns or names)
+    skip = offset - stride * index["stride"]
+    with open(csv_path, "rb") as f:
+        f.seek(index["offsets"][stride])
+        df = pd.read_csv(f, header=None, names=names, usecols=columns, nrows=skip + limit)
+    return df.iloc[skip:].reset_index(drop=True)
+
+
+def scan_rows(csv_path: str, columns: Optional[List[str]], keep: Callable[[pd.DataFrame], pd.DataFrame],
+              offset: int, limit: int) -> Tuple[pd.DataFrame, int]:
+    """Page [offset, offset + limit) of the rows kept by keep(chunk), and the total kept.
+
+    Scans every chunk to count the total, but holds only the page in memory.
+    """
+    pages = []
+    empty = None
+    total = 0
+    for chunk in iter_chunks(csv_path, columns):
+        kept = keep(chunk)
+        if empty is None:
+            empty = kept.iloc[:0]
+        start, end = max(offset - total, 0), min(offset + limit - total, len(kept))
+        if start < end:
+            pages.append(kept.iloc[start:end])
+        total += len(kept)
+    if pages:
+        return pd.concat(pages, ignore_index=True), total
+    return (empty if empty is not None else pd.DataFrame(columns=columns or [])), total
@@ -0,0 +1,310 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from typing import Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Render pool configuration
+PLOT_WORKERS = int(os.getenv("PLOT_WORKERS", "2"))
+PLOT_QUEUE_DEPTH = int(os.getenv("PLOT_QUEUE_DEPTH", "8"))  # Jobs allowed to wait for a worker
+PLOT_TIMEOUT_SECONDS = float(os.getenv("PLOT_TIMEOUT_SECONDS", "30"))
+PLOT_MEMORY_LIMIT_MB = int(os.getenv("PLOT_MEMORY_LIMIT_MB", "2048"))  # Address-space cap per worker, 0 = off
+PLOT_DPI = 150
+
+
+class PlotQueueFull(Exception):
+    """More render jobs are waiting than PLOT_QUEUE_DEPTH allows"""
+
+
+class PlotTimeout(Exception):
+    """A render job exceeded its wall-clock limit and its worker was killed"""
+
+
+class PlotWorkerDied(Exception):
+    """A worker process exited mid-job (e.g. killed by the OS)"""
+
+
+# ---- Worker process side ----
+
+def _new_figure():
+    """Figure and Axes drawn with the OO API, independent of pyplot's global state"""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    return fig, fig.subplots()
+
+
+def _fallback_figure(df: pd.DataFrame):
+    """Simple scatter/line plot of the first columns"""
+    fig, ax = _new_figure()
+    if len(df.columns) >= 2:
+        ax.scatter(df.iloc[:, 0], df.iloc[:, 1])
+        ax.set_xlabel(str(df.columns[0]))
+        ax.set_ylabel(str(df.columns[1]))
+        ax.set_title(f"Scatter Plot of {df.columns[0]} vs {df.columns[1]}")
+    else:
+        ax.plot(df.iloc[:, 0])
+        ax.set_xlabel("Index")
+        ax.set_ylabel(str(df.columns[0]))
+        ax.set_title(f"Plot of {df.columns[0]}")
+    return fig
+
+
+def _save(fig, output_path: str, dpi: int) -> None:
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=dpi, bbox_inches="tight")
+
+
+def _render(job: dict) -> dict:
+    import matplotlib.pyplot as plt
+
+    df = job["df"]
+    timings = {}
+    started = time.perf_counter()
+    # Generated code draws on the fig/ax it is given; pyplot isn't exposed
+    fig, ax = _new_figure()
+    local_vars = {"pd": pd, "df": df, "fig": fig, "ax": ax}
+    try:
+        exec(job["code"], {"__builtins__": __builtins__}, local_vars)
+        timings["exec"] = time.perf_counter() - started
+        if plt.get_fignums():
+            # e.g. df.plot() without ax=ax, which draws on a new pyplot figure
+            raise ValueError("Generated code drew outside the provided fig/ax")
+        save_started = time.perf_counter()
+        _save(fig, job["output_path"], job["dpi"])
+        timings["savefig"] = time.perf_counter() - save_started
+        return {"ok": True, "used_fallback": False, "timings": timings}
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        tb = traceback.format_exc()
+    finally:
+        plt.close("all")
+
+    try:
+        fallback_started = time.perf_counter()
+        _save(_fallback_figure(df), job["output_path"], job["dpi"])
+        timings["fallback"] = time.perf_counter() - fallback_started
+        return {"ok": True, "used_fallback": True, "error": error, "traceback": tb, "timings": timings}
+    except Exception as fallback_error:
+        return {
+            "ok": False,
+            "error": error,
+            "fallback_error": str(fallback_error),
+            "traceback": tb,
+            "timings": timings,
+        }
+
+
+def _worker_main(conn, memory_limit_mb: int) -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    if memory_limit_mb > 0:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+    # Pre-warm: font cache, Agg canvas and pandas plotting paths
+    fig, ax = _new_figure()
+    pd.Series([0, 1]).plot(ax=ax)
+    fig.savefig(io.BytesIO(), format="png")
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        try:
+            result = _render(job)
+        except MemoryError:
+            plt.close("all")
+            result = {"ok": False, "error": f"Plot exceeded the {memory_limit_mb} MB memory limit", "timings": {}}
+        result["timings"]["total"] = sum(result["timings"].values())
+        conn.send(result)
+
+
+# ---- Server side ----
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class PlotRenderPool:
+    """Fixed set of pre-warmed matplotlib worker processes.
+
+    Each job runs alone in a worker; a job that exceeds the wall-clock limit
+    has its worker killed and replaced.
+    """
+
+    def __init__(self, workers: int = PLOT_WORKERS, timeout: float = PLOT_TIMEOUT_SECONDS,
+                 memory_limit_mb: int = PLOT_MEMORY_LIMIT_MB, queue_depth: int = PLOT_QUEUE_DEPTH):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.queue_depth = queue_depth
+        # spawn: don't fork a process that already runs the event loop and threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: Optional[asyncio.Queue] = None
+        self._all = []
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.total_render_seconds = 0.0
+
+    def start(self) -> None:
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.workers):
+            self._add_worker()
+
+    def _add_worker(self) -> None:
+        worker = _Worker(self._ctx, self.memory_limit_mb)
+        self._all.append(worker)
+        self._idle.put_nowait(worker)
+
+    def _replace(self, worker: _Worker) -> None:
+        """Kill worker and start a replacement, off the event loop (join and spawn block)"""
+        self._all.remove(worker)
+        self.restarts += 1
+        idle = self._idle
+
+        def respawn() -> _Worker:
+            worker.kill()
+            return _Worker(self._ctx, self.memory_limit_mb)
+
+        def on_done(future) -> None:
+            try:
+                replacement = future.result()
+            except Exception as e:
+                logger.error(f"Could not restart plot worker: {e}")
+                return
+            if self._idle is not idle:
+                replacement.kill()  # Pool shut down meanwhile
+                return
+            self._all.append(replacement)
+            self._idle.put_nowait(replacement)
+
+        asyncio.get_running_loop().run_in_executor(None, respawn).add_done_callback(on_done)
+
+    async def shutdown(self) -> None:
+        """Stop every worker, off the event loop (joining the processes blocks)"""
+        workers = self._all
+        self._all = []
+        self._idle = None
+        await asyncio.to_thread(self._stop, workers)
+
+    @staticmethod
+    def _stop(workers) -> None:
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.kill()
+
+    async def render(self, code: str, df: pd.DataFrame, output_path: str, dpi: int = PLOT_DPI) -> dict:
+        """Render generated plotting code to output_path in a worker process"""
+        self.start()
+        if self._pending >= self.workers + self.queue_depth:
+            self.rejected += 1
+            raise PlotQueueFull(f"Plot render queue is full ({self.queue_depth} waiting)")
+        self._pending += 1
+        try:
+            queued = time.perf_counter()
+            worker = await self._idle.get()
+            wait = time.perf_counter() - queued
+            try:
+                result = await self._run(worker, {"code": code, "df": df, "output_path": output_path, "dpi": dpi})
+            except BaseException:
+                self._replace(worker)
+                raise
+            self._idle.put_nowait(worker)
+        finally:
+            self._pending -= 1
+
+        result["timings"]["queue_wait"] = wait
+        self.total_render_seconds += result["timings"].get("total", 0.0)
+        if result["ok"]:
+            self.completed += 1
+        else:
+            self.failed += 1
+        return result
+
+    async def _run(self, worker: _Worker, job: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = worker.conn.fileno()
+
+        def on_readable():
+            if not ready.done():
+                ready.set_result(None)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            # Pickling the frame and writing it to the pipe takes a while for large frames
+            await asyncio.wait_for(self._send_and_wait(worker, job, ready), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise PlotTimeout(f"Plot rendering exceeded {self.timeout:g}s and was stopped")
+        finally:
+            loop.remove_reader(fd)
+        try:
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            raise PlotWorkerDied("Plot worker exited while rendering (memory limit or crash)")
+
+    @staticmethod
+    async def _send_and_wait(worker: _Worker, job: dict, ready: asyncio.Future) -> None:
+        try:
+            await asyncio.to_thread(worker.conn.send, job)
+        except OSError:
+            raise PlotWorkerDied("Plot worker exited before receiving the job")
+        await ready
+
+    def stats(self) -> dict:
+        rendered = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for w in self._all if w.process.is_alive()),
+            "pending": self._pending,
+            "queue_depth": self.queue_depth,
+            "timeout_seconds": self.timeout,
+            "memory_limit_mb": self.memory_limit_mb,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "avg_render_seconds": round(self.total_render_seconds / rendered, 4) if rendered else 0.0,
+        }
+
+
+# Shared pool used by /llm-chat
+plot_pool = PlotRenderPool()
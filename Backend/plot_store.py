@@ -0,0 +1,136 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Optional
+
+# Content-addressed plot storage
+PLOT_DIR = os.getenv("PLOT_DIR", os.path.join(tempfile.gettempdir(), "chat_with_data_plots"))
+PLOT_DIR_MAX_BYTES = int(os.getenv("PLOT_DIR_MAX_BYTES", str(512 * 1024 * 1024)))
+PLOT_MAX_AGE_SECONDS = float(os.getenv("PLOT_MAX_AGE_SECONDS", str(7 * 24 * 60 * 60)))
+PLOT_SWEEP_INTERVAL_SECONDS = float(os.getenv("PLOT_SWEEP_INTERVAL_SECONDS", "600"))
+
+# Bump to invalidate every stored plot when rendering changes
+PLOT_RENDER_VERSION = 1
+
+PLOT_FILENAME = re.compile(r"^[0-9a-f]{40}\.png$")
+
+
+def plot_key(code: str, dataset_fingerprint: Optional[str], dpi: int) -> str:
+    """Hash of everything that determines the rendered image"""
+    digest = hashlib.sha1()
+    for part in (str(PLOT_RENDER_VERSION), str(dpi), dataset_fingerprint or "", code):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def plot_filename(key: str) -> str:
+    return f"{key}.png"
+
+
+def plot_path(filename: str) -> Optional[str]:
+    """Absolute path of a stored plot, or None for names outside the store"""
+    if not PLOT_FILENAME.match(filename):
+        return None
+    return os.path.join(PLOT_DIR, filename)
+
+
+def lookup(key: str) -> Optional[str]:
+    """Path of an already rendered plot (refreshing its age), or None"""
+    path = os.path.join(PLOT_DIR, plot_filename(key))
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def reserve_temp_path(key: str) -> str:
+    """Unique render target; concurrent renders of one key never share a file"""
+    os.makedirs(PLOT_DIR, exist_ok=True)
+    return os.path.join(PLOT_DIR, f"{key}.{uuid.uuid4().hex}.tmp.png")
+
+
+def commit(key: str, temp_path: str) -> str:
+    """Atomically publish a rendered plot under its content address"""
+    path = os.path.join(PLOT_DIR, plot_filename(key))
+    os.replace(temp_path, path)
+    return path
+
+
+def discard(temp_path: str) -> None:
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+class PlotSweeper:
+    """Keeps the plot directory under an age and a total-size bound"""
+
+    def __init__(self, max_bytes: int = PLOT_DIR_MAX_BYTES, max_age: float = PLOT_MAX_AGE_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.sweeps = 0
+        self.removed_files = 0
+        self.removed_bytes = 0
+        self.last_sweep: Optional[float] = None
+
+    def sweep(self) -> None:
+        if not os.path.isdir(PLOT_DIR):
+            return
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry in os.scandir(PLOT_DIR):
+                if not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            # Oldest first: drop everything past max_age, then until under max_bytes
+            for mtime, size, path in sorted(entries):
+                if now - mtime <= self.max_age and total <= self.max_bytes:
+                    break
+                if path.endswith(".tmp.png") and now - mtime < 60 * 60:
+                    # Probably still being rendered
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.removed_files += 1
+                self.removed_bytes += size
+
+            self.sweeps += 1
+            self.last_sweep = now
+
+    def stats(self) -> dict:
+        files, size = 0, 0
+        if os.path.isdir(PLOT_DIR):
+            for entry in os.scandir(PLOT_DIR):
+                if entry.is_file():
+                    files += 1
+                    size += entry.stat().st_size
+        return {
+            "directory": PLOT_DIR,
+            "files": files,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age,
+            "sweeps": self.sweeps,
+            "removed_files": self.removed_files,
+            "removed_bytes": self.removed_bytes,
+            "last_sweep": self.last_sweep,
+        }
+
+
+plot_sweeper = PlotSweeper()
@@ -0,0 +1,409 @@
+import json
+import logging
+import math
+import os
+import threading
+import warnings
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import file_version
+from ingest import is_out_of_core, sidecar_path
+from out_of_core import iter_chunks
+from sketches import CoMoments, HyperLogLog, Moments, QuantileSketch, TopK
+
+logger = logging.getLogger(__name__)
+
+# Bump when the profile structure changes so stored profiles are rebuilt
+PROFILE_FORMAT_VERSION = 3
+PROFILE_SUFFIX = ".profile.json"
+# Categorical columns shown in the rendered summary (all are profiled)
+SUMMARY_CATEGORICAL_COLUMNS = 3
+
+_memo: dict = {}  # csv path -> profile of the current file version
+_memo_lock = threading.Lock()
+
+
+def _num(value) -> Optional[float]:
+    """JSON-safe float (NaN/Inf -> None)"""
+    if value is None:
+        return None
+    value = float(value)
+    if math.isnan(value) or math.isinf(value):
+        return None
+    return value
+
+
+def _cell(value):
+    if value is pd.NA:
+        return None
+    if isinstance(value, float):
+        return _num(value)
+    if hasattr(value, "item"):
+        return _cell(value.item())
+    return value
+
+
+# Absolute correlation above which a column pair is reported
+STRONG_CORRELATION = 0.5
+# Statistics reported per numeric column, in describe() order
+NUMERIC_STATS = ("count", "mean", "std", "min", "25%", "50%", "75%", "max")
+
+
+def _sorted_quantiles(sorted_values: np.ndarray, count: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated quantile per column of a NaN-last column-sorted matrix"""
+    position = (count - 1) * q
+    lower = np.clip(np.floor(position).astype(int), 0, None)
+    upper = np.clip(np.ceil(position).astype(int), 0, None)
+    fraction = position - np.floor(position)
+    lower_values = np.take_along_axis(sorted_values, lower[None, :], axis=0)[0]
+    upper_values = np.take_along_axis(sorted_values, upper[None, :], axis=0)[0]
+    result = lower_values + (upper_values - lower_values) * fraction
+    return np.where(count > 0, result, np.nan)
+
+
+def _pairwise_correlation(values: np.ndarray, present: np.ndarray, mean: np.ndarray) -> np.ndarray:
+    """Pearson correlation over pairwise-complete rows, as pandas' corr() computes it.
+
+    Expressed as matrix products so BLAS does the O(rows * cols^2) work.
+    """
+    weights = present.astype(float)
+    centered = np.where(present, values - mean, 0.0)
+    pair_count = weights.T @ weights
+    # pair_sum[i, j]: sum of column i over rows where both i and j are present
+    pair_sum = centered.T @ weights
+    pair_sum_sq = (centered * centered).T @ weights
+    covariance = centered.T @ centered - pair_sum * pair_sum.T / pair_count
+    variance = pair_sum_sq - pair_sum * pair_sum / pair_count
+    corr = covariance / np.sqrt(variance * variance.T)
+    return np.where(pair_count > 1, corr, np.nan)
+
+
+def _numeric_profile(numeric: pd.DataFrame, row_count: int) -> tuple:
+    """Describe stats, strong correlations and IQR outliers for all numeric columns at once"""
+    columns = [str(c) for c in numeric.columns]
+    values = numeric.to_numpy(dtype=float, na_value=np.nan)
+    present = ~np.isnan(values)
+
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        count = present.sum(axis=0)
+        mean = np.where(present, values, 0.0).sum(axis=0) / count
+        deviations = np.where(present, values - mean, 0.0)
+        std = np.sqrt((deviations * deviations).sum(axis=0) / (count - 1))
+        std = np.where(count > 1, std, np.nan)
+
+        # One sort (NaN last) yields min, max and all quartiles
+        sorted_values = np.sort(values, axis=0)
+        minimum = np.where(count > 0, sorted_values[0], np.nan)
+        maximum = _sorted_quantiles(sorted_values, count, 1.0)
+        q1, median, q3 = (_sorted_quantiles(sorted_values, count, q) for q in (0.25, 0.5, 0.75))
+
+        # IQR outliers as a boolean reduction; NaN compares False
+        iqr = q3 - q1
+        outside = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+        outlier_counts = outside.sum(axis=0)
+
+        correlations = []
+        if len(columns) > 1:
+            if present.all():
+                corr = np.corrcoef(values, rowvar=False)
+            else:
+                corr = _pairwise_correlation(values, present, mean)
+            # Upper triangle without the diagonal, in row-major pair order
+            rows, cols = np.triu_indices(len(columns), k=1)
+            pair_values = corr[rows, cols]
+            strong = np.abs(pair_values) > STRONG_CORRELATION
+            correlations = [
+                {"a": columns[i], "b": columns[j], "r": _num(r)}
+                for i, j, r in zip(rows[strong], cols[strong], pair_values[strong])
+            ]
+
+    stats_by_column = np.vstack([count, mean, std, minimum, q1, median, q3, maximum]).T
+    numeric_stats = {
+        col: {stat: _num(v) for stat, v in zip(NUMERIC_STATS, stats)}
+        for col, stats in zip(columns, stats_by_column)
+    }
+    outliers = [
+        {"column": col, "count": int(n), "pct": round(int(n) / row_count * 100, 2)}
+        for col, n in zip(columns, outlier_counts)
+        if n > 0
+    ]
+    return numeric_stats, correlations, outliers
+
+
+def build_profile(df: pd.DataFrame) -> dict:
+    """Compute the structured profile used to describe a dataset to the LLM.
+
+    Numeric statistics are computed on one float matrix for all numeric
+    columns together; per-column Python work is limited to formatting.
+    """
+    numeric_cols = df.select_dtypes(include=['number']).columns
+    categorical_cols = df.select_dtypes(include=['object', 'category', 'string']).columns
+    row_count = len(df)
+    missing = df.isnull().sum()
+
+    profile = {
+        "format_version": PROFILE_FORMAT_VERSION,
+        "rows": row_count,
+        "columns": [str(c) for c in df.columns],
+        "dtypes": {str(c): str(t) for c, t in df.dtypes.items()},
+        "missing": {str(c): int(n) for c, n in missing.items()},
+        "sample": [[_cell(v) for v in row] for row in df.head(3).itertuples(index=False)],
+        "numeric_stats": {},
+        "correlations": [],
+        "categorical": [],
+        "high_missing_pct": {},
+        "outliers": [],
+    }
+
+    if len(numeric_cols) > 0 and row_count > 0:
+        numeric_stats, correlations, outliers = _numeric_profile(df[numeric_cols], row_count)
+        profile["numeric_stats"] = numeric_stats
+        profile["correlations"] = correlations
+        profile["outliers"] = outliers
+
+    for col in categorical_cols:
+        # value_counts gives both the cardinality and the top values
+        # (categoricals also list unused categories with a zero count)
+        value_counts = df[col].value_counts()
+        value_counts = value_counts[value_counts > 0]
+        profile["categorical"].append({
+            "column": str(col),
+            "unique": int(len(value_counts)),
+            "top": [[_cell(v), int(n)] for v, n in value_counts.head(5).items()],
+        })
+
+    if row_count > 0:
+        missing_pct = (missing / row_count * 100).round(2)
+        profile["high_missing_pct"] = {str(c): float(p) for c, p in missing_pct[missing_pct > 10].items()}
+
+    return profile
+
+
+def build_profile_chunked(load_chunks: Callable[[], Iterator[pd.DataFrame]]) -> dict:
+    """The build_profile result computed from chunks, in bounded memory.
+
+    Moments are exact (Welford, merged per chunk); quartiles, distinct counts
+    and top values come from mergeable sketches and are approximate. IQR
+    outliers take a second pass against the approximate quartiles.
+    """
+    chunks = load_chunks()
+    first = next(chunks, None)
+    if first is None:
+        return build_profile(pd.DataFrame())
+    columns = [str(c) for c in first.columns]
+    numeric_cols = [str(c) for c in first.select_dtypes(include=['number']).columns]
+    categorical_cols = [str(c) for c in first.select_dtypes(include=['object', 'category', 'string']).columns]
+
+    def numeric_values(chunk: pd.DataFrame) -> np.ndarray:
+        # CSV chunks infer types separately; coerce stray text in numeric columns to NaN
+        frame = chunk[numeric_cols].apply(pd.to_numeric, errors="coerce")
+        return frame.to_numpy(dtype=float, na_value=np.nan)
+
+    row_count = 0
+    missing = pd.Series(0, index=first.columns, dtype="int64")
+    moments = Moments(len(numeric_cols))
+    comoments = None
+    quantiles = [QuantileSketch() for _ in numeric_cols]
+    distinct = {col: HyperLogLog() for col in categorical_cols}
+    top = {col: TopK() for col in categorical_cols}
+
+    def chunk_stream():
+        yield first
+        yield from chunks
+
+    for chunk in chunk_stream():
+        chunk.columns = columns
+        row_count += len(chunk)
+        missing += chunk.isnull().sum()
+        if numeric_cols:
+            values = numeric_values(chunk)
+            if comoments is None:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", category=RuntimeWarning)
+                    comoments = CoMoments(np.nanmean(values, axis=0))
+            moments.update(values)
+            comoments.update(values)
+            for sketch, column_values in zip(quantiles, values.T):
+                sketch.update(column_values)
+        for col in categorical_cols:
+            distinct[col].update(chunk[col])
+            top[col].update(chunk[col])
+
+    profile = {
+        "format_version": PROFILE_FORMAT_VERSION,
+        "rows": row_count,
+        "columns": columns,
+        "dtypes": {str(c): str(t) for c, t in first.dtypes.items()},
+        "missing": {str(c): int(n) for c, n in missing.items()},
+        "sample": [[_cell(v) for v in row] for row in first.head(3).itertuples(index=False)],
+        "numeric_stats": {},
+        "correlations": [],
+        "categorical": [],
+        "high_missing_pct": {},
+        "outliers": [],
+        "approximate": True,
+    }
+
+    if numeric_cols and row_count > 0:
+        q1, median, q3 = np.array([sketch.quantiles((0.25, 0.5, 0.75)) for sketch in quantiles], dtype=float).T
+        minimum = np.where(moments.count > 0, moments.min, np.nan)
+        maximum = np.where(moments.count > 0, moments.max, np.nan)
+        stats_by_column = np.vstack([moments.count, moments.mean, moments.std(), minimum, q1, median, q3, maximum]).T
+        profile["numeric_stats"] = {
+            col: {stat: _num(v) for stat, v in zip(NUMERIC_STATS, stats)}
+            for col, stats in zip(numeric_cols, stats_by_column)
+        }
+
+        if len(numeric_cols) > 1:
+            corr = comoments.correlation()
+            rows, cols = np.triu_indices(len(numeric_cols), k=1)
+            pair_values = corr[rows, cols]
+            with np.errstate(invalid="ignore"):
+                strong = np.abs(pair_values) > STRONG_CORRELATION
+            profile["correlations"] = [
+                {"a": numeric_cols[i], "b": numeric_cols[j], "r": _num(r)}
+                for i, j, r in zip(rows[strong], cols[strong], pair_values[strong])
+            ]
+
+        iqr = q3 - q1
+        outlier_counts = np.zeros(len(numeric_cols), dtype=np.int64)
+        with np.errstate(invalid="ignore"):
+            for chunk in load_chunks():
+                values = numeric_values(chunk.set_axis(columns, axis=1))
+                outlier_counts += ((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)).sum(axis=0)
+        profile["outliers"] = [
+            {"column": col, "count": int(n), "pct": round(int(n) / row_count * 100, 2)}
+            for col, n in zip(numeric_cols, outlier_counts)
+            if n > 0
+        ]
+
+    for col in categorical_cols:
+        profile["categorical"].append({
+            "column": col,
+            "unique": distinct[col].count(),
+            "top": [[_cell(v), int(n)] for v, n in top[col].top(5)],
+        })
+
+    if row_count > 0:
+        missing_pct = (missing / row_count * 100).round(2)
+        profile["high_missing_pct"] = {str(c): float(p) for c, p in missing_pct[missing_pct > 10].items()}
+
+    return profile
+
+
+def render_profile(profile: dict) -> str:
+    """Render a stored profile into the dataset summary text for the LLM prompt"""
+    summary = f"""
+Dataset Summary:
+- Shape: {profile['rows']} rows, {len(profile['columns'])} columns
+- Columns: {', '.join(profile['columns'])}
+- Data types: {profile['dtypes']}
+- Missing values: {profile['missing']}
+"""
+    if profile.get("approximate"):
+        summary += "- Quartiles, unique counts and top values are approximate (large dataset)\n"
+
+    if profile["sample"]:
+        sample_data = pd.DataFrame(profile["sample"], columns=profile["columns"]).to_string(index=False, na_rep="NaN")
+        summary += f"\nSample data:\n{sample_data}"
+
+    if profile["numeric_stats"]:
+        stats = pd.DataFrame(profile["numeric_stats"]).astype(float).to_string()
+        summary += f"\nNumeric column statistics:\n{stats}"
+
+    if profile["correlations"]:
+        corr_pairs = [f"{c['a']} & {c['b']}: {c['r']:.3f}" for c in profile["correlations"]]
+        summary += f"\nStrong correlations (>0.5):\n" + "\n".join(corr_pairs)
+
+    if profile["categorical"]:
+        summary += f"\nCategorical columns analysis:"
+        for cat in profile["categorical"][:SUMMARY_CATEGORICAL_COLUMNS]:
+            value_counts = pd.Series(
+                [count for _, count in cat["top"]],
+                index=pd.Index([value for value, _ in cat["top"]], name=cat["column"]),
+                name="count",
+            ).to_string()
+            summary += f"\n{cat['column']} ({cat['unique']} unique values):\n{value_counts}"
+
+    summary += f"\nData Quality Insights:"
+    if profile["high_missing_pct"]:
+        summary += f"\nColumns with >10% missing data: {profile['high_missing_pct']}"
+
+    if profile["outliers"]:
+        outlier_info = [f"{o['column']}: {o['count']} outliers ({o['pct']}%)" for o in profile["outliers"]]
+        summary += f"\nPotential outliers detected:\n" + "\n".join(outlier_info)
+
+    summary += f"\n\nBusiness Context Suggestions:"
+    summary += f"\n- Look for trends, patterns, and anomalies in the data"
+    summary += f"\n- Identify key performance indicators and growth opportunities"
+    summary += f"\n- Consider seasonal patterns, category performance, and market segments"
+    summary += f"\n- Analyze relationships between different metrics for strategic insights"
+
+    return summary
+
+
+def _read_stored(profile_path: str, version: tuple) -> Optional[dict]:
+    try:
+        with open(profile_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get("source_version") != list(version):
+        return None
+    profile = stored.get("profile") or {}
+    if profile.get("format_version") != PROFILE_FORMAT_VERSION:
+        return None
+    return profile
+
+
+def _write_stored(profile_path: str, version: tuple, profile: dict) -> None:
+    tmp_path = f"{profile_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # Sample values such as Timestamps are stored as their text
+            json.dump({"source_version": list(version), "profile": profile}, f, default=str)
+        os.replace(tmp_path, profile_path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not store profile {os.path.basename(profile_path)}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_profile(csv_path: str, load_frame: Callable[[], pd.DataFrame]) -> dict:
+    """Profile of the current version of a dataset.
+
+    Served from memory or the stored sidecar when the CSV hasn't changed;
+    otherwise computed from load_frame() once and persisted next to the CSV.
+    Datasets above the out-of-core threshold are profiled chunk by chunk
+    instead, without loading the frame.
+    """
+    version = file_version(csv_path)
+    with _memo_lock:
+        cached = _memo.get(csv_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    profile_path = sidecar_path(csv_path, PROFILE_SUFFIX)
+    profile = _read_stored(profile_path, version)
+    if profile is None:
+        if is_out_of_core(csv_path):
+            profile = build_profile_chunked(lambda: iter_chunks(csv_path))
+        else:
+            profile = build_profile(load_frame())
+        _write_stored(profile_path, version, profile)
+
+    with _memo_lock:
+        _memo[csv_path] = (version, profile)
+    return profile
+
+
+def invalidate_profile(csv_path: str) -> None:
+    with _memo_lock:
+        _memo.pop(csv_path, None)
+    profile_path = sidecar_path(csv_path, PROFILE_SUFFIX)
+    if os.path.exists(profile_path):
+        os.remove(profile_path)
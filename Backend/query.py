@@ -0,0 +1,447 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Operators accepted in "column:op:value" row filters
+FILTER_OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "contains", "in", "isnull", "notnull")
+
+# Aggregations accepted in query specs; the numeric ones reject text columns
+AGGREGATE_OPERATORS = ("count", "sum", "mean", "median", "min", "max", "std", "nunique")
+NUMERIC_AGGREGATES = ("sum", "mean", "median", "std")
+# Aggregates a chunked query merges exactly from per-chunk partial results
+MERGEABLE_AGGREGATES = ("count", "sum", "mean", "min", "max", "std")
+# Groups a chunked query may hold partial results for
+QUERY_MAX_GROUPS = int(os.getenv("QUERY_MAX_GROUPS", "1000000"))
+
+# Time bucket names -> pandas period frequencies
+TIME_BUCKETS = {"minute": "min", "hour": "h", "day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+
+# Memory budget for cached query results (encoded JSON bytes)
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class QueryTooLarge(Exception):
+    """A query over a dataset too large to load that can't run chunk by chunk"""
+
+
+def parse_filter(expression: str) -> dict:
+    """Parse a "column:op:value" filter expression (value may contain ':')"""
+    parts = expression.split(":", 2)
+    if len(parts) < 2 or not parts[0]:
+        raise ValueError(f"Invalid filter '{expression}', expected column:op:value")
+    column, op = parts[0], parts[1].lower()
+    value = parts[2] if len(parts) == 3 else None
+    if op not in FILTER_OPERATORS:
+        raise ValueError(f"Unknown filter operator '{op}', expected one of {', '.join(FILTER_OPERATORS)}")
+    if value is None and op not in ("isnull", "notnull"):
+        raise ValueError(f"Filter '{expression}' is missing a value")
+    return {"column": column, "op": op, "value": value}
+
+
+def filter_columns(filters: List[dict]) -> List[str]:
+    return [f["column"] for f in filters]
+
+
+def _coerce(series: pd.Series, value: Any) -> Any:
+    """Convert a filter value to the type of the column it is compared with"""
+    if isinstance(value, str):
+        if pd.api.types.is_bool_dtype(series):
+            return value.strip().lower() in ("true", "1", "yes")
+        if pd.api.types.is_numeric_dtype(series):
+            try:
+                return float(value)
+            except ValueError:
+                raise ValueError(f"Filter value '{value}' is not numeric for column '{series.name}'")
+    return value
+
+
+def filter_mask(df: pd.DataFrame, filters: List[dict]) -> pd.Series:
+    """Boolean row mask for the conjunction of all filters"""
+    mask = pd.Series(True, index=df.index)
+    for f in filters:
+        column, op, value = f["column"], f["op"], f.get("value")
+        if column not in df.columns:
+            raise ValueError(f"Unknown filter column '{column}'")
+        series = df[column]
+        if op == "isnull":
+            mask &= series.isna()
+        elif op == "notnull":
+            mask &= series.notna()
+        elif op == "contains":
+            # Missing values never match (astype(str) would turn them into "nan")
+            text = series if isinstance(series.dtype, pd.StringDtype) else series.map(str, na_action="ignore")
+            mask &= text.str.contains(str(value), case=False, regex=False, na=False).astype(bool)
+        elif op == "in":
+            values = value.split(",") if isinstance(value, str) else list(value)
+            mask &= series.isin([_coerce(series, v) for v in values])
+        else:
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Unordered categoricals only support equality; compare the values
+                series = series.astype(series.cat.categories.dtype)
+            value = _coerce(series, value)
+            try:
+                if op == "eq":
+                    mask &= series == value
+                elif op == "ne":
+                    mask &= series != value
+                elif op == "gt":
+                    mask &= series > value
+                elif op == "gte":
+                    mask &= series >= value
+                elif op == "lt":
+                    mask &= series < value
+                elif op == "lte":
+                    mask &= series <= value
+            except TypeError:
+                raise ValueError(f"Cannot compare column '{column}' with '{value}'")
+    return mask
+
+
+def apply_filters(df: pd.DataFrame, filters: Optional[List[dict]]) -> pd.DataFrame:
+    if not filters:
+        return df
+    return df[filter_mask(df, filters)]
+
+
+def parse_filters(filters: Optional[List[Any]]) -> List[dict]:
+    """Accept filters as "column:op:value" strings or {"column", "op", "value"} objects"""
+    parsed = []
+    for f in filters or []:
+        if isinstance(f, str):
+            parsed.append(parse_filter(f))
+            continue
+        value = f.get("value")
+        expression = f"{f.get('column', '')}:{f.get('op', '')}"
+        parsed.append(parse_filter(expression if value is None else f"{expression}:{value}"))
+        if value is not None and not isinstance(value, str):
+            # Keep list values of "in" (and numbers) as given
+            parsed[-1]["value"] = value
+    return parsed
+
+
+def _aggregate_name(aggregate: dict) -> str:
+    if aggregate.get("alias"):
+        return aggregate["alias"]
+    if aggregate.get("column") is None:
+        return "count"
+    return f"{aggregate['op']}_{aggregate['column']}"
+
+
+def query_columns(spec: dict) -> Optional[List[str]]:
+    """Source columns a query reads, or None when it needs every column"""
+    aggregates = spec.get("aggregates") or []
+    group_by = list(spec.get("group_by") or [])
+    bucket = spec.get("time_bucket")
+    if not aggregates and not group_by and not bucket:
+        columns = spec.get("columns")
+        if not columns:
+            return None
+        used = list(columns)
+    else:
+        used = group_by + [a["column"] for a in aggregates if a.get("column")]
+        if bucket:
+            used.append(bucket["column"])
+    used += filter_columns(parse_filters(spec.get("filters")))
+    return list(dict.fromkeys(used))
+
+
+def _prepare(df: pd.DataFrame, spec: dict) -> Tuple[pd.DataFrame, List[str]]:
+    """Filtered frame with the time bucket applied, and the group keys"""
+    df = apply_filters(df, parse_filters(spec.get("filters")))
+    group_by = list(spec.get("group_by") or [])
+    bucket = spec.get("time_bucket")
+
+    for column in group_by:
+        if column not in df.columns:
+            raise ValueError(f"Unknown group_by column '{column}'")
+
+    if bucket:
+        column, name = bucket["column"], bucket["freq"]
+        if column not in df.columns:
+            raise ValueError(f"Unknown time_bucket column '{column}'")
+        if name not in TIME_BUCKETS:
+            raise ValueError(f"Unknown time bucket '{name}', expected one of {', '.join(TIME_BUCKETS)}")
+        times = df[column] if pd.api.types.is_datetime64_any_dtype(df[column]) else \
+            pd.to_datetime(df[column], errors="coerce")
+        df = df.assign(**{column: times.dt.to_period(TIME_BUCKETS[name]).dt.start_time})
+        group_by = [column] + [c for c in group_by if c != column]
+    return df, group_by
+
+
+def _aggregates(df: pd.DataFrame, spec: dict) -> Tuple[List[dict], dict, List[str]]:
+    """Validated aggregates, as (aggregates, name -> (column, op), names of row counts)"""
+    aggregates = list(spec.get("aggregates") or []) or [{"op": "count"}]
+    named, counts = {}, []
+    for aggregate in aggregates:
+        op, column = aggregate.get("op"), aggregate.get("column")
+        if op not in AGGREGATE_OPERATORS:
+            raise ValueError(f"Unknown aggregate '{op}', expected one of {', '.join(AGGREGATE_OPERATORS)}")
+        name = _aggregate_name(aggregate)
+        if column is None:
+            if op != "count":
+                raise ValueError(f"Aggregate '{op}' needs a column")
+            counts.append(name)
+            continue
+        if column not in df.columns:
+            raise ValueError(f"Unknown aggregate column '{column}'")
+        if op in NUMERIC_AGGREGATES and not pd.api.types.is_numeric_dtype(df[column]):
+            raise ValueError(f"Aggregate '{op}' needs a numeric column, '{column}' is {df[column].dtype}")
+        named[name] = (column, op)
+    return aggregates, named, counts
+
+
+def _sort_and_limit(result: pd.DataFrame, spec: dict, group_by: List[str]) -> pd.DataFrame:
+    sort = spec.get("sort") or []
+    if sort:
+        by = [key["column"] for key in sort]
+        missing = [c for c in by if c not in result.columns]
+        if missing:
+            raise ValueError(f"Unknown sort column in: {', '.join(missing)}")
+        result = result.sort_values(by, ascending=[not key.get("descending") for key in sort], kind="stable")
+    elif spec.get("time_bucket"):
+        result = result.sort_values(group_by, kind="stable")
+
+    limit = spec.get("limit")
+    if limit is not None:
+        result = result.head(limit)
+    return result.reset_index(drop=True)
+
+
+def _select_columns(df: pd.DataFrame, spec: dict) -> pd.DataFrame:
+    columns = spec.get("columns")
+    if not columns:
+        return df
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown column in: {', '.join(missing)}")
+    return df[columns]
+
+
+def _is_aggregation(spec: dict) -> bool:
+    return bool(spec.get("aggregates") or spec.get("group_by") or spec.get("time_bucket"))
+
+
+def run_query(df: pd.DataFrame, spec: dict) -> pd.DataFrame:
+    """Filter, bucket, group, aggregate, sort and limit a frame per a declarative spec.
+
+    Every step is a vectorized pandas operation; raises ValueError for invalid specs.
+    """
+    df, group_by = _prepare(df, spec)
+    if not _is_aggregation(spec):
+        return _sort_and_limit(_select_columns(df, spec), spec, group_by)
+
+    aggregates, named, counts = _aggregates(df, spec)
+    if group_by:
+        grouped = df.groupby(group_by, sort=False, dropna=False, observed=True)
+        result = grouped.agg(**named) if named else pd.DataFrame(index=grouped.size().index)
+        if counts:
+            sizes = grouped.size()
+            for name in counts:
+                result[name] = sizes
+        # Group keys first, then aggregates in the order they were asked for
+        result = result.reset_index()[group_by + [_aggregate_name(a) for a in aggregates]]
+    else:
+        row = {name: df[column].agg(op) for name, (column, op) in named.items()}
+        row.update({name: len(df) for name in counts})
+        result = pd.DataFrame([row], columns=[_aggregate_name(a) for a in aggregates])
+    return _sort_and_limit(result, spec, group_by)
+
+
+# ---- Chunked queries over datasets too large to load ----
+
+_ALL = "\0all"  # Group key of aggregates without group_by
+_ROWS = "\0rows"
+
+
+def _partials(df: pd.DataFrame, group_by: List[str], named: dict) -> pd.DataFrame:
+    """Per group, the parts of each aggregate that merge across chunks"""
+    keys = group_by or [_ALL]
+    if not group_by:
+        df = df.assign(**{_ALL: 0})
+    grouped = df.groupby(keys, sort=False, dropna=False, observed=True)
+    parts = {_ROWS: grouped.size()}
+    for i, (column, op) in enumerate(named.values()):
+        values = grouped[column]
+        if op in ("min", "max"):
+            parts[f"\0{i}.{op}"] = values.agg(op)
+            continue
+        count = values.count()
+        parts[f"\0{i}.n"] = count
+        if op != "count":
+            parts[f"\0{i}.sum"] = values.sum()
+        if op == "std":
+            # Sum of squared deviations from the chunk's group mean
+            parts[f"\0{i}.m2"] = values.var(ddof=0) * count
+    return pd.DataFrame(parts).reset_index()
+
+
+def _merge_partials(partials: pd.DataFrame, group_by: List[str]) -> pd.DataFrame:
+    """Combine rows of the same group (Chan et al. for the squared deviations)"""
+    keys = group_by or [_ALL]
+    grouped = partials.groupby(keys, sort=False, dropna=False, observed=True)
+    merged = {}
+    for part in partials.columns.drop(keys):
+        if part.endswith(".min"):
+            merged[part] = grouped[part].min()
+        elif part.endswith(".max"):
+            merged[part] = grouped[part].max()
+        elif part.endswith(".m2"):
+            prefix = part[:-len(".m2")]
+            count, total = partials[prefix + ".n"], partials[prefix + ".sum"]
+            mean = grouped[prefix + ".sum"].transform("sum") / grouped[prefix + ".n"].transform("sum")
+            spread = (count * (total / count - mean) ** 2).where(count > 0, 0.0)
+            merged[part] = (partials[part].fillna(0.0) + spread).groupby(
+                [partials[k] for k in keys], sort=False, dropna=False, observed=True).sum()
+        else:
+            merged[part] = grouped[part].sum()
+    return pd.DataFrame(merged).reset_index()
+
+
+def _final_aggregates(merged: pd.DataFrame, named: dict, counts: List[str]) -> dict:
+    values = {}
+    for i, (name, (_, op)) in enumerate(named.items()):
+        if op in ("min", "max"):
+            values[name] = merged[f"\0{i}.{op}"]
+        elif op == "count":
+            values[name] = merged[f"\0{i}.n"]
+        elif op == "sum":
+            values[name] = merged[f"\0{i}.sum"]
+        elif op == "mean":
+            values[name] = merged[f"\0{i}.sum"] / merged[f"\0{i}.n"]
+        else:
+            count = merged[f"\0{i}.n"]
+            values[name] = np.sqrt(merged[f"\0{i}.m2"] / (count - 1)).where(count > 1)
+    for name in counts:
+        values[name] = merged[_ROWS]
+    return values
+
+
+def run_query_chunked(chunks: Iterable[pd.DataFrame], spec: dict) -> pd.DataFrame:
+    """run_query over a dataset read chunk by chunk, holding only partial results.
+
+    Aggregates are merged from per-chunk partials; raises QueryTooLarge for
+    queries that can't be (median, nunique, more than QUERY_MAX_GROUPS groups,
+    or returning rows without a limit).
+    """
+    if not _is_aggregation(spec):
+        if spec.get("limit") is None:
+            raise QueryTooLarge("Dataset is too large to return every row; add a limit or aggregate")
+        kept = None
+        for chunk in chunks:
+            chunk, _ = _prepare(chunk, spec)
+            chunk = _select_columns(chunk, spec)
+            kept = chunk if kept is None else pd.concat([kept, chunk], ignore_index=True)
+            # Sorted: the top rows so far; unsorted: the first rows, then stop
+            kept = _sort_and_limit(kept, spec, [])
+            if not spec.get("sort") and len(kept) >= spec["limit"]:
+                break
+        return kept if kept is not None else pd.DataFrame(columns=spec.get("columns") or [])
+
+    for aggregate in spec.get("aggregates") or []:
+        if aggregate.get("op") not in MERGEABLE_AGGREGATES:
+            raise QueryTooLarge(
+                f"Aggregate '{aggregate.get('op')}' isn't supported on datasets this large; "
+                f"use one of {', '.join(MERGEABLE_AGGREGATES)}"
+            )
+    merged, group_by = None, list(spec.get("group_by") or [])
+    aggregates, named, counts = [{"op": "count"}], {}, ["count"]
+    for chunk in chunks:
+        chunk, group_by = _prepare(chunk, spec)
+        aggregates, named, counts = _aggregates(chunk, spec)
+        partials = _partials(chunk, group_by, named)
+        merged = partials if merged is None else _merge_partials(pd.concat([merged, partials], ignore_index=True), group_by)
+        if len(merged) > QUERY_MAX_GROUPS:
+            raise QueryTooLarge(f"Query has more than {QUERY_MAX_GROUPS} groups on a dataset this large")
+
+    names = [_aggregate_name(a) for a in aggregates]
+    if group_by:
+        if merged is None:
+            return pd.DataFrame(columns=group_by + names)
+        result = merged[group_by].copy()
+        for name, values in _final_aggregates(merged, named, counts).items():
+            result[name] = values
+        result = result[group_by + names]
+    elif merged is None or merged.empty:
+        # No matching rows: counts and sums are 0, other aggregates missing
+        row = {name: 0 if op in ("count", "sum") else np.nan for name, (_, op) in named.items()}
+        row.update({name: 0 for name in counts})
+        result = pd.DataFrame([row], columns=names)
+    else:
+        values = _final_aggregates(merged, named, counts)
+        result = pd.DataFrame([{name: values[name].iloc[0] for name in names}], columns=names)
+    return _sort_and_limit(result, spec, group_by)
+
+
+def spec_key(spec: dict) -> str:
+    """Canonical form of a spec, independent of key order"""
+    return json.dumps(spec, sort_keys=True, default=str)
+
+
+class QueryResultCache:
+    """LRU of encoded query results keyed by (dataset path, file version, spec)"""
+
+    def __init__(self, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: str) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous)
+            self._entries[key] = value
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, file_path: str) -> None:
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == file_path]
+            for key in keys:
+                self._total_bytes -= len(self._entries.pop(key))
+            if keys:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Shared cache used by /query
+query_cache = QueryResultCache()
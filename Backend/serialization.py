@@ -0,0 +1,230 @@
+import json
+from typing import Callable, Iterable, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder is used instead
+    orjson = None
+
+# Rows encoded at a time by records_json; bounds the size of the byte grid
+RECORDS_BATCH_ROWS = 10000
+
+_NULL = b"null"
+_NULL_CELL = np.frombuffer(_NULL, dtype=np.uint8)
+
+
+def _encode(value) -> bytes:
+    """One compact JSON value; floats are written as the shortest repr that round-trips"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _encode_numbers(values: np.ndarray) -> bytes:
+    """JSON array of a bool/int/float64 array, NaN/Inf as null"""
+    if orjson is not None:
+        return orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY)
+    if values.dtype.kind == "f":
+        values = np.where(np.isfinite(values), values, None)
+    return _encode(values.tolist())
+
+
+def _pad(tokens: np.ndarray) -> np.ndarray:
+    """(len(tokens), max width) uint8 matrix of a bytes array, zero padded"""
+    return tokens.view(np.uint8).reshape(len(tokens), tokens.dtype.itemsize)
+
+
+def _widen(cells: np.ndarray, width: int) -> np.ndarray:
+    """cells zero padded to at least width bytes per row"""
+    if cells.shape[1] >= width:
+        return cells
+    wide = np.zeros((len(cells), width), dtype=np.uint8)
+    wide[:, :cells.shape[1]] = cells
+    return wide
+
+
+def _windows(buf: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Cell matrix whose row i is buf[starts[i]:starts[i] + lengths[i]], zero padded"""
+    if len(starts) == 0:
+        return np.zeros((0, 1), dtype=np.uint8)
+    width = int(lengths.max())
+    # Overlapping width-byte views of buf; the bytes past each token are zeroed
+    padded = np.concatenate((buf, np.zeros(width, np.uint8)))
+    windows = np.ndarray((len(buf), width), dtype=np.uint8, buffer=padded, strides=(1, 1))
+    cells = windows[starts]
+    cells *= np.arange(width) < lengths[:, None]
+    return cells
+
+
+def _split(encoded: bytes, rows: int) -> np.ndarray:
+    """Cell matrix of an encoded JSON array whose items contain no commas"""
+    if rows == 0:
+        return np.zeros((0, 1), dtype=np.uint8)
+    buf = np.frombuffer(encoded, dtype=np.uint8)
+    commas = np.flatnonzero(buf == ord(","))
+    starts = np.concatenate(([1], commas + 1))
+    lengths = np.concatenate((commas, [len(buf) - 1])) - starts
+    return _windows(buf, starts, lengths)
+
+
+def _encode_each(values: np.ndarray) -> np.ndarray:
+    """Cell matrix of values encoded one at a time.
+
+    Tokens go straight into one buffer: each small bytes object orjson
+    returns holds on to about 1 KiB, so a list of them is costly.
+    """
+    joined = bytearray()
+    lengths = [joined.extend(token) or len(token) for token in map(_encode, values)]
+    lengths = np.array(lengths, dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    return _windows(np.frombuffer(joined, dtype=np.uint8), starts, lengths)
+
+
+def _with_null(cells: np.ndarray) -> np.ndarray:
+    """cells with a null row appended, for lookups indexed by code -1"""
+    cells = _widen(cells, len(_NULL))
+    null = np.zeros((1, cells.shape[1]), dtype=np.uint8)
+    null[0, :len(_NULL)] = _NULL_CELL
+    return np.vstack((cells, null))
+
+
+def _value_cells(series: pd.Series) -> np.ndarray:
+    """Cell matrix of a datetime, bool or numeric column"""
+    dtype = series.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        text = np.datetime_as_string(series.to_numpy(dtype="datetime64[ms]"), unit="ms")
+        quoted = np.strings.add(np.strings.add('"', text), '"').astype(bytes)
+        quoted[series.isna().to_numpy()] = _NULL
+        return _pad(quoted)
+    if isinstance(dtype, np.dtype):
+        values = series.to_numpy(dtype=np.float64) if dtype.kind == "f" else series.to_numpy()
+        return _split(_encode_numbers(values), len(values))
+    # Nullable and Arrow-backed numbers: encode a filled array, then mask
+    numpy_dtype = np.dtype(np.float64) if dtype.numpy_dtype.kind == "f" else dtype.numpy_dtype
+    values = series.to_numpy(dtype=numpy_dtype, na_value=0)
+    cells = _split(_encode_numbers(values), len(values))
+    missing = series.isna().to_numpy()
+    if missing.any():
+        cells = _widen(cells, len(_NULL))
+        cells[missing] = 0
+        cells[missing, :len(_NULL)] = _NULL_CELL
+    return cells
+
+
+def _column_cells(series: pd.Series) -> Callable[[int, int], np.ndarray]:
+    """cells(start, stop): encoded JSON of rows [start, stop) of a column.
+
+    The result is a zero-padded uint8 matrix whose row i holds the bytes of
+    one value; NaN/Inf/NA/NaT become null. Numbers are encoded as one array
+    and dates with numpy; categories and text are encoded once per distinct
+    value and looked up by code. No Python object is created per cell, and
+    since JSON never contains a NUL byte the padding is dropped after
+    assembly.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories, codes = dtype.categories, series.cat.codes.to_numpy()
+        if len(categories) > len(codes):
+            # Fewer rows than categories: encode only the categories in use
+            used, codes = np.unique(codes, return_inverse=True)
+            if len(used) and used[0] == -1:
+                used, codes = used[1:], codes - 1
+            categories = categories[used]
+        lookup = _with_null(_column_cells(pd.Series(categories))(0, len(categories)))
+    elif pd.api.types.is_datetime64_any_dtype(dtype) or getattr(dtype, "numpy_dtype", dtype).kind in "biuf":
+        return lambda start, stop: _value_cells(series.iloc[start:stop])
+    else:
+        try:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            uniques = np.asarray(uniques, dtype=object)  # Iterating Arrow-backed arrays is slow
+        except TypeError:  # Unhashable values such as lists
+            codes, uniques = np.arange(len(series)), series.to_numpy(dtype=object)
+        lookup = _with_null(_encode_each(uniques))
+    return lambda start, stop: lookup[codes[start:stop]]  # Missing is code -1, the null row
+
+
+def _constant(token: bytes, rows: int) -> np.ndarray:
+    """The same bytes on every row, as a read-only cell matrix"""
+    return np.broadcast_to(np.frombuffer(token, dtype=np.uint8), (rows, len(token)))
+
+
+def _join(blocks: list) -> bytes:
+    """Concatenate cell matrices row by row and drop the padding"""
+    return np.concatenate(blocks, axis=1).tobytes().replace(b"\0", b"")
+
+
+def _row_batches(df: pd.DataFrame, batch_rows: int, end: bytes) -> Iterator[bytes]:
+    """Rows of a frame as JSON objects each followed by end, batch_rows at a time"""
+    keys = [(b"," if i else b"{") + _encode(str(col)) + b":" for i, col in enumerate(df.columns)]
+    columns = [_column_cells(df[col]) for col in df.columns]
+    for start in range(0, len(df), batch_rows):
+        stop = min(start + batch_rows, len(df))
+        if not columns:
+            yield (b"{}" + end) * (stop - start)
+            continue
+        blocks = []
+        for key, cells in zip(keys, columns):
+            blocks.append(_constant(key, stop - start))
+            blocks.append(cells(start, stop))
+        blocks.append(_constant(b"}" + end, stop - start))
+        yield _join(blocks)
+
+
+def records_json(df: pd.DataFrame) -> str:
+    """Encode a frame as a JSON array of row objects.
+
+    Rows are assembled RECORDS_BATCH_ROWS at a time, so only one batch's byte
+    grid is alive at once.
+    """
+    body = bytearray(b"[")
+    for batch in _row_batches(df, RECORDS_BATCH_ROWS, b","):
+        body += batch
+    if len(body) > 1:
+        body[-1:] = b"]"  # The last row's separator
+    else:
+        body += b"]"
+    return body.decode("utf-8")
+
+
+def columnar_json(df: pd.DataFrame) -> str:
+    """Encode a frame as a JSON object of column name -> array of values"""
+    parts = []
+    for col in df.columns:
+        values = _join([_column_cells(df[col])(0, len(df)), _constant(b",", len(df))])[:-1]
+        parts.append(_encode(str(col)) + b":[" + values + b"]")
+    return "{" + b",".join(parts).decode("utf-8") + "}"
+
+
+def ndjson_batches(df: pd.DataFrame, batch_rows: int) -> Iterator[str]:
+    """Encode a frame as newline-delimited JSON, one batch of rows at a time"""
+    for batch in _row_batches(df, batch_rows, b"\n"):
+        yield batch.decode("utf-8")
+
+
+def json_envelope(data_json: str, **fields) -> str:
+    """Splice pre-encoded data into {"data": ..., **fields} without re-parsing it"""
+    body = "{" + f'"data":{data_json}'
+    for key, value in fields.items():
+        body += f",{json.dumps(key)}:{json.dumps(value)}"
+    return body + "}"
+
+
+def keyed_json(entries: Iterable[Tuple[str, str]]) -> str:
+    """Join (key, pre-encoded JSON value) pairs into one JSON object"""
+    return "{" + ",".join(f"{json.dumps(key)}:{value}" for key, value in entries) + "}"
+
+
+def json_bytes_response(body: str, status_code: int = 200, headers: dict = None) -> Response:
+    """Response for already-encoded JSON, bypassing FastAPI's jsonable_encoder"""
+    return Response(
+        content=body.encode("utf-8"),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,325 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from typing import List, Optional
+
+import pandas as pd
+
+from compact import latest_report, read_compact, record_report
+from dataset_cache import file_version
+from ingest import is_out_of_core, pa
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no cross-process lock on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Datasets shared by every worker process on the host: the first process to
+# load a dataset version writes it as an uncompressed Arrow IPC file and all
+# processes memory-map that file, so string and numeric columns are views of
+# the same page-cache pages instead of a parsed copy per worker.
+SHARED_DATASET_STORE = os.getenv("SHARED_DATASET_STORE", "true").lower() in ("1", "true", "yes")
+# tmpfs when available, so the files never touch the disk
+SHARED_STORE_DIR = os.getenv(
+    "SHARED_STORE_DIR",
+    "/dev/shm/chat_with_data" if os.path.isdir("/dev/shm")
+    else os.path.join(tempfile.gettempdir(), "chat_with_data_store"),
+)
+ARROW_SUFFIX = ".arrow"
+# Bytes of stored files kept; the least recently mapped are removed beyond it
+SHARED_STORE_MAX_BYTES = int(os.getenv("SHARED_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Schema metadata key carrying the compaction report of the stored frame
+REPORT_KEY = b"chat_with_data.memory_report"
+
+
+def _types_mapper(arrow_type):
+    # string[pyarrow] columns are stored as large_string; keep them Arrow-backed
+    # (zero-copy) instead of converting every value to a Python str
+    if arrow_type == pa.large_string():
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return True
+
+
+class SharedDatasetStore:
+    """Memory-mapped Arrow IPC files of dataset versions, shared across processes.
+
+    Files are named by the dataset path and file version, so a re-uploaded
+    dataset gets a new file and every process picks it up by its version.
+    A projection is stored on its own, read from the columnar sidecar, unless
+    the full version is already stored. Within a process a mapped table is
+    reference-counted by the frames made from it and unmapped when the last
+    one is collected. Removing a file is safe while other processes still map
+    it: their pages stay valid until they unmap, and new loads materialize
+    the current version. Files beyond max_bytes are removed least recently
+    mapped first, and sweep() clears what crashed or stopped processes left.
+    """
+
+    def __init__(self, directory: str = SHARED_STORE_DIR, enabled: bool = SHARED_DATASET_STORE,
+                 max_bytes: int = SHARED_STORE_MAX_BYTES):
+        self.directory = directory
+        self.enabled = enabled and pa is not None
+        self.max_bytes = max_bytes
+        self._mapped: dict = {}  # file path -> [table, references]
+        self._lock = threading.Lock()
+        self.materialized = 0
+        self.maps = 0
+        self.reuses = 0
+        self.fallbacks = 0
+        self.oversized = 0
+        self.removed = 0
+        self.evicted = 0
+
+    def _prefix(self, csv_path: str) -> str:
+        return hashlib.blake2b(os.path.abspath(csv_path).encode("utf-8"), digest_size=8).hexdigest()
+
+    def _stem(self, csv_path: str, version: tuple) -> str:
+        size, mtime_ns = version
+        return os.path.join(self.directory, f"{self._prefix(csv_path)}-{size}-{mtime_ns}")
+
+    def _path(self, csv_path: str, version: tuple, columns: Optional[List[str]] = None) -> str:
+        """File of a version, or of one projection of it"""
+        stem = self._stem(csv_path, version)
+        if columns is None:
+            return stem + ARROW_SUFFIX
+        projection = hashlib.blake2b(json.dumps(sorted(columns)).encode("utf-8"), digest_size=8).hexdigest()
+        return f"{stem}.{projection}{ARROW_SUFFIX}"
+
+    def load(self, csv_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """The dataset (or only columns of it) as a frame backed by the shared mapping.
+
+        Numeric and Arrow string columns are read-only views of the mapped
+        file. Out-of-core datasets, and datasets that can't be stored as
+        Arrow or exceed max_bytes, are loaded as a private read_compact frame.
+        """
+        if not self.enabled or is_out_of_core(csv_path):
+            return read_compact(csv_path, columns)
+        version = file_version(csv_path)
+        try:
+            path, entry, private = self._acquire(csv_path, version, columns)
+        except (OSError, pa.ArrowException) as e:
+            with self._lock:
+                self.fallbacks += 1
+            logger.warning(f"Shared store unavailable for {os.path.basename(csv_path)}, loading privately: {e}")
+            return read_compact(csv_path, columns)
+        if private is not None:
+            return private
+        try:
+            table = entry[0] if columns is None else entry[0].select(columns)
+            df = table.to_pandas(split_blocks=True, types_mapper=_types_mapper)
+        except BaseException:
+            self._release(path, entry)
+            raise
+        weakref.finalize(df, self._release, path, entry)
+        return df
+
+    def _acquire(self, csv_path: str, version: tuple, columns: Optional[List[str]]) -> tuple:
+        """(path, [table, references] entry with one more reference, None), materializing the
+        file if needed; (None, None, frame) when the dataset is too large to store"""
+        # A stored full version serves every projection of it
+        candidates = [self._path(csv_path, version)]
+        if columns is not None:
+            candidates.append(self._path(csv_path, version, columns))
+        with self._lock:
+            for path in candidates:
+                entry = self._mapped.get(path)
+                if entry is not None:
+                    entry[1] += 1
+                    self.reuses += 1
+                    return path, entry, None
+
+        path = next((p for p in candidates if os.path.exists(p)), candidates[-1])
+        if not os.path.exists(path):
+            private = self._materialize(csv_path, version, path, columns)
+            if private is not None:
+                return None, None, private
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        try:
+            os.utime(path)  # Mapping order drives eviction
+        except OSError:
+            pass  # Evicted meanwhile; the mapping stays valid
+        report = (table.schema.metadata or {}).get(REPORT_KEY)
+        if report is not None:
+            # The materializing process measured the compaction; share its report
+            record_report(csv_path, json.loads(report))
+
+        with self._lock:
+            entry = self._mapped.get(path)
+            if entry is None:
+                entry = self._mapped[path] = [table, 0]
+                self.maps += 1
+            entry[1] += 1
+            return path, entry, None
+
+    def _release(self, path: str, entry: list) -> None:
+        with self._lock:
+            entry[1] -= 1
+            if entry[1] <= 0 and self._mapped.get(path) is entry:
+                # Unmapped once the frames still viewing its buffers are gone too
+                del self._mapped[path]
+
+    def _materialize(self, csv_path: str, version: tuple, path: str,
+                     columns: Optional[List[str]]) -> Optional[pd.DataFrame]:
+        """Write the compacted dataset (or projection) to path; one process per file does the work.
+
+        Returns the frame instead when it is larger than max_bytes.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(path):
+                    return None  # Another process wrote it while we waited
+                # Projections read only their columns from the columnar sidecar
+                df = read_compact(csv_path, columns)
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if table.nbytes > self.max_bytes:
+                    with self._lock:
+                        self.oversized += 1
+                    return df
+                report = latest_report(csv_path)
+                if report is not None:
+                    metadata = dict(table.schema.metadata or {})
+                    metadata[REPORT_KEY] = json.dumps(report).encode("utf-8")
+                    table = table.replace_schema_metadata(metadata)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                try:
+                    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                with self._lock:
+                    self.materialized += 1
+                logger.info(f"Materialized {os.path.basename(csv_path)} in the shared store",
+                            extra={"dataset": os.path.basename(csv_path), "bytes": os.path.getsize(path),
+                                   "projection": columns})
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        self._remove_files(csv_path, keep=self._stem(csv_path, version))
+        self._evict(keep=path)
+        return None
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+        except OSError:
+            return False  # Already removed by another process, or still mapped on Windows
+        if path.endswith(ARROW_SUFFIX):
+            with self._lock:
+                self.removed += 1
+                # Frames already made from it stay valid; unmapped when collected
+                self._mapped.pop(path, None)
+        return True
+
+    def _remove_files(self, csv_path: str, keep: Optional[str] = None) -> None:
+        """Remove stored files of a dataset (and their lock files), except those of the version stem keep"""
+        for path in glob.glob(os.path.join(self.directory, self._prefix(csv_path) + "-*")):
+            if keep is not None and path.startswith(keep + "."):
+                continue
+            self._remove(path)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently mapped files until the store fits in max_bytes"""
+        files = []
+        for path in glob.glob(os.path.join(self.directory, "*" + ARROW_SUFFIX)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path != keep and self._remove(path):
+                total -= size
+                with self._lock:
+                    self.evicted += 1
+
+    def sweep(self, csv_paths: List[str]) -> None:
+        """Remove what stopped or crashed processes left behind (run at startup).
+
+        Keeps files of the current versions of csv_paths; removes other
+        versions, files of datasets not in csv_paths, and temp files of
+        processes that are gone. Then applies max_bytes.
+        """
+        if not self.enabled or not os.path.isdir(self.directory):
+            return
+        current = set()
+        for csv_path in csv_paths:
+            try:
+                current.add(self._stem(csv_path, file_version(csv_path)))
+            except OSError:
+                pass  # Deleted
+        for path in glob.glob(os.path.join(self.directory, "*")):
+            if path.endswith(".tmp"):
+                pid = path[:-len(".tmp")].rsplit(".", 1)[-1]
+                if pid.isdigit() and _process_alive(int(pid)):
+                    continue  # Another worker is writing it now
+            elif any(path.startswith(stem + ".") for stem in current):
+                continue
+            self._remove(path)
+        self._evict()
+
+    def invalidate(self, csv_path: str) -> None:
+        """Remove every stored version of a dataset (called on upload/delete).
+
+        Frames already made from them stay valid; they are unmapped when collected.
+        """
+        if not self.enabled:
+            return
+        prefix = os.path.join(self.directory, self._prefix(csv_path) + "-")
+        with self._lock:
+            for path in [p for p in self._mapped if p.startswith(prefix)]:
+                del self._mapped[path]
+        self._remove_files(csv_path)
+
+    def stats(self) -> dict:
+        files = glob.glob(os.path.join(self.directory, "*" + ARROW_SUFFIX)) if self.enabled else []
+        size = 0
+        for path in files:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "directory": self.directory,
+                "files": len(files),
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "mapped": len(self._mapped),
+                "references": sum(entry[1] for entry in self._mapped.values()),
+                "materialized": self.materialized,
+                "maps": self.maps,
+                "reuses": self.reuses,
+                "fallbacks": self.fallbacks,
+                "oversized": self.oversized,
+                "removed": self.removed,
+                "evicted": self.evicted,
+            }
+
+
+shared_store = SharedDatasetStore()
@@ -0,0 +1,203 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The work runs in its own task, so a caller that disconnects doesn't cancel
+    it for the others still waiting.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+
+class StreamFlight:
+    """One upstream token stream shared by every subscriber with the same key.
+
+    Chunks are kept for the life of the flight, so a late subscriber first
+    replays what was already produced and then follows live. Upstream is read
+    at most max_ahead chunks ahead of the slowest subscriber, so a client that
+    stops reading pauses upstream as it would without sharing.
+    """
+
+    def __init__(self, group: "StreamFlightGroup", key: str, max_ahead: int):
+        self._group = group
+        self._key = key
+        self.max_ahead = max_ahead
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._wake = asyncio.Event()
+        self._positions: Dict[object, int] = {}  # iteration -> chunks it has consumed
+        self._moved = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, opener: Callable[[], Awaitable[Tuple[AsyncIterator[str], Callable[[], Awaitable[None]]]]],
+              on_complete: Optional[Callable[[str], Awaitable[None]]]) -> None:
+        self._task = asyncio.ensure_future(self._run(opener, on_complete))
+
+    async def _run(self, opener, on_complete) -> None:
+        """Read upstream into chunks; on_complete gets the text only if the
+        delta iterator finished normally (iter_deltas raises on truncation)"""
+        close = None
+        try:
+            try:
+                deltas, close = await opener()
+            except asyncio.CancelledError:
+                self.ready.cancel()
+                raise
+            except Exception as e:
+                self.ready.set_exception(e)
+                self.ready.exception()  # Retrieved by whoever awaits it, if anyone
+                raise
+            self.ready.set_result(None)
+            async for delta in deltas:
+                self.chunks.append(delta)
+                self._notify()
+                await self._wait_for_subscribers()
+            if on_complete is not None:
+                await on_complete("".join(self.chunks))
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("Stream cancelled")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            self._group._forget(self._key, self)
+            if close is not None:
+                await close()
+
+    async def _wait_for_subscribers(self) -> None:
+        """Pause while max_ahead chunks are unread by the slowest subscriber"""
+        while self.subscribers and len(self.chunks) - self._slowest() >= self.max_ahead:
+            self._moved.clear()
+            await self._moved.wait()
+
+    def _slowest(self) -> int:
+        if self.subscribers > len(self._positions):
+            return 0  # Subscribed but not iterating yet: it will replay from the start
+        return min(self._positions.values())
+
+    def _notify(self) -> None:
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    async def opened(self) -> None:
+        """Wait until upstream accepted the request.
+
+        Re-raises the opener's error (and drops the subscription) so every
+        subscriber sees the same failure status.
+        """
+        try:
+            await asyncio.shield(self.ready)
+        except BaseException:
+            await self.unsubscribe()
+            raise
+
+    async def iterate(self) -> AsyncIterator[str]:
+        """All chunks of the stream, from the first one"""
+        await asyncio.shield(self.ready)
+        position = object()
+        self._positions[position] = 0
+        try:
+            index = 0
+            while True:
+                wake = self._wake
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                    self._positions[position] = index
+                    self._moved.set()
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await wake.wait()
+        finally:
+            # A subscriber that is gone no longer holds upstream back
+            del self._positions[position]
+            self._moved.set()
+
+    def subscribe(self) -> None:
+        self.subscribers += 1
+
+    async def unsubscribe(self) -> None:
+        """Drop a subscriber; the upstream is cancelled when none remain"""
+        self.subscribers -= 1
+        self._moved.set()
+        if self.subscribers <= 0 and not self.done and self._task is not None:
+            self._task.cancel()
+
+
+class StreamFlightGroup:
+    """Registry of in-flight shared streams, keyed by normalized request"""
+
+    def __init__(self, name: str, max_ahead: int = 64):
+        self.name = name
+        self.max_ahead = max_ahead
+        self._inflight: Dict[str, StreamFlight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def join(self, key: str, opener, on_complete: Optional[Callable[[str], Awaitable[None]]] = None) -> StreamFlight:
+        """Subscribe to the stream for key, starting it with opener if none is running.
+
+        opener is an async callable returning (delta iterator, async close).
+        """
+        flight = self._inflight.get(key)
+        if flight is not None and not flight.done:
+            self.coalesced += 1
+        else:
+            self.started += 1
+            flight = StreamFlight(self, key, self.max_ahead)
+            self._inflight[key] = flight
+            flight.start(opener, on_complete)
+        flight.subscribe()
+        return flight
+
+    def _forget(self, key: str, flight: StreamFlight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "subscribers": sum(f.subscribers for f in self._inflight.values()),
+            "executed": self.started,
+            "coalesced": self.coalesced,
+        }
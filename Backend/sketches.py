@@ -0,0 +1,218 @@
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Mergeable streaming aggregates for profiling datasets chunk by chunk.
+# Each sketch has update(chunk data) and merge(other), so partial results of
+# separate chunks (or processes) combine into the whole-dataset answer.
+
+# Items kept per quantile sketch level; rank error is roughly 1/QUANTILE_K
+QUANTILE_K = 256
+# HyperLogLog registers = 2 ** HLL_PRECISION; standard error ~ 1.04 / sqrt(registers)
+HLL_PRECISION = 12
+# Counters kept by the heavy-hitters summary
+TOPK_CAPACITY = 64
+
+
+class Moments:
+    """Count, mean, sum of squared deviations (Welford/Chan), min and max per column"""
+
+    def __init__(self, columns: int):
+        self.count = np.zeros(columns)
+        self.mean = np.zeros(columns)
+        self.m2 = np.zeros(columns)
+        self.min = np.full(columns, np.inf)
+        self.max = np.full(columns, -np.inf)
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a (rows, columns) float matrix; NaN is missing"""
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(present, values, 0.0).sum(axis=0) / count
+            deviations = np.where(present, values - mean, 0.0)
+        other = Moments(values.shape[1])
+        other.count = count.astype(float)
+        other.mean = np.where(count > 0, mean, 0.0)
+        other.m2 = (deviations * deviations).sum(axis=0)
+        other.min = np.where(present, values, np.inf).min(axis=0, initial=np.inf)
+        other.max = np.where(present, values, -np.inf).max(axis=0, initial=-np.inf)
+        self.merge(other)
+
+    def merge(self, other: "Moments") -> None:
+        total = self.count + other.count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = other.mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * other.count / total, 0.0)
+            self.m2 = np.where(total > 0, self.m2 + other.m2 + delta * delta * self.count * other.count / total, 0.0)
+        self.count = total
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+    def std(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+
+class CoMoments:
+    """Pairwise-complete sums for a correlation matrix, accumulated per chunk.
+
+    Values are shifted by a fixed per-column offset (the first chunk's means)
+    so the raw sums don't lose precision to large magnitudes.
+    """
+
+    def __init__(self, shift: np.ndarray):
+        k = len(shift)
+        self.shift = np.nan_to_num(shift)
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))   # sum of x_i where i and j are both present
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def update(self, values: np.ndarray) -> None:
+        present = (~np.isnan(values)).astype(float)
+        centered = np.where(present > 0, values - self.shift, 0.0)
+        self.n += present.T @ present
+        self.sx += centered.T @ present
+        self.sxx += (centered * centered).T @ present
+        self.sxy += centered.T @ centered
+
+    def merge(self, other: "CoMoments") -> None:
+        if not np.array_equal(self.shift, other.shift):
+            raise ValueError("CoMoments with different shifts can't be merged")
+        self.n += other.n
+        self.sx += other.sx
+        self.sxx += other.sxx
+        self.sxy += other.sxy
+
+    def correlation(self) -> np.ndarray:
+        sy = self.sx.T
+        syy = self.sxx.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = self.n * self.sxy - self.sx * sy
+            var_x = self.n * self.sxx - self.sx * self.sx
+            var_y = self.n * syy - sy * sy
+            return np.where(self.n > 1, cov / np.sqrt(var_x * var_y), np.nan)
+
+
+class QuantileSketch:
+    """KLL-style compactor sketch of one column's distribution.
+
+    Level i holds items of weight 2**i; a level over capacity is sorted and
+    every other item is promoted, so memory stays O(k log(n / k)).
+    """
+
+    def __init__(self, k: int = QUANTILE_K, seed: int = 0):
+        self.k = k
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values.astype(float)])
+            self._compact()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compact()
+
+    def _compact(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+                promoted = pairs[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantiles(self, qs) -> List[Optional[float]]:
+        values = np.concatenate(self.levels)
+        if not len(values):
+            return [None for _ in qs]
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        total = cumulative[-1]
+        return [float(values[min(np.searchsorted(cumulative, q * total), len(values) - 1)]) for q in qs]
+
+
+class HyperLogLog:
+    """Approximate distinct count from 64-bit hashes of the values"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if values.empty:
+            return
+        hashes = pd.util.hash_array(values.to_numpy(dtype=object))
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes << np.uint64(self.precision)
+        # Position of the first set bit in the remaining bits (1-based). Bit
+        # lengths come from the 32-bit halves, which convert to float exactly
+        # (a whole uint64 can round up to the next power of two)
+        high = (rest >> np.uint64(32)).astype(float)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(float)
+        bit_length = np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+        rank = np.minimum(64 - bit_length + 1, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(float))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class TopK:
+    """Misra-Gries heavy hitters; counts are lower bounds, exact below capacity distinct values"""
+
+    def __init__(self, capacity: int = TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counters: Dict = {}
+
+    def _trim(self, counts: pd.Series) -> pd.Series:
+        counts = counts.sort_values(ascending=False, kind="stable")
+        if len(counts) > self.capacity:
+            cut = counts.iloc[self.capacity]
+            counts = counts.iloc[:self.capacity] - cut
+            counts = counts[counts > 0]
+        return counts
+
+    def update(self, values: pd.Series) -> None:
+        self._merge_counts(self._trim(values.value_counts()))
+
+    def merge(self, other: "TopK") -> None:
+        self._merge_counts(pd.Series(other.counters, dtype="int64"))
+
+    def _merge_counts(self, counts: pd.Series) -> None:
+        merged = dict(self.counters)
+        for value, n in counts.items():
+            merged[value] = merged.get(value, 0) + int(n)
+        if len(merged) > self.capacity:
+            merged = self._trim(pd.Series(merged, dtype="int64")).to_dict()
+        self.counters = merged
+
+    def top(self, n: int) -> List[tuple]:
+        return sorted(self.counters.items(), key=lambda item: -item[1])[:n]
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+# Seconds without upstream tokens before an SSE heartbeat comment is sent
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+# Deltas buffered between upstream and a slow client before upstream reads pause
+STREAM_BUFFER_CHUNKS = int(os.getenv("STREAM_BUFFER_CHUNKS", "64"))
+
+_END = object()
+
+
+async def _buffered(source: AsyncIterator[str]) -> AsyncIterator[Optional[str]]:
+    """Relay source through a bounded queue, yielding None on heartbeat timeouts.
+
+    The queue bound is the backpressure: when the client stops reading, the
+    pump blocks and upstream is no longer read.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_BUFFER_CHUNKS)
+
+    async def pump():
+        try:
+            async for item in source:
+                await queue.put(item)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+
+
+async def _close(on_close: Callable[[], Awaitable[None]]) -> None:
+    # Runs while the response task may be cancelled (client disconnect);
+    # shield it so the upstream connection is really released
+    with anyio.CancelScope(shield=True):
+        await on_close()
+
+
+async def text_stream(deltas: AsyncIterator[str], on_close: Callable[[], Awaitable[None]]) -> AsyncIterator[str]:
+    """Plain-text token stream (no heartbeats; errors just end the stream)"""
+    try:
+        async for delta in _buffered(deltas):
+            if delta is not None:
+                yield delta
+    except Exception as e:
+        logger.error(f"Streaming text chat error: {e}")
+    finally:
+        await _close(on_close)
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(deltas: AsyncIterator[str], on_close: Callable[[], Awaitable[None]]) -> AsyncIterator[str]:
+    """Server-sent events: token, heartbeat, done and error events"""
+    try:
+        async for delta in _buffered(deltas):
+            if delta is None:
+                yield ": heartbeat\n\n"
+            else:
+                yield sse_event({"delta": delta})
+        yield sse_event({}, event="done")
+    except Exception as e:
+        logger.error(f"Streaming text chat error: {e}")
+        yield sse_event({"detail": str(e)}, event="error")
+    finally:
+        await _close(on_close)
+
+
+async def replay_text(text: str) -> AsyncIterator[str]:
+    """A complete (e.g. cached) reply in the text stream format"""
+    yield text
+
+
+async def replay_sse(text: str) -> AsyncIterator[str]:
+    """A complete (e.g. cached) reply in the SSE stream format"""
+    yield sse_event({"delta": text, "cached": True})
+    yield sse_event({}, event="done")
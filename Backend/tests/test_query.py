@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from query import QueryTooLarge, run_query, run_query_chunked
+
+
+def _frame(rows: int = 200, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "cat": rng.choice(["a", "b", "c", None], rows),
+        "region": rng.choice(["north", "south"], rows),
+        "value": np.where(rng.random(rows) < 0.15, np.nan, rng.normal(1e6, 25.0, rows)),
+        "qty": rng.integers(0, 100, rows),
+        "time": pd.date_range("2021-01-01", periods=rows, freq="13h").astype(str),
+    })
+
+
+def _chunks(df: pd.DataFrame, size: int):
+    return (df.iloc[i:i + size].reset_index(drop=True) for i in range(0, len(df), size))
+
+
+CHUNK_SIZES = [3, 17, 64, 200]
+
+
+@pytest.mark.parametrize("chunk_rows", CHUNK_SIZES)
+@pytest.mark.parametrize("op", ["count", "sum", "mean", "min", "max", "std"])
+@pytest.mark.parametrize("group_by", [["cat"], ["cat", "region"]])
+def test_chunked_group_by_matches_pandas(op, group_by, chunk_rows):
+    df = _frame()
+    spec = {"group_by": group_by, "aggregates": [{"op": op, "column": "value"}, {"op": "count"}]}
+
+    result = run_query_chunked(_chunks(df, chunk_rows), spec)
+
+    grouped = df.groupby(group_by, sort=False, dropna=False)
+    expected = grouped["value"].agg(op).rename(f"{op}_value").to_frame()
+    expected["count"] = grouped.size()
+    expected = expected.reset_index()
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("chunk_rows", CHUNK_SIZES)
+@pytest.mark.parametrize("spec", [
+    {"aggregates": [{"op": "mean", "column": "value"}, {"op": "std", "column": "value"}, {"op": "count"}]},
+    {"aggregates": [{"op": "max", "column": "region"}, {"op": "min", "column": "region"}]},
+    {"group_by": ["cat"], "aggregates": [{"op": "sum", "column": "qty", "alias": "units"}], "filters": ["qty:gt:50"]},
+    {"group_by": ["region"], "aggregates": [{"op": "std", "column": "qty"}], "filters": ["cat:eq:a"]},
+    {"group_by": ["cat"], "sort": [{"column": "count", "descending": True}], "limit": 2},
+    {"time_bucket": {"column": "time", "freq": "month"}, "aggregates": [{"op": "mean", "column": "qty"}]},
+    {"time_bucket": {"column": "time", "freq": "week"}, "group_by": ["region"],
+     "aggregates": [{"op": "max", "column": "value"}]},
+    {"columns": ["cat", "qty"], "sort": [{"column": "qty", "descending": True}], "limit": 9},
+    {"columns": ["cat", "value"], "limit": 5},
+])
+def test_chunked_query_matches_single_pass(spec, chunk_rows):
+    df = _frame()
+    expected = run_query(df, spec)
+    result = run_query_chunked(_chunks(df, chunk_rows), spec)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-9)
+
+
+def test_chunked_query_without_matching_rows():
+    df = _frame()
+    spec = {"aggregates": [{"op": "count"}, {"op": "sum", "column": "qty"}, {"op": "mean", "column": "qty"}],
+            "filters": ["qty:gt:1000"]}
+    result = run_query_chunked(_chunks(df, 50), spec)
+    assert result.to_dict("records") == [{"count": 0, "sum_qty": 0, "mean_qty": pytest.approx(np.nan, nan_ok=True)}]
+
+
+def test_chunked_std_keeps_precision_with_large_offset():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"g": rng.choice(["x", "y"], 3000), "v": 1e9 + rng.normal(0, 1e-3, 3000)})
+    spec = {"group_by": ["g"], "aggregates": [{"op": "std", "column": "v"}]}
+    result = run_query_chunked(_chunks(df, 11), spec)
+    expected = df.groupby("g", sort=False)["v"].std()
+    np.testing.assert_allclose(result["std_v"], expected.to_numpy(), rtol=1e-4)
+
+
+@pytest.mark.parametrize("spec", [
+    {"aggregates": [{"op": "median", "column": "value"}]},
+    {"group_by": ["cat"], "aggregates": [{"op": "nunique", "column": "qty"}]},
+    {"columns": ["value"]},
+])
+def test_chunked_query_refuses_unmergeable_specs(spec):
+    with pytest.raises(QueryTooLarge):
+        run_query_chunked(_chunks(_frame(), 100), spec)
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sketches import CoMoments, HyperLogLog, Moments, QuantileSketch, TopK
+
+
+def _chunks(values: np.ndarray, size: int):
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+# ---- HyperLogLog ----
+
+def _hll_with_hashes(monkeypatch, hashes, precision=12) -> HyperLogLog:
+    hll = HyperLogLog(precision)
+    monkeypatch.setattr(pd.util, "hash_array", lambda values: np.array(hashes, dtype=np.uint64))
+    hll.update(pd.Series(range(len(hashes))))
+    return hll
+
+
+@pytest.mark.parametrize("rest_bits, rank", [
+    ((1 << 52) - 1, 1),          # Top remaining bit set (all bits set: rounds up as a float)
+    (1 << 51, 1),
+    ((1 << 51) - 1, 2),
+    (1 << 40, 12),
+    (1, 52),
+    (0, 53),                     # No set bit: capped at 64 - precision + 1
+])
+def test_hll_register_rank_is_leading_zeros_plus_one(monkeypatch, rest_bits, rank):
+    register = 5
+    hll = _hll_with_hashes(monkeypatch, [(register << 52) | rest_bits])
+    assert hll.registers[register] == rank
+    assert np.count_nonzero(hll.registers) == 1
+
+
+def test_hll_register_keeps_the_largest_rank(monkeypatch):
+    hll = _hll_with_hashes(monkeypatch, [(3 << 52) | (1 << 51), (3 << 52) | (1 << 30), (3 << 52) | (1 << 45)])
+    assert hll.registers[3] == 52 - 30
+
+
+@pytest.mark.parametrize("distinct", [10, 1000, 50_000])
+def test_hll_count_is_within_error(distinct):
+    hll = HyperLogLog()
+    values = pd.Series(np.arange(distinct)).sample(frac=1, random_state=0)
+    hll.update(pd.concat([values, values.iloc[:distinct // 2]]))
+    # Standard error is 1.04 / sqrt(4096) ~ 1.6%
+    assert hll.count() == pytest.approx(distinct, rel=0.05)
+
+
+def test_hll_merge_equals_one_pass():
+    values = pd.Series([f"id-{i}" for i in range(20_000)] + [None])
+    whole = HyperLogLog()
+    whole.update(values)
+    merged = HyperLogLog()
+    for chunk in _chunks(values, 3000):
+        part = HyperLogLog()
+        part.update(chunk)
+        merged.merge(part)
+    np.testing.assert_array_equal(merged.registers, whole.registers)
+
+
+def test_hll_ignores_missing_values():
+    hll = HyperLogLog()
+    hll.update(pd.Series([None, np.nan], dtype=object))
+    assert hll.count() == 0
+
+
+# ---- QuantileSketch ----
+
+def test_quantiles_are_exact_before_compaction():
+    sketch = QuantileSketch(k=256)
+    sketch.update(np.arange(1, 101, dtype=float)[::-1])
+    assert sketch.quantiles([0.0, 0.5, 1.0]) == [1.0, 50.0, 100.0]
+
+
+def test_quantiles_of_empty_sketch():
+    sketch = QuantileSketch()
+    sketch.update(np.array([np.nan]))
+    assert sketch.quantiles([0.5, 0.9]) == [None, None]
+
+
+def _rank_error(values: np.ndarray, sketch: QuantileSketch, qs) -> float:
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(qs)
+    return max(abs(np.searchsorted(ordered, estimate) / len(ordered) - q) for q, estimate in zip(qs, estimates))
+
+
+def test_quantile_rank_error_with_chunks_and_merges():
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(size=100_000)
+    qs = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+    streamed = QuantileSketch()
+    for chunk in _chunks(values, 7000):
+        streamed.update(chunk)
+    merged = QuantileSketch()
+    for i, chunk in enumerate(_chunks(values, 12_000)):
+        part = QuantileSketch(seed=i)
+        part.update(chunk)
+        merged.merge(part)
+
+    for sketch in (streamed, merged):
+        assert _rank_error(values, sketch, qs) < 0.02
+        # Memory stays O(k log(n / k)), far below n
+        assert sum(len(items) for items in sketch.levels) < 4000
+
+
+# ---- Moments ----
+
+def _frame_values(rows: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    values = np.column_stack([
+        rng.normal(1e9, 1.0, rows),          # Large offset: naive sums lose the variance
+        rng.exponential(5.0, rows),
+        np.full(rows, np.nan),
+    ])
+    values[rng.random(rows) < 0.2, 1] = np.nan
+    return values
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 97, 5000])
+def test_moments_match_numpy(chunk_rows):
+    values = _frame_values(5000, seed=2)
+    moments = Moments(values.shape[1])
+    for chunk in _chunks(values, chunk_rows):
+        moments.update(chunk)
+
+    present = values[:, :2]
+    np.testing.assert_array_equal(moments.count, [5000, np.count_nonzero(~np.isnan(values[:, 1])), 0])
+    np.testing.assert_allclose(moments.mean[:2], np.nanmean(present, axis=0), rtol=1e-12)
+    np.testing.assert_allclose(moments.std()[:2], np.nanstd(present, axis=0, ddof=1), rtol=1e-6)
+    np.testing.assert_array_equal(moments.min[:2], np.nanmin(present, axis=0))
+    np.testing.assert_array_equal(moments.max[:2], np.nanmax(present, axis=0))
+    assert np.isnan(moments.std()[2])
+    assert moments.min[2] == np.inf and moments.max[2] == -np.inf
+
+
+def test_moments_merge_is_order_independent():
+    values = _frame_values(3000, seed=3)
+    parts = []
+    for chunk in _chunks(values, 700):
+        part = Moments(values.shape[1])
+        part.update(chunk)
+        parts.append(part)
+    forward, backward = Moments(values.shape[1]), Moments(values.shape[1])
+    for part in parts:
+        forward.merge(part)
+    for part in reversed(parts):
+        backward.merge(part)
+    np.testing.assert_allclose(forward.mean, backward.mean, rtol=1e-12)
+    np.testing.assert_allclose(forward.m2, backward.m2, rtol=1e-9)
+    np.testing.assert_array_equal(forward.count, backward.count)
+
+
+def test_comoments_match_pairwise_pandas_correlation():
+    values = _frame_values(2000, seed=4)[:, :2]
+    values = np.column_stack([values, values[:, 0] * 0.5 + np.random.default_rng(5).normal(size=2000)])
+    comoments = CoMoments(np.nanmean(values[:500], axis=0))
+    for chunk in _chunks(values, 500):
+        comoments.update(chunk)
+    expected = pd.DataFrame(values).corr().to_numpy()
+    np.testing.assert_allclose(comoments.correlation(), expected, rtol=1e-6, atol=1e-9)
+
+
+# ---- TopK ----
+
+def test_topk_is_exact_below_capacity():
+    values = pd.Series(list("aaaabbbcc") * 10 + ["d"])
+    topk = TopK(capacity=8)
+    for chunk in _chunks(values, 13):
+        topk.update(chunk)
+    assert topk.top(3) == [("a", 40), ("b", 30), ("c", 20)]
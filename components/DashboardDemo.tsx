@@ -88,22 +88,21 @@ export default function Dashboard() {
   useEffect(() => {
     async function fetchDatasets() {
       try {
-        const res = await fetch(`${FASTAPI_BASE_URL}/available-datasets`);
-        if (!res.ok) throw new Error("Failed to fetch available datasets");
-        const { datasets } = await res.json();
+        // One round-trip: the backend loads and encodes every dataset in parallel
+        const res = await fetch(`${FASTAPI_BASE_URL}/datasets/batch`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({}),
+        });
+        if (!res.ok) throw new Error("Failed to fetch datasets");
+        const { datasets: entries } = await res.json();
+        const datasets = Object.keys(entries);
         setDatasets(datasets);
 
-        const dataFetches = datasets.map((ds: any) =>
-          fetch(`${FASTAPI_BASE_URL}/${ds}`).then((r) => {
-            if (!r.ok) throw new Error(`Failed to fetch dataset: ${ds}`);
-            return r.json();
-          })
-        );
-
-        const results = await Promise.all(dataFetches);
         const newDataMap: Record<string, any[]> = {};
-        datasets.forEach((ds: string, i: number) => {
-          newDataMap[ds] = results[i].data || [];
+        datasets.forEach((ds: string) => {
+          if (entries[ds].error) throw new Error(`Failed to fetch dataset: ${ds}`);
+          newDataMap[ds] = entries[ds].data || [];
         });
         setDataMap(newDataMap);
         setLoading(false);